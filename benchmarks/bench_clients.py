@@ -0,0 +1,63 @@
+"""Per-row client overhead of the ingest handler, before and after pooling.
+
+"before" builds a DynamoDB resource and Table for every row, as put_movie
+used to; "after" looks the Table up in the per-container client registry.
+No requests are sent, so only client construction and lookup are measured.
+
+    python benchmarks/bench_clients.py --rows 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(__file__), '..', 'pipelines_app', 'lambda'))
+
+import boto3  # noqa: E402
+
+import clients  # noqa: E402
+
+TABLE_NAME = 'movieDetails'
+
+
+def per_row_resource(rows):
+    for _ in range(rows):
+        boto3.resource('dynamodb').Table(TABLE_NAME)
+
+
+def pooled(rows):
+    for _ in range(rows):
+        clients.get_table(TABLE_NAME)
+
+
+def measure(fn, rows):
+    start = time.perf_counter()
+    fn(rows)
+    return (time.perf_counter() - start) / rows * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-south-1')
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+
+    before = measure(per_row_resource, args.rows)
+    clients.reset()
+    after = measure(pooled, args.rows)
+    print(json.dumps({
+        'benchmark': 'client_overhead',
+        'rows': args.rows,
+        'before_us_per_row': round(before, 2),
+        'after_us_per_row': round(after, 2),
+        'speedup': round(before / after, 1) if after else None,
+    }))
+
+
+if __name__ == '__main__':
+    main()
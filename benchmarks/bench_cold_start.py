@@ -0,0 +1,136 @@
+"""Cold-start cost of the handler asset, before and after bundling.
+
+Locally, "before" is a directory packaged as-is (by default the stale
+35 MB asset in cdk.out that carried aws_cdk next to handler.py, else the
+raw lambda folder) and "after" is what pipelines_app.bundling ships. For
+each the asset is zipped, unzipped into a fresh directory and `handler`
+imported in a new interpreter, which is what Lambda's init phase does
+before the first invocation.
+
+With --function-name the deployed function is measured instead: its
+configuration is touched to force a new execution environment, then it is
+invoked with a tail log and the Init Duration of the REPORT line is
+recorded. Run it once against the old and once against the new deployment.
+
+    python benchmarks/bench_cold_start.py --repeat 5
+    python benchmarks/bench_cold_start.py --function-name my-handler --repeat 3
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from os import path
+
+ROOT = path.join(path.dirname(path.abspath(__file__)), '..')
+LAMBDA_DIR = path.join(ROOT, 'pipelines_app', 'lambda')
+
+sys.path.insert(0, ROOT)
+
+from pipelines_app.bundling import bundle_handler  # noqa: E402
+
+IMPORT_SCRIPT = 'import sys, time; start = time.perf_counter(); import handler; print(time.perf_counter() - start)'
+
+
+def default_before():
+    stale = glob.glob(path.join(ROOT, 'cdk.out', 'assembly-*', 'asset.218720*'))
+    return stale[0] if stale else LAMBDA_DIR
+
+
+def zip_dir(source, target):
+    with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for root, _, files in os.walk(source):
+            for name in files:
+                full = path.join(root, name)
+                archive.write(full, path.relpath(full, source))
+    return path.getsize(target)
+
+
+def measure_local(label, source, repeat):
+    work = tempfile.mkdtemp(prefix='cold-start-')
+    try:
+        archive = path.join(work, 'asset.zip')
+        zip_bytes = zip_dir(source, archive)
+        with zipfile.ZipFile(archive) as z:
+            files = len(z.namelist())
+        extract, imports, error = [], [], None
+        for attempt in range(repeat):
+            target = path.join(work, 'run{}'.format(attempt))
+            start = time.perf_counter()
+            with zipfile.ZipFile(archive) as z:
+                z.extractall(target)
+            extract.append(time.perf_counter() - start)
+            run = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=target, stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE, env=dict(os.environ, PYTHONDONTWRITEBYTECODE='1'))
+            if run.returncode:
+                error = run.stderr.decode().strip().splitlines()[-1]
+                continue
+            imports.append(float(run.stdout.decode().strip().splitlines()[-1]))
+        import_seconds = statistics.median(imports) if imports else 0.0
+        return {
+            'benchmark': 'cold_start',
+            'asset': label,
+            'source': path.relpath(source, ROOT),
+            'zip_bytes': zip_bytes,
+            'files': files,
+            'extract_ms': round(statistics.median(extract) * 1000, 1),
+            'import_ms': round(import_seconds * 1000, 1) if imports else None,
+            'import_error': error,
+            'init_ms': round((statistics.median(extract) + import_seconds) * 1000, 1),
+        }
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def measure_remote(function_name, repeat):
+    import boto3
+
+    client = boto3.client('lambda')
+    durations = []
+    for _ in range(repeat):
+        config = client.get_function_configuration(FunctionName=function_name)
+        variables = dict(config.get('Environment', {}).get('Variables', {}), COLD_START_NONCE=str(time.time()))
+        client.update_function_configuration(FunctionName=function_name, Environment={'Variables': variables})
+        client.get_waiter('function_updated').wait(FunctionName=function_name)
+        response = client.invoke(FunctionName=function_name, LogType='Tail', Payload=b'{}')
+        log = base64.b64decode(response['LogResult']).decode()
+        match = re.search(r'Init Duration: ([\d.]+) ms', log)
+        if match:
+            durations.append(float(match.group(1)))
+    return {
+        'benchmark': 'cold_start',
+        'function': function_name,
+        'code_size': client.get_function_configuration(FunctionName=function_name)['CodeSize'],
+        'samples': len(durations),
+        'init_ms': round(statistics.median(durations), 1) if durations else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--before', default=default_before(), help='asset directory packaged as-is')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--function-name', help='measure a deployed function instead')
+    args = parser.parse_args()
+
+    if args.function_name:
+        print(json.dumps(measure_remote(args.function_name, args.repeat)))
+        return
+    bundle = bundle_handler(LAMBDA_DIR)
+    try:
+        print(json.dumps(measure_local('before', args.before, args.repeat)))
+        print(json.dumps(measure_local('after', bundle, args.repeat)))
+    finally:
+        shutil.rmtree(bundle, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
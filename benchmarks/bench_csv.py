@@ -0,0 +1,70 @@
+"""Rows/sec of the CSV parsing layer against the old naive split.
+
+"naive" is the handler's original decode().strip().split(','); "csv_parser"
+is parsing.CsvParser; "csv_module" runs every line through csv.reader for
+reference. Clean input has no quotes; quote-heavy input quotes every plot
+and embeds commas in it.
+
+    python benchmarks/bench_csv.py --rows 200000
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(__file__), '..', 'pipelines_app', 'lambda'))
+
+from parsing import CsvParser  # noqa: E402
+
+
+def clean_lines(rows):
+    return [b'movie%d,Title %d,a plot with no surprises,%d.5' % (i, i, i % 5) for i in range(rows)]
+
+
+def quoted_lines(rows):
+    return [b'movie%d,Title %d,"a plot, with commas, and ""quotes""",%d.5' % (i, i, i % 5) for i in range(rows)]
+
+
+def naive(lines):
+    for line in lines:
+        yield line.decode('utf8').strip().split(',')
+
+
+def csv_parser(lines):
+    return CsvParser().rows(lines)
+
+
+def csv_module(lines):
+    return csv.reader(line.decode('utf8') for line in lines)
+
+
+def measure(parse, lines, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = sum(1 for _ in parse(lines))
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for input_name, lines in (('clean', clean_lines(args.rows)), ('quote_heavy', quoted_lines(args.rows))):
+        for parse in (naive, csv_parser, csv_module):
+            print(json.dumps({
+                'benchmark': 'csv_parse',
+                'input': input_name,
+                'parser': parse.__name__,
+                'rows': args.rows,
+                'rows_per_second': round(measure(parse, lines, args.repeat)),
+            }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""End-to-end ingest throughput of plain vs gzip, bzip2 and zstd objects.
+
+The same synthetic rows (see standins.py) are stored plain and compressed
+and run through handler.handler against the local stand-ins. Decompression
+happens in the pipeline's fetch stage, so with --write-latency-ms the
+compressed runs should take about as long as the plain one until decoding
+becomes the bottleneck. zstd is skipped unless the zstandard package is
+installed. One JSON line is printed per compression.
+
+    python benchmarks/bench_decompress.py --rows 1000000 --write-latency-ms 5
+"""
+import argparse
+import bz2
+import contextlib
+import gzip
+import io
+import json
+import sys
+import time
+from os import path
+
+HERE = path.dirname(path.abspath(__file__))
+sys.path.insert(0, path.join(HERE, '..', 'pipelines_app', 'lambda'))
+sys.path.insert(0, HERE)
+
+import clients  # noqa: E402
+import handler  # noqa: E402
+import metrics  # noqa: E402
+from standins import LocalDynamoDB, LocalS3, SyntheticObject  # noqa: E402
+
+metrics.METRICS_ENABLED = False
+
+
+class StoredObject:
+    """Bytes held in memory, served through LocalS3 like a SyntheticObject."""
+
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+
+    def read(self, start, end):
+        return self.data[start:end]
+
+
+def zstd_compress(data):
+    import zstandard
+    return zstandard.ZstdCompressor().compress(data)
+
+
+COMPRESSORS = {
+    'none': ('csv', lambda data: data),
+    'gzip': ('csv.gz', lambda data: gzip.compress(data, compresslevel=6)),
+    'bz2': ('csv.bz2', bz2.compress),
+    'zstd': ('csv.zst', zstd_compress),
+}
+
+
+def run(data, rows, compression, latency):
+    suffix, compress = COMPRESSORS[compression]
+    try:
+        stored = StoredObject(compress(data))
+    except ImportError:
+        return None
+    s3 = LocalS3()
+    key = 'bench/movies.{}'.format(suffix)
+    s3.add('bench', key, stored)
+    clients.set_client('s3', s3)
+    clients.set_resource('dynamodb', LocalDynamoDB(latency))
+    event = {'Records': [{'s3': {'bucket': {'name': 'bench'}, 'object': {'key': key, 'size': stored.size}}}]}
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = handler.handler(event, None)
+    seconds = time.perf_counter() - start
+    result = json.loads(response['body'])['objects'][0]
+    stages = result.get('stages', {})
+    return {
+        'benchmark': 'decompress',
+        'compression': compression,
+        'rows': rows,
+        'bytes': len(data),
+        'stored_bytes': stored.size,
+        'status': result['status'],
+        'written': result.get('written'),
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds) if seconds else None,
+        'mb_per_second': round(len(data) / seconds / 1e6, 1) if seconds else None,
+        'fetch_seconds': stages.get('fetch', {}).get('busy_seconds'),
+        'bottleneck': stages.get('bottleneck'),
+        'write_latency_ms': latency * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--compression', nargs='+', choices=sorted(COMPRESSORS),
+                        default=['none', 'gzip', 'bz2', 'zstd'])
+    parser.add_argument('--write-latency-ms', type=float, default=0.0,
+                        help='simulated BatchWriteItem latency')
+    args = parser.parse_args()
+
+    obj = SyntheticObject(args.rows)
+    data = obj.read(0, obj.size)
+    for compression in args.compression:
+        result = run(data, args.rows, compression, args.write_latency_ms / 1000)
+        if result is not None:
+            print(json.dumps(result))
+        clients.reset()
+
+
+if __name__ == '__main__':
+    main()
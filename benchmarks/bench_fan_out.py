@@ -0,0 +1,104 @@
+"""Wall-clock time of one large object ingested as 1, 2, 4, ... shards.
+
+The coordinator's planner cuts a synthetic object (see standins.py) into
+line-aligned shards, and each shard is ingested by handler.ingest_shard in
+its own process, all at once, the way the fan-out state machine's Map
+state runs workers side by side. The shard results are added up by the
+coordinator's combine step. One JSON line is printed per shard count.
+
+    python benchmarks/bench_fan_out.py --rows 2000000 --shards 1 2 4 8 --write-latency-ms 5
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from os import path
+
+HERE = path.dirname(path.abspath(__file__))
+LAMBDA_DIR = path.join(HERE, '..', 'pipelines_app', 'lambda')
+
+sys.path.insert(0, LAMBDA_DIR)
+sys.path.insert(0, HERE)
+
+import clients  # noqa: E402
+import coordinator  # noqa: E402
+import metrics  # noqa: E402
+from standins import LocalDynamoDB, LocalS3, SyntheticObject  # noqa: E402
+
+BUCKET, KEY = 'bench', 'bench/movies.csv'
+
+# Keep the per-shard EMF records out of the benchmark's output
+metrics.METRICS_ENABLED = False
+
+
+def stand_ins(rows, latency):
+    s3 = LocalS3()
+    obj = SyntheticObject(rows)
+    s3.add(BUCKET, KEY, obj)
+    dynamodb = LocalDynamoDB(latency)
+    clients.set_client('s3', s3)
+    clients.set_resource('dynamodb', dynamodb)
+    return s3, dynamodb, obj
+
+
+def run_shard(rows, latency, shard):
+    _, _, obj = stand_ins(rows, latency)
+    import handler
+    return handler.ingest_shard({'bucket': BUCKET, 'key': KEY, 'size': obj.size}, shard)
+
+
+def run(rows, shard_count, latency):
+    s3, _, obj = stand_ins(rows, latency)
+    start = time.perf_counter()
+    shards = coordinator.plan_shards(s3, BUCKET, KEY, obj.size, shard_bytes=-(-obj.size // shard_count))
+    workers = [subprocess.Popen([sys.executable, path.abspath(__file__), '--child', '--rows', str(rows),
+                                 '--write-latency-ms', str(latency * 1000), '--shard', json.dumps(shard)],
+                                stdout=subprocess.PIPE, env=dict(os.environ))
+               for shard in shards]
+    results = [json.loads(worker.communicate()[0].decode().strip().splitlines()[-1]) for worker in workers]
+    with contextlib.redirect_stdout(io.StringIO()):
+        combined = coordinator.combine({'bucket': BUCKET, 'key': KEY}, results)
+    seconds = time.perf_counter() - start
+    return {
+        'benchmark': 'fan_out',
+        'rows': rows,
+        'bytes': obj.size,
+        'shards': len(shards),
+        'status': combined['status'],
+        'written': combined['written'],
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds) if seconds else None,
+        'slowest_shard_seconds': combined['elapsed_seconds'],
+        'write_latency_ms': latency * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--write-latency-ms', type=float, default=0.0,
+                        help='simulated BatchWriteItem latency')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--shard', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    latency = args.write_latency_ms / 1000
+    if args.child:
+        print(json.dumps(run_shard(args.rows, latency, json.loads(args.shard))))
+        return
+
+    baseline = None
+    for count in args.shards:
+        result = run(args.rows, count, latency)
+        baseline = baseline or result['seconds']
+        result['speedup'] = round(baseline / result['seconds'], 2) if result['seconds'] else None
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
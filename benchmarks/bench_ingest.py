@@ -0,0 +1,112 @@
+"""End-to-end ingest throughput of handler.handler against local stand-ins.
+
+Each run invokes the real handler on one synthetic object served by the
+in-process S3 stand-in, writing to the DynamoDB stand-in (see
+standins.py), in its own subprocess so peak RSS belongs to that run
+alone. One JSON line is printed per run; --output also writes all runs
+with the commit they were measured on, for comparing between commits.
+
+    python benchmarks/bench_ingest.py --rows 1000 100000 10000000 --format csv jsonl
+    python benchmarks/bench_ingest.py --rows 1000000 --write-latency-ms 10 --output before.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from os import path
+
+HERE = path.dirname(path.abspath(__file__))
+LAMBDA_DIR = path.join(HERE, '..', 'pipelines_app', 'lambda')
+
+
+def run_child(rows, fmt, latency):
+    sys.path.insert(0, LAMBDA_DIR)
+    sys.path.insert(0, HERE)
+    start = time.perf_counter()
+    import clients
+    import handler
+    import_seconds = time.perf_counter() - start
+    from standins import LocalDynamoDB, LocalS3, SyntheticObject
+
+    s3 = LocalS3()
+    dynamodb = LocalDynamoDB(latency)
+    key = 'bench/movies.{}'.format(fmt)
+    obj = SyntheticObject(rows, fmt)
+    s3.add('bench', key, obj)
+    clients.set_client('s3', s3)
+    clients.set_resource('dynamodb', dynamodb)
+    event = {'Records': [{'s3': {'bucket': {'name': 'bench'},
+                                 'object': {'key': key, 'size': obj.size, 'eTag': 'bench'}}}]}
+
+    start = time.perf_counter()
+    response = handler.handler(event, None)
+    seconds = time.perf_counter() - start
+    result = json.loads(response['body'])['objects'][0]
+    stages = result.get('stages', {})
+    return {
+        'benchmark': 'ingest',
+        'format': fmt,
+        'rows': rows,
+        'bytes': obj.size,
+        'status': result['status'],
+        'written': result.get('written'),
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds) if seconds else None,
+        'mb_per_second': round(obj.size / seconds / 1e6, 1) if seconds else None,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'requests': {'s3': dict(s3.requests), 'dynamodb': dict(dynamodb.requests)},
+        'phases': {
+            'import_seconds': round(import_seconds, 3),
+            'fetch_seconds': stages.get('fetch', {}).get('busy_seconds'),
+            'parse_seconds': stages.get('parse', {}).get('busy_seconds'),
+            'write_seconds': stages.get('write', {}).get('busy_seconds'),
+            'bottleneck': stages.get('bottleneck'),
+        },
+        'writers': stages.get('write', {}).get('workers'),
+        'write_latency_ms': latency * 1000,
+    }
+
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--format', nargs='+', choices=('csv', 'jsonl'), default=['csv'])
+    parser.add_argument('--write-latency-ms', type=float, default=0.0,
+                        help='simulated BatchWriteItem latency')
+    parser.add_argument('--output', help='also write all results to this JSON file')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.rows[0], args.format[0], args.write_latency_ms / 1000)))
+        return
+
+    results = []
+    for fmt in args.format:
+        for rows in args.rows:
+            output = subprocess.check_output([
+                sys.executable, path.abspath(__file__), '--child', '--rows', str(rows), '--format', fmt,
+                '--write-latency-ms', str(args.write_latency_ms)], env=dict(os.environ))
+            result = json.loads(output.decode().strip().splitlines()[-1])
+            print(json.dumps(result))
+            results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'commit': commit(), 'python': platform.python_version(), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
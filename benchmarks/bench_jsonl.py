@@ -0,0 +1,71 @@
+"""Rows/sec of the JSON Lines path against the CSV path on equivalent data.
+
+Both inputs describe the same movies and go through the handler's parse
+functions, so the numbers include building the DynamoDB items. "flat" JSON
+carries plot and rating at the top level like the CSV columns; "nested"
+puts them in an info object with a few extra fields.
+
+    python benchmarks/bench_jsonl.py --rows 200000
+"""
+import argparse
+import json
+import sys
+import time
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(__file__), '..', 'pipelines_app', 'lambda'))
+
+from handler import parse_json_movies, parse_movies  # noqa: E402
+
+
+def csv_lines(rows):
+    return [b'movie%d,Title %d,a plot with no surprises,%d.5' % (i, i, i % 5) for i in range(rows)]
+
+
+def flat_json_lines(rows):
+    return [json.dumps({'movieName': 'movie%d' % i, 'title': 'Title %d' % i,
+                        'plot': 'a plot with no surprises', 'rating': i % 5 + 0.5}).encode('utf8')
+            for i in range(rows)]
+
+
+def nested_json_lines(rows):
+    return [json.dumps({'movieName': 'movie%d' % i, 'title': 'Title %d' % i,
+                        'info': {'plot': 'a plot with no surprises', 'rating': i % 5 + 0.5,
+                                 'year': 1990 + i % 30, 'genres': ['drama', 'crime']}}).encode('utf8')
+            for i in range(rows)]
+
+
+def measure(parse, lines, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = sum(1 for _ in parse(lines))
+        best = min(best, time.perf_counter() - start)
+    return count, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    inputs = (
+        ('csv', parse_movies, csv_lines(args.rows)),
+        ('jsonl_flat', parse_json_movies, flat_json_lines(args.rows)),
+        ('jsonl_nested', parse_json_movies, nested_json_lines(args.rows)),
+    )
+    for input_name, parse, lines in inputs:
+        count, seconds = measure(parse, lines, args.repeat)
+        size = sum(len(line) + 1 for line in lines)
+        print(json.dumps({
+            'benchmark': 'jsonl_parse',
+            'input': input_name,
+            'rows': count,
+            'rows_per_second': round(count / seconds),
+            'mb_per_second': round(size / seconds / 1e6, 1),
+        }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""In-process S3 and DynamoDB stand-ins for running the handler offline.
+
+Objects are synthetic: every row has the same width, so any byte range can
+be generated on demand and a 10M row file never sits in memory. The
+DynamoDB stand-in only counts what it is sent, optionally sleeping to
+mimic request latency. Both count requests per API call.
+"""
+import json
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+FORMATS = ('csv', 'jsonl')
+
+
+def synthetic_row(index, fmt='csv'):
+    if fmt == 'jsonl':
+        return json.dumps({'movieName': 'movie%09d' % index, 'title': 'Title %09d' % index,
+                           'info': {'plot': 'a plot with no surprises', 'rating': index % 5 + 0.5}},
+                          separators=(',', ':')).encode('utf8') + b'\n'
+    return b'movie%09d,Title %09d,a plot with no surprises,%d.5\n' % (index, index, index % 5)
+
+
+class SyntheticObject:
+    def __init__(self, rows, fmt='csv'):
+        self.rows = rows
+        self.fmt = fmt
+        self.row_size = len(synthetic_row(0, fmt))
+        self.size = rows * self.row_size
+
+    def read(self, start, end):
+        """Bytes [start, end) of the object."""
+        first, skip = divmod(start, self.row_size)
+        last = min(self.rows, -(-end // self.row_size))
+        data = b''.join(synthetic_row(index, self.fmt) for index in range(first, last))
+        return data[skip:skip + end - start]
+
+
+class SyntheticBody:
+    def __init__(self, obj, start, end):
+        self._obj = obj
+        self._position = start
+        self._end = end
+
+    def read(self, amt=None):
+        end = self._end if amt is None else min(self._end, self._position + amt)
+        data = self._obj.read(self._position, end)
+        self._position = end
+        return data
+
+
+class LocalS3:
+    def __init__(self):
+        self.objects = {}
+        self.requests = Counter()
+
+    def add(self, bucket, key, obj):
+        self.objects[(bucket, key)] = obj
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self.requests['head_object'] += 1
+        return {'ContentLength': self.objects[(Bucket, Key)].size}
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        self.requests['get_object'] += 1
+        obj = self.objects[(Bucket, Key)]
+        start, end = 0, obj.size
+        if Range:
+            first, last = Range[len('bytes='):].split('-')
+            start, end = int(first), min(obj.size, int(last) + 1) if last else obj.size
+        return {'Body': SyntheticBody(obj, start, end), 'ContentLength': end - start}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.requests['put_object'] += 1
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self.requests['delete_object'] += 1
+
+
+class LocalDynamoDB:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = Counter()
+        self.items = 0
+        # Stands in for the resource and its client alike
+        self.meta = SimpleNamespace(client=self)
+
+    def batch_write_item(self, RequestItems):
+        self.requests['batch_write_item'] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        for requests in RequestItems.values():
+            self.items += len(requests)
+        return {'UnprocessedItems': {}}
@@ -0,0 +1,110 @@
+"""Optional backfill workflow over a prefix of the upload bucket.
+
+A Step Functions distributed map lists the prefix, groups the objects
+into batches and invokes the ingest handler once per batch, a bounded
+number of batches at a time. The handler ingests a batch like a run of S3
+notifications, so the ingest ledger and the write rate limiter apply
+unchanged, and returns the batch's progress and throughput; the map
+writes those results to the state bucket. Start an execution with
+
+    {"prefix": "movies/", "reingest": true}
+
+where `reingest` also re-ingests objects the ledger has already seen
+complete, e.g. after a change to the item shape or a table restore.
+"""
+from typing import NamedTuple
+
+from aws_cdk import core
+import aws_cdk.aws_iam as iam
+import aws_cdk.aws_lambda as lmb
+import aws_cdk.aws_s3 as s3
+import aws_cdk.aws_stepfunctions as sfn
+
+from .fan_out import LAMBDA_ERRORS
+
+
+class BackfillSettings(NamedTuple):
+    # Batches ingested at the same time
+    max_concurrency: int = 20
+    # Objects per handler invocation
+    objects_per_batch: int = 50
+    # Attempts per batch, including the first
+    batch_attempts: int = 3
+    # Share of batches that may fail for good before the backfill fails
+    tolerated_failure_percentage: int = 5
+    timeout_hours: int = 24
+
+
+class Backfill(core.Construct):
+    def __init__(self, scope: core.Construct, id: str, *, handler: lmb.Function, bucket: s3.IBucket,
+                 results_bucket: s3.IBucket, settings: BackfillSettings = BackfillSettings()) -> None:
+        super().__init__(scope, id)
+        stack = core.Stack.of(self)
+
+        defaults = sfn.Pass(self, 'Defaults',
+            result=sfn.Result.from_object({'prefix': '', 'reingest': False}),
+            result_path='$.defaults')
+        options = sfn.Pass(self, 'Options',
+            parameters={'options.$': 'States.JsonMerge($.defaults, $$.Execution.Input, false)'})
+        # CDK 1.56 has no distributed map, so the state is written out in
+        # full.
+        ingest = sfn.CustomState(self, 'IngestPrefix', state_json={
+            'Type': 'Map',
+            'ItemReader': {
+                'Resource': 'arn:aws:states:::s3:listObjectsV2',
+                'Parameters': {'Bucket': bucket.bucket_name, 'Prefix.$': '$.options.prefix'},
+            },
+            'ItemBatcher': {
+                'MaxItemsPerBatch': settings.objects_per_batch,
+                'BatchInput': {'reingest.$': '$.options.reingest'},
+            },
+            'MaxConcurrency': settings.max_concurrency,
+            'ToleratedFailurePercentage': settings.tolerated_failure_percentage,
+            'ItemProcessor': {
+                'ProcessorConfig': {'Mode': 'DISTRIBUTED', 'ExecutionType': 'STANDARD'},
+                'StartAt': 'IngestBatch',
+                'States': {
+                    'IngestBatch': {
+                        'Type': 'Task',
+                        'Resource': handler.function_arn,
+                        'Parameters': {'backfill': {
+                            'bucket': bucket.bucket_name,
+                            'items.$': '$.Items',
+                            'reingest.$': '$.BatchInput.reingest',
+                        }},
+                        'Retry': [
+                            {'ErrorEquals': LAMBDA_ERRORS, 'IntervalSeconds': 2, 'BackoffRate': 2, 'MaxAttempts': 6},
+                            {'ErrorEquals': ['States.ALL'], 'IntervalSeconds': 30, 'BackoffRate': 2,
+                             'MaxAttempts': settings.batch_attempts - 1},
+                        ],
+                        'End': True,
+                    },
+                },
+            },
+            'ResultWriter': {
+                'Resource': 'arn:aws:states:::s3:putObject',
+                'Parameters': {'Bucket': results_bucket.bucket_name, 'Prefix': 'backfill-results'},
+            },
+        })
+
+        state_machine_name = '{}-Backfill'.format(stack.stack_name)
+        self.state_machine = sfn.StateMachine(self, 'StateMachine',
+            state_machine_name=state_machine_name,
+            definition=defaults.next(options).next(ingest),
+            timeout=core.Duration.hours(settings.timeout_hours))
+
+        # StateMachine is not IGrantable in this CDK version; grant its role.
+        handler.grant_invoke(self.state_machine.role)
+        bucket.grant_read(self.state_machine.role)
+        results_bucket.grant_read_write(self.state_machine.role)
+        # The distributed map runs each batch as a child execution of this
+        # state machine; named, since its own ARN cannot go in its policy.
+        state_machine_arn = stack.format_arn(service='states', resource='stateMachine', sep=':',
+                                             resource_name=state_machine_name)
+        self.state_machine.add_to_role_policy(iam.PolicyStatement(
+            actions=['states:StartExecution'],
+            resources=[state_machine_arn]))
+        self.state_machine.add_to_role_policy(iam.PolicyStatement(
+            actions=['states:DescribeExecution', 'states:StopExecution'],
+            resources=[stack.format_arn(service='states', resource='execution', sep=':',
+                                        resource_name='{}/*'.format(state_machine_name))]))
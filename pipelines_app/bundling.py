@@ -0,0 +1,117 @@
+"""Builds the handler's deployment directory from what it actually imports.
+
+`Code.from_asset` zips whatever sits in the source folder, so anything
+installed or generated there ships with the function and slows cold
+starts. bundle_handler() follows the handler's imports, including ones
+deferred inside functions, through the modules and packages found in the
+source folder, copies only those into a staging directory and refuses to
+produce a bundle containing CDK libraries. Everything else the code
+imports comes from the Lambda runtime (the standard library and boto3) or
+is optional and must be provided as a layer.
+
+The staging directory is the same on every synth, so bundles do not pile
+up: it lives under the cloud assembly directory when the CDK CLI runs the
+app, and under the system temporary directory otherwise.
+"""
+import ast
+import hashlib
+import os
+import shutil
+import tempfile
+from os import path
+
+# Top-level names that must never reach the function zip
+FORBIDDEN_PACKAGES = ('aws_cdk', 'jsii', 'constructs')
+
+
+class BundleError(Exception):
+    pass
+
+
+def _imported_names(source):
+    names = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split('.')[0])
+    return names
+
+
+def _local_path(source_dir, name):
+    module = path.join(source_dir, name + '.py')
+    if path.isfile(module):
+        return module
+    package = path.join(source_dir, name)
+    if path.isfile(path.join(package, '__init__.py')):
+        return package
+    return None
+
+
+def _sources(local_path):
+    if path.isfile(local_path):
+        yield local_path
+        return
+    for root, _, files in os.walk(local_path):
+        for name in files:
+            if name.endswith('.py'):
+                yield path.join(root, name)
+
+
+def handler_modules(source_dir, entry='handler'):
+    """Top-level modules and packages in `source_dir` reachable from `entry`."""
+    found = {}
+    pending = [entry]
+    while pending:
+        name = pending.pop()
+        if name in found:
+            continue
+        local_path = _local_path(source_dir, name)
+        if local_path is None:
+            if name == entry:
+                raise BundleError('No {}.py in {}'.format(entry, source_dir))
+            continue
+        found[name] = local_path
+        for source in _sources(local_path):
+            with open(source, encoding='utf8') as f:
+                names = _imported_names(f.read())
+            forbidden = sorted(names.intersection(FORBIDDEN_PACKAGES))
+            if forbidden:
+                raise BundleError('{} imports {}, which must not be bundled with the function'.format(
+                    path.relpath(source, source_dir), ', '.join(forbidden)))
+            pending.extend(names - found.keys())
+    return found
+
+
+def check_bundle(bundle_dir):
+    offending = sorted(entry for entry in os.listdir(bundle_dir)
+                       if entry.split('.')[0].split('-')[0].lower() in FORBIDDEN_PACKAGES)
+    if offending:
+        raise BundleError('CDK libraries must not be bundled with the function: {}'.format(', '.join(offending)))
+
+
+def default_out_dir(source_dir, entry='handler'):
+    # One directory per source folder and entry point, rebuilt on each synth
+    digest = hashlib.sha256(path.abspath(source_dir).encode('utf8')).hexdigest()[:12]
+    parent = os.environ.get('CDK_OUTDIR') or tempfile.gettempdir()
+    return path.join(parent, '.bundles', '{}-{}'.format(entry, digest))
+
+
+def bundle_handler(source_dir, entry='handler', out_dir=None):
+    """Copies the modules `entry` needs into `out_dir` (default_out_dir() by
+    default, emptied first) and returns its path."""
+    modules = handler_modules(source_dir, entry)
+    if out_dir is None:
+        out_dir = default_out_dir(source_dir, entry)
+        if path.isdir(out_dir):
+            shutil.rmtree(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    ignore = shutil.ignore_patterns('__pycache__', '*.pyc', '*.dist-info', '*.egg-info')
+    for name, local_path in sorted(modules.items()):
+        target = path.join(out_dir, path.basename(local_path))
+        if path.isdir(local_path):
+            shutil.copytree(local_path, target, ignore=ignore)
+        else:
+            shutil.copy2(local_path, target)
+    check_bundle(out_dir)
+    return out_dir
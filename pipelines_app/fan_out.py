@@ -0,0 +1,107 @@
+"""Optional coordinator/worker fan-out for very large objects.
+
+A Step Functions state machine plans line-aligned byte-range shards with
+a coordinator function, ingests them through a Map state that invokes the
+ingest handler once per shard, and combines the shard results into one
+result per file. The handler starts an execution for every object of at
+least `threshold_bytes` (see lambda/coordinator.py).
+"""
+from typing import NamedTuple
+
+from aws_cdk import core
+import aws_cdk.aws_dynamodb as dynamodb
+import aws_cdk.aws_iam as iam
+import aws_cdk.aws_lambda as lmb
+import aws_cdk.aws_s3 as s3
+import aws_cdk.aws_stepfunctions as sfn
+
+# Lambda errors worth retrying a step on: throttling and service faults
+LAMBDA_ERRORS = ['Lambda.ServiceException', 'Lambda.AWSLambdaException', 'Lambda.SdkClientException',
+                 'Lambda.TooManyRequestsException']
+
+
+class FanOutSettings(NamedTuple):
+    # Shards ingested at the same time
+    max_concurrency: int = 10
+    # Objects from this size on are fanned out
+    threshold_bytes: int = 1024 * 1024 * 1024
+    # Target shard size; each shard must finish within the handler timeout
+    shard_bytes: int = 256 * 1024 * 1024
+    # Attempts per shard, including the first
+    shard_attempts: int = 3
+    timeout_hours: int = 6
+
+
+def invoke(function: lmb.IFunction, parameters: dict, result_path: str, retry_errors=LAMBDA_ERRORS,
+           max_attempts: int = 3) -> dict:
+    return {
+        'Type': 'Task',
+        'Resource': function.function_arn,
+        'Parameters': parameters,
+        'ResultPath': result_path,
+        'Retry': [{'ErrorEquals': retry_errors, 'IntervalSeconds': 2, 'BackoffRate': 2,
+                   'MaxAttempts': max_attempts - 1}],
+    }
+
+
+class FanOut(core.Construct):
+    def __init__(self, scope: core.Construct, id: str, *, handler: lmb.Function, code: lmb.Code,
+                 bucket: s3.IBucket, progress_table: dynamodb.ITable,
+                 settings: FanOutSettings = FanOutSettings()) -> None:
+        super().__init__(scope, id)
+        stack = core.Stack.of(self)
+
+        self.coordinator = lmb.Function(self, 'Coordinator',
+            runtime=lmb.Runtime.PYTHON_3_7,
+            handler='coordinator.handler',
+            code=code,
+            timeout=core.Duration.minutes(5),
+            environment={
+                'PROGRESS_TABLE': progress_table.table_name,
+                'SHARD_BYTES': str(settings.shard_bytes),
+            })
+        bucket.grant_read(self.coordinator)
+        # Merging shard rejects writes the sidecar and deletes the parts
+        bucket.grant_put(self.coordinator)
+        bucket.grant_delete(self.coordinator)
+        progress_table.grant_read_write_data(self.coordinator)
+
+        plan = sfn.CustomState(self, 'PlanShards', state_json=invoke(self.coordinator,
+            {'step': 'plan', 'object.$': '$.object'}, '$.plan'))
+        ingest = sfn.Map(self, 'IngestShards',
+            items_path='$.plan.shards',
+            max_concurrency=settings.max_concurrency,
+            parameters={'object.$': '$.object', 'shard.$': '$$.Map.Item.Value'},
+            result_path='$.shards')
+        ingest.iterator(sfn.CustomState(self, 'IngestShard', state_json=invoke(handler,
+            {'object.$': '$.object', 'shard.$': '$.shard'}, '$', ['States.ALL'], settings.shard_attempts)))
+        combine = sfn.CustomState(self, 'CombineShards', state_json=invoke(self.coordinator,
+            {'step': 'combine', 'object.$': '$.object', 'shards.$': '$.shards'}, '$.result'))
+        # One catch around every step: whichever fails, including combine
+        # when shards failed to write, the claim is released so a later
+        # delivery can try again, and the execution fails.
+        steps = sfn.Parallel(self, 'IngestObject', output_path='$[0]')
+        steps.branch(plan.next(ingest).next(combine))
+        release = sfn.CustomState(self, 'ReleaseObject', state_json=invoke(self.coordinator,
+            {'step': 'release', 'object.$': '$.object'}, '$.result'))
+        steps.add_catch(release.next(sfn.Fail(self, 'IngestFailed')), result_path='$.error')
+
+        # The handler starts executions, so refer to the state machine by
+        # name there; its ARN would make the function and the state
+        # machine's role policy depend on each other.
+        state_machine_name = '{}-FanOut'.format(stack.stack_name)
+        self.state_machine = sfn.StateMachine(self, 'StateMachine',
+            state_machine_name=state_machine_name,
+            definition=steps,
+            timeout=core.Duration.hours(settings.timeout_hours))
+        # StateMachine is not IGrantable in this CDK version; grant its role.
+        self.coordinator.grant_invoke(self.state_machine.role)
+        handler.grant_invoke(self.state_machine.role)
+
+        state_machine_arn = stack.format_arn(service='states', resource='stateMachine', sep=':',
+                                             resource_name=state_machine_name)
+        handler.add_environment('FAN_OUT_STATE_MACHINE', state_machine_arn)
+        handler.add_environment('FAN_OUT_THRESHOLD', str(settings.threshold_bytes))
+        handler.add_to_role_policy(iam.PolicyStatement(
+            actions=['states:StartExecution'],
+            resources=[state_machine_arn]))
@@ -0,0 +1,85 @@
+"""Optional SQS buffer between the upload bucket and the ingest function.
+
+Without it S3 invokes the function once per object, so an upload burst
+becomes a burst of concurrent invocations all writing to the table. With
+it S3 notifications land in a queue that Lambda drains in batches, at most
+`max_concurrency` invocations at a time; messages that keep failing move
+to a dead-letter queue.
+"""
+from typing import NamedTuple
+
+from aws_cdk import core
+import aws_cdk.aws_cloudwatch as cloudwatch
+import aws_cdk.aws_lambda as lmb
+import aws_cdk.aws_s3 as s3
+import aws_cdk.aws_s3_notifications as s3_notifications
+import aws_cdk.aws_sqs as sqs
+
+
+class IngestQueueSettings(NamedTuple):
+    # Messages per invocation; above 10 Lambda requires a batching window
+    batch_size: int = 100
+    # How long Lambda gathers messages before invoking with a partial batch
+    batching_window_seconds: int = 10
+    # Concurrent invocations the queue may drive, at least 2
+    max_concurrency: int = 5
+    # Deliveries of a message before it moves to the dead-letter queue
+    max_receive_count: int = 3
+    # Must be at least the function timeout
+    visibility_timeout_seconds: int = 900
+    dead_letter_retention_days: int = 14
+
+    def validate(self) -> 'IngestQueueSettings':
+        # The limits Lambda and SQS enforce, checked at synth instead of deploy
+        if not 1 <= self.batch_size <= 10000:
+            raise ValueError('batch_size must be between 1 and 10000')
+        if not 0 <= self.batching_window_seconds <= 300:
+            raise ValueError('batching_window_seconds must be between 0 and 300')
+        if self.batch_size > 10 and not self.batching_window_seconds:
+            raise ValueError('batch_size above 10 needs a batching_window_seconds of at least 1')
+        if not 2 <= self.max_concurrency <= 1000:
+            raise ValueError('max_concurrency must be between 2 and 1000')
+        if not 1 <= self.max_receive_count <= 1000:
+            raise ValueError('max_receive_count must be between 1 and 1000')
+        if not 0 <= self.visibility_timeout_seconds <= 43200:
+            raise ValueError('visibility_timeout_seconds must be between 0 and 43200')
+        if not 1 <= self.dead_letter_retention_days <= 14:
+            raise ValueError('dead_letter_retention_days must be between 1 and 14')
+        return self
+
+
+class IngestQueue(core.Construct):
+    """Routes the bucket's object-created notifications through SQS to `handler`."""
+
+    def __init__(self, scope: core.Construct, id: str, *, bucket: s3.IBucket, handler: lmb.Function,
+                 settings: IngestQueueSettings = IngestQueueSettings()) -> None:
+        super().__init__(scope, id)
+        settings = settings.validate()
+
+        self.dead_letter_queue = sqs.Queue(self, 'DeadLetterQueue',
+            retention_period=core.Duration.days(settings.dead_letter_retention_days))
+
+        self.queue = sqs.Queue(self, 'Queue',
+            visibility_timeout=core.Duration.seconds(settings.visibility_timeout_seconds),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=settings.max_receive_count,
+                queue=self.dead_letter_queue))
+
+        bucket.add_event_notification(s3.EventType.OBJECT_CREATED, s3_notifications.SqsDestination(self.queue))
+        self.queue.grant_consume_messages(handler)
+
+        mapping = handler.add_event_source_mapping('IngestQueueSource',
+            event_source_arn=self.queue.queue_arn,
+            batch_size=settings.batch_size,
+            max_batching_window=core.Duration.seconds(settings.batching_window_seconds))
+        # Not modelled by this CDK version: partial batch responses and the
+        # per-source concurrency cap.
+        source = mapping.node.default_child
+        source.add_property_override('FunctionResponseTypes', ['ReportBatchItemFailures'])
+        source.add_property_override('ScalingConfig.MaximumConcurrency', settings.max_concurrency)
+
+        self.dead_letter_alarm = cloudwatch.Alarm(self, 'DeadLetterAlarm',
+            metric=self.dead_letter_queue.metric_approximate_number_of_messages_visible(
+                period=core.Duration.minutes(5)),
+            threshold=1,
+            evaluation_periods=1)
@@ -0,0 +1,30 @@
+"""Lambda layers for the optional input formats.
+
+Parquet objects are read with pyarrow and zstd objects are decompressed
+with zstandard. Neither comes with the Lambda Python runtime, and the
+bundled asset only holds the handler's own modules (see bundling.py), so
+the handler gets them from layers. Without the matching layer, an object
+of that format fails with an error naming the missing package. A layer
+must be built for the function's runtime and architecture (see
+performance.py).
+"""
+from typing import NamedTuple, Optional, Tuple
+
+from aws_cdk import core
+import aws_cdk.aws_lambda as lmb
+
+
+class InputLayers(NamedTuple):
+    # Layer providing pyarrow, e.g. the region's AWS SDK for pandas layer
+    parquet_arn: Optional[str] = None
+    # Layer providing zstandard
+    zstd_arn: Optional[str] = None
+
+    def arns(self) -> Tuple[str, ...]:
+        # One layer may provide both packages
+        return tuple(dict.fromkeys(arn for arn in (self.parquet_arn, self.zstd_arn) if arn))
+
+
+def add_input_layers(scope: core.Construct, function: lmb.Function, layers: InputLayers) -> None:
+    function.add_layers(*(lmb.LayerVersion.from_layer_version_arn(scope, 'InputLayer{}'.format(index), arn)
+                          for index, arn in enumerate(layers.arns())))
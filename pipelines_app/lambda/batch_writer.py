@@ -0,0 +1,216 @@
+import os
+import random
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from decimal import Decimal
+
+# DynamoDB BatchWriteItem limits
+MAX_BATCH_ITEMS = 25
+MAX_ITEM_BYTES = 400 * 1024
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+# Rough allowance for the JSON framing and type descriptors around each item
+REQUEST_OVERHEAD_BYTES = 128
+
+# Items buffered before batches are formed; 0 sends batches in arrival order
+REORDER_WINDOW = int(os.environ.get('WRITE_REORDER_WINDOW', 250))
+
+THROTTLE_ERROR_CODES = (
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+    'ThrottlingException',
+)
+
+
+@dataclass
+class WriteResult:
+    written: int = 0
+    retried: int = 0
+    failed: int = 0
+    deduplicated: int = 0
+    batches: int = 0
+    throttled: int = 0
+
+    def add(self, other):
+        for name, value in asdict(other).items():
+            setattr(self, name, getattr(self, name) + value)
+        return self
+
+    def as_dict(self):
+        return asdict(self)
+
+
+class Delete:
+    """A request to delete the item with this key, queued alongside puts."""
+
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return isinstance(other, Delete) and other.key == self.key
+
+    def __repr__(self):
+        return 'Delete({!r})'.format(self.key)
+
+
+def item_size(item):
+    return sum(_size(name) + _size(value) for name, value in item.items())
+
+
+def _size(value):
+    if isinstance(value, str):
+        return len(value.encode('utf8'))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        return 21
+    if isinstance(value, dict):
+        return 3 + sum(_size(k) + _size(v) + 1 for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return 3 + sum(_size(v) + 1 for v in value)
+    return len(str(value).encode('utf8'))
+
+
+def partition_hash(key):
+    return zlib.crc32(str(key).encode('utf8'))
+
+
+def interleave(entries):
+    """Splits (key, request) pairs into batches that each span the key hash range.
+
+    Sorting by hash and dealing the requests out round-robin gives every
+    batch a slice of every part of the hash space, so sorted input no longer
+    sends whole batches to the same partitions.
+    """
+    ordered = sorted(entries, key=lambda entry: partition_hash(entry[0]))
+    batches = -(-len(ordered) // MAX_BATCH_ITEMS)
+    return [[request for _, request in ordered[index::batches]] for index in range(batches)]
+
+
+def is_throttle(error):
+    response = getattr(error, 'response', None) or {}
+    return response.get('Error', {}).get('Code') in THROTTLE_ERROR_CODES
+
+
+class BatchWriter:
+    """Buffers items into BatchWriteItem requests against a single table.
+
+    Items sharing a key inside one pending batch are collapsed so the last
+    write wins. With a `reorder_window` up to that many items are buffered
+    and sent as interleaved batches (see interleave); a key occurs only
+    once per window and windows go out in order, so last-write-wins still
+    holds. UnprocessedItems and throttled requests are retried with
+    exponential backoff and full jitter until max_attempts is reached, after
+    which the remaining items are counted as failed. With a `rate_limiter`
+    (see rate.AdaptiveRateLimiter) every call is paced by it and reports
+    back how much of the batch was throttled.
+    """
+
+    def __init__(self, dynamodb, table_name, key_name='movieName',
+                 max_attempts=8, base_delay=0.05, max_delay=5.0, sleep=time.sleep, rate_limiter=None,
+                 reorder_window=0):
+        self.table_name = table_name
+        self.key_name = key_name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limiter = rate_limiter
+        self.reorder_window = max(reorder_window, MAX_BATCH_ITEMS)
+        self.result = WriteResult()
+        self._dynamodb = dynamodb
+        self._sleep = sleep
+        self._pending = {}
+        self._pending_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def put(self, item):
+        size = item_size(item) + REQUEST_OVERHEAD_BYTES
+        if size > MAX_ITEM_BYTES:
+            print('Skipping item {} larger than {} bytes'.format(item.get(self.key_name), MAX_ITEM_BYTES))
+            self.result.failed += 1
+            return
+
+        self._enqueue(item[self.key_name], {'PutRequest': {'Item': item}}, size)
+
+    def delete(self, key):
+        self._enqueue(key, {'DeleteRequest': {'Key': {self.key_name: key}}}, _size(key) + REQUEST_OVERHEAD_BYTES)
+
+    def write(self, request):
+        if type(request) is Delete:
+            self.delete(request.key)
+        else:
+            self.put(request)
+
+    def _enqueue(self, key, request, size):
+        previous = self._pending.pop(key, None)
+        if previous is not None:
+            self.result.deduplicated += 1
+            self._pending_bytes -= previous[1]
+        elif self._pending_bytes + size > MAX_REQUEST_BYTES:
+            self.flush()
+
+        self._pending[key] = (request, size)
+        self._pending_bytes += size
+        if len(self._pending) >= self.reorder_window:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = {}
+        self._pending_bytes = 0
+        if len(pending) <= MAX_BATCH_ITEMS:
+            self._send([request for request, _ in pending.values()])
+            return
+        for requests in interleave((key, request) for key, (request, _) in pending.items()):
+            self._send(requests)
+
+    def _send(self, requests):
+        self.result.batches += 1
+        attempt = 0
+        limiter = self.rate_limiter
+        while requests:
+            if limiter is not None:
+                limiter.acquire(len(requests))
+            try:
+                response = self._dynamodb.batch_write_item(RequestItems={self.table_name: requests})
+            except Exception as e:
+                if not is_throttle(e):
+                    raise
+                unprocessed = requests
+                self.result.throttled += 1
+                if limiter is not None:
+                    limiter.record(len(requests), len(requests), throttled=True)
+            else:
+                unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+                self.result.written += len(requests) - len(unprocessed)
+                if limiter is not None:
+                    limiter.record(len(requests), len(unprocessed))
+            if not unprocessed:
+                return
+
+            if limiter is not None and len(unprocessed) < len(requests):
+                # The limiter is slowing down to a rate the table takes;
+                # only calls that made no progress count towards giving up.
+                attempt = 0
+            attempt += 1
+            if attempt >= self.max_attempts:
+                self.result.failed += len(unprocessed)
+                return
+            self.result.retried += len(unprocessed)
+            self._sleep(self._backoff(attempt))
+            requests = unprocessed
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
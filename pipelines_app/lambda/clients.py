@@ -0,0 +1,119 @@
+"""Per-container registry of AWS clients.
+
+Clients are created on first use and reused by every later invocation that
+lands on the same warm container, so credential resolution, endpoint setup
+and TLS handshakes happen once instead of once per row or per event. Tests
+inject stand-ins with set_client/set_resource and clear them with reset.
+"""
+import os
+import threading
+
+DEFAULT_SETTINGS = {
+    'max_pool_connections': 32,
+    'tcp_keepalive': True,
+    'connect_timeout': 2.0,
+    'read_timeout': 10.0,
+    'retry_mode': 'standard',
+    'max_attempts': 5,
+}
+
+_registry = {}
+_settings = {}
+_lock = threading.RLock()
+
+
+def _env(name, default):
+    value = os.environ.get('CLIENT_' + name.upper())
+    if value is None:
+        return default
+    if isinstance(default, bool):
+        return value.lower() in ('1', 'true', 'yes')
+    return type(default)(value)
+
+
+def settings():
+    merged = {name: _env(name, default) for name, default in DEFAULT_SETTINGS.items()}
+    merged.update(_settings)
+    return merged
+
+
+def configure(**overrides):
+    unknown = set(overrides) - set(DEFAULT_SETTINGS)
+    if unknown:
+        raise ValueError('Unknown client settings: {}'.format(', '.join(sorted(unknown))))
+    _settings.update(overrides)
+
+
+def client_config():
+    from botocore.config import Config
+
+    current = settings()
+    return Config(
+        max_pool_connections=current['max_pool_connections'],
+        tcp_keepalive=current['tcp_keepalive'],
+        connect_timeout=current['connect_timeout'],
+        read_timeout=current['read_timeout'],
+        retries={'mode': current['retry_mode'], 'max_attempts': current['max_attempts']})
+
+
+def _get(kind, service, factory):
+    entry = _registry.get((kind, service))
+    if entry is None:
+        with _lock:
+            entry = _registry.get((kind, service))
+            if entry is None:
+                entry = _registry[(kind, service)] = factory()
+    return entry
+
+
+def _create_client(service):
+    import boto3
+
+    return boto3.client(service, config=client_config())
+
+
+def _create_resource(service):
+    import boto3
+
+    return boto3.resource(service, config=client_config())
+
+
+def get_client(service):
+    return _get('client', service, lambda: _create_client(service))
+
+
+def get_resource(service):
+    return _get('resource', service, lambda: _create_resource(service))
+
+
+def get_s3():
+    return get_client('s3')
+
+
+def get_dynamodb():
+    return get_resource('dynamodb')
+
+
+def get_dynamodb_client():
+    # Resources are not thread-safe, but their client is, and it converts
+    # native Python values the same way, since the resource registers that
+    # conversion on it. Threads share this one.
+    return get_dynamodb().meta.client
+
+
+def get_table(name):
+    return _get('table', name, lambda: get_dynamodb().Table(name))
+
+
+def set_client(service, client):
+    _registry[('client', service)] = client
+
+
+def set_resource(service, resource):
+    _registry[('resource', service)] = resource
+
+
+def reset():
+    with _lock:
+        _registry.clear()
+        _settings.clear()
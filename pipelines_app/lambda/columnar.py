@@ -0,0 +1,115 @@
+"""Parquet input: record batches read straight from S3 with column projection.
+
+Parquet keeps its index in a footer, so the object is opened as a seekable
+file whose reads are byte-range GETs rather than downloaded whole. Batches
+are decoded one row group at a time and only the columns the table needs
+are fetched, so memory follows the row-group size and not the file size.
+pyarrow is optional: it is imported only when a Parquet object arrives, and
+the deployed function gets it from a layer (see input_layers.py).
+"""
+import io
+import math
+import os
+import time
+from decimal import Decimal
+
+PARQUET_SUFFIXES = ('.parquet', '.parq')
+PARQUET_BATCH_ROWS = int(os.environ.get('PARQUET_BATCH_ROWS', 10000))
+COLUMNS = ('movieName', 'title', 'plot', 'rating')
+
+
+def is_parquet(key):
+    return key.lower().endswith(PARQUET_SUFFIXES)
+
+
+class S3RangeFile(io.RawIOBase):
+    """Read-only, seekable view of an S3 object; every read is a ranged GET."""
+
+    def __init__(self, s3, bucket, key, size=None, version_id=None, etag=None, timer=None):
+        super().__init__()
+        self._s3 = s3
+        self._timer = timer
+        self._request = {'Bucket': bucket, 'Key': key}
+        if version_id:
+            self._request['VersionId'] = version_id
+        if etag:
+            self._request['IfMatch'] = etag
+        if size is None:
+            size = s3.head_object(**self._request)['ContentLength']
+        self.size = size
+        self._position = 0
+        self.requests = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError('Negative seek position {}'.format(offset))
+        self._position = offset
+        return offset
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.size, self._position + size)
+        if end <= self._position:
+            return b''
+        start = time.perf_counter()
+        response = self._s3.get_object(Range='bytes={}-{}'.format(self._position, end - 1), **self._request)
+        data = response['Body'].read()
+        if self._timer is not None:
+            self._timer.add(time.perf_counter() - start, len(data))
+        self.requests += 1
+        self._position += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def record_batches(s3, bucket, key, size=None, version_id=None, etag=None,
+                   columns=COLUMNS, batch_rows=PARQUET_BATCH_ROWS, timer=None):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('The pyarrow package is required to ingest Parquet objects; '
+                           'deploy with InputLayers(parquet_arn=...)') from None
+
+    source = S3RangeFile(s3, bucket, key, size=size, version_id=version_id, etag=etag, timer=timer)
+    return pq.ParquetFile(source).iter_batches(batch_size=batch_rows, columns=list(columns))
+
+
+def _number(value):
+    # boto3 rejects floats; Decimal(str()) keeps the value as written.
+    # NaN and infinities stay floats, for non_finite() to find.
+    if isinstance(value, float) and math.isfinite(value):
+        return Decimal(str(value))
+    return value
+
+
+def non_finite(row, columns=COLUMNS):
+    """Name of the first column of `row` holding NaN or an infinity, which
+    DynamoDB cannot store, else None."""
+    for name, value in zip(columns, row):
+        if isinstance(value, float):
+            return name
+    return None
+
+
+def batch_rows(batches, columns=COLUMNS):
+    """Yields one tuple per row, in `columns` order, from record batches."""
+    for batch in batches:
+        values = [[_number(value) for value in batch.column(batch.schema.get_field_index(name)).to_pylist()]
+                  for name in columns]
+        yield from zip(*values)
@@ -0,0 +1,175 @@
+"""Fan-out of very large line-based objects over byte-range shards.
+
+When FAN_OUT_STATE_MACHINE is set, the ingest handler hands objects of at
+least FAN_OUT_THRESHOLD bytes to a Step Functions execution instead of
+reading them itself. The execution runs three steps:
+
+- plan: this module's handler cuts the object into shards of about
+  SHARD_BYTES, moving each boundary forward to the start of the next line
+  so that no line is split between two shards.
+- ingest: a Map state invokes the ingest handler once per shard, a bounded
+  number at a time (see handler.ingest_shard).
+- combine: this module's handler adds up the per-shard counts, merges the
+  shards' rejects into the object's sidecar and completes the object's
+  claim in the ingest ledger, or raises ShardsFailed if rows failed to
+  write.
+
+If any step fails, the execution releases the claim (the release step)
+and fails, so a later delivery of the object is ingested again.
+
+The handler claims the object before starting the execution, so a
+duplicate notification is skipped while the execution runs.
+"""
+import json
+import os
+
+import clients
+import progress
+from columnar import is_parquet
+from metrics import COUNT, emit_object_metrics, new_metrics
+from progress import CLAIMED, Checkpoint, Claim, ProgressStore
+from reader import detect_compression, read_range
+from rejects import Rejects, rejects_key
+
+FAN_OUT_STATE_MACHINE = os.environ.get('FAN_OUT_STATE_MACHINE')
+FAN_OUT_THRESHOLD = int(os.environ.get('FAN_OUT_THRESHOLD', 1024 * 1024 * 1024))
+SHARD_BYTES = int(os.environ.get('SHARD_BYTES', 256 * 1024 * 1024))
+# How long the claim on a fanned-out object lasts
+FAN_OUT_LEASE_SECONDS = int(os.environ.get('FAN_OUT_LEASE_SECONDS', 6 * 3600))
+# Bytes read past a nominal boundary to find where the next line starts
+PROBE_BYTES = 64 * 1024
+
+COUNTS = ('written', 'retried', 'failed', 'deduplicated', 'batches', 'throttled', 'accepted', 'rejected', 'lines')
+
+
+class ShardsFailed(Exception):
+    pass
+
+
+def should_fan_out(key, size, delta_mode=False):
+    # Compressed and Parquet objects cannot be cut at byte offsets, and
+    # delta mode needs to see every row of a key in one place.
+    if not FAN_OUT_STATE_MACHINE or size is None or size < FAN_OUT_THRESHOLD or delta_mode:
+        return False
+    return detect_compression(key) is None and not is_parquet(key)
+
+
+def start_fan_out(sfn, obj):
+    response = sfn.start_execution(stateMachineArn=FAN_OUT_STATE_MACHINE, input=json.dumps({'object': obj}))
+    return response['executionArn']
+
+
+def shard_key(key, index):
+    """Key the rejects of one shard are stored under until they are merged."""
+    return '{}.part-{:05d}'.format(key, index)
+
+
+def next_line_start(s3, bucket, key, position, size, version_id=None, etag=None, probe=PROBE_BYTES):
+    """Offset of the first line that starts at or after `position`, or None
+    if no line does."""
+    # A line starts at `position` when the byte before it is a newline, so
+    # probing starts one byte early.
+    offset = position - 1
+    while offset < size:
+        end = min(offset + probe, size)
+        newline = read_range(s3, bucket, key, offset, end, version_id, etag).find(b'\n')
+        if newline >= 0:
+            start = offset + newline + 1
+            return start if start < size else None
+        offset = end
+    return None
+
+
+def plan_shards(s3, bucket, key, size, version_id=None, etag=None, shard_bytes=SHARD_BYTES):
+    starts = [0]
+    for position in range(shard_bytes, size, shard_bytes):
+        if position <= starts[-1]:
+            # The previous boundary moved past this one over a long line.
+            continue
+        start = next_line_start(s3, bucket, key, position, size, version_id, etag)
+        if start is None:
+            break
+        starts.append(start)
+    ends = starts[1:] + [size]
+    return [{'index': index, 'start': start, 'end': end} for index, (start, end) in enumerate(zip(starts, ends))]
+
+
+def plan(obj):
+    s3 = clients.get_s3()
+    request = {'Bucket': obj['bucket'], 'Key': obj['key']}
+    if obj.get('versionId'):
+        request['VersionId'] = obj['versionId']
+    head = s3.head_object(**request)
+    size = head['ContentLength']
+    if detect_compression(obj['key'], head.get('ContentEncoding')):
+        # Stored compressed despite its name: one worker reads it whole.
+        return {'shards': [{'index': 0, 'start': 0, 'end': None}]}
+    return {'shards': plan_shards(s3, obj['bucket'], obj['key'], size, obj.get('versionId'), obj.get('eTag'))}
+
+
+def merge_rejects(obj, shards):
+    """Rewrites the shards' rejects into the object's sidecar, numbering
+    lines from the start of the object, and returns the rejected count."""
+    s3 = clients.get_s3()
+    bucket, key, version = obj['bucket'], obj['key'], obj.get('version')
+    merged = Rejects()
+    lines_before = 0
+    for shard in shards:
+        if shard.get('rejected'):
+            part = Rejects(limit=merged.limit)
+            part.load(s3, bucket, shard_key(key, shard['index']), version)
+            for row in part.rows:
+                if row['line'] is not None:
+                    row['line'] += lines_before
+            merged.rows.extend(part.rows[:merged.limit - len(merged.rows)])
+            merged.count += part.count
+            s3.delete_object(Bucket=bucket, Key=rejects_key(shard_key(key, shard['index'])))
+        lines_before += shard.get('lines') or 0
+    if merged.count:
+        merged.write(s3, bucket, key, version)
+    return merged.count
+
+
+def claim_of(obj):
+    if not obj.get('revision') or not progress.PROGRESS_TABLE:
+        return None, None
+    return ProgressStore(clients.get_dynamodb_client(), progress.PROGRESS_TABLE), Claim(CLAIMED, Checkpoint(), obj['revision'])
+
+
+def combine(obj, shards):
+    shards = sorted(shards, key=lambda shard: shard['index'])
+    totals = {name: sum(shard.get(name) or 0 for shard in shards) for name in COUNTS}
+    totals['rejected'] = merge_rejects(obj, shards)
+    result = dict(totals, bucket=obj['bucket'], key=obj['key'], shards=len(shards),
+                  status='failed' if totals['failed'] else 'succeeded',
+                  elapsed_seconds=max((shard.get('elapsed_seconds') or 0 for shard in shards), default=0))
+    emit_object_metrics(new_metrics(), [result], totals, values={'Shards': (len(shards), COUNT)},
+                        Bucket=obj['bucket'], Key=obj['key'], Status=result['status'])
+    print(json.dumps(result))
+    if totals['failed']:
+        # Fails the execution; its catch releases the claim.
+        raise ShardsFailed('{} rows of {} failed to write'.format(totals['failed'], obj['key']))
+    store, claim = claim_of(obj)
+    if store:
+        store.complete(obj['bucket'], obj['key'], obj['version'], claim)
+    return result
+
+
+def release(obj):
+    """Gives up the claim after a step of the execution failed for good,
+    so a later delivery of the object can try again."""
+    store, claim = claim_of(obj)
+    if store:
+        store.release(obj['bucket'], obj['key'], obj['version'], claim)
+    return {'bucket': obj['bucket'], 'key': obj['key'], 'status': 'failed'}
+
+
+def handler(event, context):
+    step = event['step']
+    if step == 'plan':
+        return plan(event['object'])
+    if step == 'combine':
+        return combine(event['object'], event['shards'])
+    if step == 'release':
+        return release(event['object'])
+    raise ValueError('Unknown fan-out step {}'.format(step))
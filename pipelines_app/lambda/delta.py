@@ -0,0 +1,119 @@
+"""Delta ingestion: write only the rows that changed since the last version.
+
+For every source object the last fully ingested version's rows are kept as
+one gzipped JSON object in the state bucket, mapping each movieName to a
+64-bit digest of its item. The next upload of the same key is compared
+against that map: unchanged rows are dropped before they reach the
+writers, and keys that disappeared are deleted once the whole file has
+been read.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+from batch_writer import Delete
+
+DELTA_MODE = os.environ.get('DELTA_MODE', '').lower() in ('1', 'true', 'yes')
+STATE_BUCKET = os.environ.get('STATE_BUCKET')
+FINGERPRINT_PREFIX = 'fingerprints/'
+
+CURRENT = 'current'
+PARTIAL = 'partial'
+
+
+def fingerprint(item):
+    canonical = json.dumps(item, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(canonical.encode('utf8'), digest_size=8).hexdigest()
+
+
+def is_missing(error):
+    response = getattr(error, 'response', None) or {}
+    return response.get('Error', {}).get('Code') in ('NoSuchKey', '404')
+
+
+class FingerprintStore:
+    def __init__(self, s3, bucket, prefix=FINGERPRINT_PREFIX):
+        self._s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, source_bucket, key, slot):
+        return '{}{}/{}.{}.json.gz'.format(self.prefix, source_bucket, key, slot)
+
+    def load(self, source_bucket, key, slot=CURRENT):
+        """Returns (version, fingerprints), or (None, None) if nothing is stored."""
+        try:
+            body = self._s3.get_object(Bucket=self.bucket, Key=self._key(source_bucket, key, slot))['Body'].read()
+        except Exception as e:
+            if not is_missing(e):
+                raise
+            return None, None
+        document = json.loads(gzip.decompress(body))
+        return document['version'], document['fingerprints']
+
+    def save(self, source_bucket, key, version, fingerprints, slot=CURRENT):
+        body = gzip.compress(json.dumps({'version': version, 'fingerprints': fingerprints},
+                                        separators=(',', ':')).encode('utf8'), compresslevel=5)
+        self._s3.put_object(Bucket=self.bucket, Key=self._key(source_bucket, key, slot), Body=body,
+                            ContentType='application/json', ContentEncoding='gzip')
+
+    def discard(self, source_bucket, key, slot=PARTIAL):
+        self._s3.delete_object(Bucket=self.bucket, Key=self._key(source_bucket, key, slot))
+
+
+class DeltaFilter:
+    """Drops unchanged items and, at the end of the file, emits deletes.
+
+    `current` may be seeded with the fingerprints gathered before a
+    checkpoint. When it cannot be trusted to cover the rows read before the
+    checkpoint, pass `track_removals=False`, so no keys are deleted.
+
+    A rejected row may be the only row of a key that is still in the file,
+    so nothing is deleted while `rejects` (or `rejected_before`, the count
+    of earlier invocations) holds any; the missing keys keep their previous
+    fingerprints instead, like the items they leave in the table.
+    """
+
+    def __init__(self, previous, current=None, key_name='movieName', track_removals=True,
+                 rejects=None, rejected_before=0):
+        self.previous = previous or {}
+        self.current = current if current is not None else {}
+        self.key_name = key_name
+        self.track_removals = track_removals
+        self.rejects = rejects
+        self.rejected_before = rejected_before
+        self.unchanged = 0
+        self.removed = 0
+
+    def filter(self, items):
+        previous = self.previous
+        current = self.current
+        key_name = self.key_name
+        for item in items:
+            name = item[key_name]
+            digest = fingerprint(item)
+            # A key repeated within the file is always written: an earlier
+            # occurrence may already have replaced the stored item.
+            if name not in current and previous.get(name) == digest:
+                self.unchanged += 1
+                current[name] = digest
+                continue
+            current[name] = digest
+            yield item
+        if not self.track_removals:
+            return
+        missing = previous.keys() - current.keys()
+        if self.rejected_before or (self.rejects is not None and self.rejects.count):
+            current.update((name, previous[name]) for name in missing)
+            return
+        for name in missing:
+            self.removed += 1
+            yield Delete(name)
+
+    def stats(self):
+        return {
+            'previous_keys': len(self.previous),
+            'unchanged': self.unchanged,
+            'deleted': self.removed,
+        }
@@ -1,42 +1,529 @@
 import json
-import boto3
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import quote_plus, unquote_plus
+
+import batch_writer
+import clients
+import columnar
+import coordinator
+import delta
+import progress
+import queue_batch
+import rate
+from parsing import CsvParser, JsonLinesParser, is_json_lines
+from pipeline import IngestPipeline
+from delta import PARTIAL, DeltaFilter, FingerprintStore
+from metrics import BYTES, WRITE_COUNTS, Timer, emit_object_metrics, new_metrics, record_metrics
+from progress import CLAIMED, DEFAULT_LEASE_SECONDS, Checkpoint, Deadline, ProgressStore
+from reader import LineReader, open_object
+from rejects import Rejects, is_rejects_key
+from writer_pool import WriterPool, default_worker_count
+
+TABLE_NAME = os.environ.get('TABLE_NAME', 'movieDetails')
+MAX_CONCURRENT_OBJECTS = int(os.environ.get('MAX_CONCURRENT_OBJECTS', 4))
+TOO_LARGE = 'item is larger than DynamoDB\'s {} KB limit'.format(batch_writer.MAX_ITEM_BYTES // 1024)
 
 def handler(event, context):
-    # TODO implement
-    bucket = event['Records'][0]['s3']['bucket']['name']
-    key = event['Records'][0]['s3']['object']['key']
+    if 'shard' in event:
+        # A worker step of the fan-out state machine (see coordinator.py)
+        return ingest_shard(event['object'], event['shard'])
+    if 'backfill' in event:
+        return ingest_backfill_batch(event['backfill'], context)
+    if queue_batch.is_sqs_event(event):
+        return handle_messages(event['Records'], context)
+    records = [record for record in event.get('Records', []) if 's3' in record]
+    reingest = bool(event.get('reingest'))
+    results = ingest_before_deadline(partial(ingest_records, reingest=reingest), records, context, reingest)
+    if any(result['status'] == 'failed' for result in results):
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'message': 'Failed to insert data into db', 'objects': results})
+        }
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'message': 'Hello from Lambda! Completed inserting data into db', 'objects': results})
+    }
+
+def handle_messages(messages, context):
+    pairs, failed_messages = queue_batch.s3_records(messages)
+    records = [record for _, record in pairs]
+    results = ingest_before_deadline(ingest_queued, records, context)
+    failed_messages += [message_id for (message_id, _), result in zip(pairs, results) if result['status'] == 'failed']
+    return queue_batch.batch_item_failures(failed_messages)
+
+def ingest_queued(records, deadline=None):
+    results = [None] * len(records)
+    small = [index for index, record in enumerate(records) if can_micro_batch(record)]
+    if len(small) > 1:
+        for index, result in zip(small, ingest_micro_batch([records[index] for index in small], deadline)):
+            results[index] = result
+    rest = [index for index, result in enumerate(results) if result is None]
+    for index, result in zip(rest, ingest_records([records[index] for index in rest], deadline=deadline)):
+        results[index] = result
+    return results
+
+def can_micro_batch(record):
+    size = record['s3']['object'].get('size')
+    key = unquote_plus(record['s3']['object']['key'])
+    return (size is not None and size <= queue_batch.MICRO_BATCH_MAX_BYTES and not columnar.is_parquet(key)
+            and not (delta.DELTA_MODE and delta.STATE_BUCKET))
+
+def ingest_micro_batch(records, deadline=None):
+    # Rows of many small objects share one writer pool, so they go out in
+    # full BatchWriteItem requests. An object only completes once the pool
+    # has drained; if any write fails, every object of the batch is retried.
+    writers, _ = writer_pool()
+    start = time.perf_counter()
+    queued = []
+    error = None
+    writers.start()
     try:
-        s3 = boto3.client('s3')
-        response = s3.get_object(Bucket=bucket, Key=key)
-        csvcontent = response['Body'].read().split(b'\n')
-        for line in csvcontent:
-            data = line.decode('utf8').strip().split(',')
-            put_movie(data[0],data[1],data[2],data[3])
+        for record in records:
+            queued.append(queue_object(writers, record, deadline))
+        writers.close()
+    except Exception as e:
+        print(e)
+        error = str(e)
+    if not error and writers.result.failed:
+        error = '{} rows of the micro-batch failed to write'.format(writers.result.failed)
+    results = []
+    for result, state in queued:
+        if result['status'] == 'queued':
+            finish_queued_object(result, state, error)
+        results.append(result)
+    for record in records[len(queued):]:
+        bucket, key = object_fields(record)[:2]
+        results.append({'bucket': bucket, 'key': key, 'micro_batch': True, 'status': 'failed', 'error': error})
+    summary = writers.result.as_dict()
+    print('Micro-batched {} objects: {} rows in {} batches'.format(len(records), summary['written'], summary['batches']))
+    summary['rejected'] = sum(result.get('rejected', 0) for result in results)
+    emit_object_metrics(new_metrics(), results, summary, seconds=time.perf_counter() - start, MicroBatch=True)
+    return results
+
+def queue_object(writers, record, deadline=None):
+    bucket, key, version_id, size, etag = object_fields(record)
+    result = {'bucket': bucket, 'key': key, 'micro_batch': True}
+    if is_rejects_key(key):
+        result.update(status='skipped', skipped='rejects')
+        return result, None
+    if deadline is not None and deadline.expired():
+        result.update(status='failed', error='Ran out of time before reading {}'.format(key))
+        return result, None
+    etag, version = object_version(etag, version_id)
+    store, claim = claim_object(bucket, key, version, deadline)
+    if claim and claim.outcome != CLAIMED:
+        result.update(status='skipped', skipped=claim.outcome)
+        return result, None
+    rejects = Rejects()
+    parse = row_parser(key, rejects)
+    try:
+        chunks, _ = open_object(clients.get_s3(), bucket, key, version_id=version_id, size=size, etag=etag)
+        for item in parse(LineReader(chunks)):
+            writers.put(item)
+    except Exception as e:
+        print(e)
+        if claim:
+            store.release(bucket, key, version, claim)
+        result.update(status='failed', error=str(e))
+        return result, None
+    result.update(status='queued', written=rejects.accepted, accepted=rejects.accepted, rejected=rejects.count)
+    return result, (store, claim, version, rejects)
+
+def finish_queued_object(result, state, error=None):
+    store, claim, version, rejects = state
+    bucket, key = result['bucket'], result['key']
+    if not error and rejects.count:
+        try:
+            save_rejects(rejects, bucket, key, version)
+        except Exception as e:
+            print(e)
+            error = str(e)
+    if error:
+        if claim:
+            store.release(bucket, key, version, claim)
+        result.update(status='failed', error=error)
+        return
+    if claim:
+        store.complete(bucket, key, version, claim)
+    result['status'] = 'succeeded'
+
+def ingest_backfill_batch(batch, context):
+    # One batch of a backfill's distributed map: S3 list entries of the
+    # prefix, ingested like notifications so the ledger still skips objects
+    # that are complete (unless the backfill re-ingests) or in progress.
+    records = [{'s3': {'bucket': {'name': batch['bucket']},
+                       'object': {'key': quote_plus(item['Key']), 'size': item.get('Size'),
+                                  'eTag': item.get('Etag')}}}
+               for item in batch['items']]
+    start = time.perf_counter()
+    reingest = bool(batch.get('reingest'))
+    results = ingest_before_deadline(partial(ingest_records, reingest=reingest), records, context, reingest)
+    summary = backfill_summary(results, records, time.perf_counter() - start)
+    print(json.dumps(summary))
+    writes = {name: sum(result.get(name) or 0 for result in results) for name in WRITE_COUNTS}
+    emit_object_metrics(new_metrics(), results, writes, seconds=summary['seconds'],
+                        values={'Bytes': (summary['bytes'], BYTES),
+                                'RowsPerSecond': (summary['rows_per_second'], 'Count/Second')},
+                        Backfill=True)
+    if summary['objects_failed']:
+        # Failing the batch lets the state machine retry it; objects that
+        # completed in this attempt are skipped by the ledger next time.
+        raise RuntimeError('{} of {} objects failed: {}'.format(
+            summary['objects_failed'], summary['objects'], ', '.join(summary['failed_keys'][:10])))
+    return summary
+
+def backfill_summary(results, records, seconds):
+    statuses = [result['status'] for result in results]
+    rows = sum(result.get('written') or 0 for result in results)
+    size = sum(record['s3']['object']['size'] or 0 for record, result in zip(records, results)
+               if result['status'] not in ('skipped', 'failed'))
+    return {
+        'objects': len(results),
+        'objects_failed': statuses.count('failed'),
+        'succeeded': statuses.count('succeeded'),
+        'skipped': statuses.count('skipped'),
+        'continued': statuses.count('continued'),
+        'fanned_out': statuses.count('fanned_out'),
+        'failed_keys': [result['key'] for result in results if result['status'] == 'failed'],
+        'rows': rows,
+        'bytes': size,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds else 0.0,
+        'mb_per_second': round(size / seconds / 1e6, 2) if seconds else 0.0,
+    }
+
+def ingest_records(records, max_concurrency=MAX_CONCURRENT_OBJECTS, deadline=None, reingest=False):
+    concurrent_objects = max(1, min(max_concurrency, len(records)))
+    ingest = partial(ingest_record, deadline=deadline, reingest=reingest, concurrent_objects=concurrent_objects)
+    if concurrent_objects == 1:
+        return [ingest(record) for record in records]
+    with ThreadPoolExecutor(max_workers=concurrent_objects) as pool:
+        return list(pool.map(ingest, records))
+
+def ingest_before_deadline(ingest, records, context, reingest=False):
+    """Runs `ingest(records, deadline=...)`. Objects it stopped early, to
+    store their checkpoints before the function times out, are re-sent to
+    a new invocation, which carries on from those checkpoints."""
+    deadline = Deadline(context) if context is not None and progress_store() else None
+    results = ingest(records, deadline=deadline)
+    unfinished = [record for record, result in zip(records, results) if result['status'] == 'continued']
+    if unfinished:
+        continue_later(unfinished, context, reingest)
+    return results
+
+def continue_later(records, context, reingest=False):
+    # The checkpoints are already stored, so re-sending the original records
+    # makes the next invocation pick up where this one stopped.
+    payload = {'Records': records}
+    if reingest:
+        payload['reingest'] = True
+    clients.get_client('lambda').invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType='Event',
+        Payload=json.dumps(payload))
+
+def progress_store():
+    if not progress.PROGRESS_TABLE:
+        return None
+    return ProgressStore(clients.get_dynamodb_client(), progress.PROGRESS_TABLE)
+
+def object_fields(record):
+    return (record['s3']['bucket']['name'],
+            unquote_plus(record['s3']['object']['key']),
+            record['s3']['object'].get('versionId'),
+            record['s3']['object'].get('size'),
+            record['s3']['object'].get('eTag'))
+
+def object_version(etag, version_id):
+    if etag and not etag.startswith('"'):
+        etag = '"{}"'.format(etag)
+    # Identical re-uploads keep their ETag but get a new versionId, so the
+    # ledger tracks content by ETag whenever the event carries one.
+    return etag, etag or version_id
+
+def claim_object(bucket, key, version, deadline=None, lease=None, reingest=False):
+    store = progress_store() if version else None
+    if not store:
+        return None, None
+    if lease is None:
+        lease = deadline.lease_seconds() if deadline is not None else DEFAULT_LEASE_SECONDS
+    return store, store.claim(bucket, key, version, lease, reingest=reingest)
+
+def writer_pool(concurrent_objects=1):
+    limiter = rate.limiter_for(TABLE_NAME) if rate.WRITE_RATE_CONTROL else None
+    # Every writer thread holds one of the DynamoDB client's pooled
+    # connections; objects ingested side by side split them.
+    connections = clients.settings()['max_pool_connections']
+    workers = min(default_worker_count(), max(1, connections // concurrent_objects))
+    writers = WriterPool(clients.get_dynamodb_client(), TABLE_NAME, workers=workers, rate_limiter=limiter,
+                         reorder_window=batch_writer.REORDER_WINDOW)
+    return writers, limiter
+
+def row_parser(key, rejects):
+    if columnar.is_parquet(key):
+        return partial(parse_parquet, rejects=rejects)
+    if is_json_lines(key):
+        return partial(parse_json_movies, rejects=rejects)
+    return partial(parse_movies, rejects=rejects)
+
+def ingest_record(record, deadline=None, reingest=False, concurrent_objects=1):
+    bucket, key, version_id, size, etag = object_fields(record)
+    result = {'bucket': bucket, 'key': key}
+    if is_rejects_key(key):
+        # Our own rejects sidecar landing in the watched bucket
+        result.update(status='skipped', skipped='rejects')
+        return result
+    object_metrics = new_metrics()
+    try:
+        summary = ingest_object(bucket, key, version_id, size, etag, deadline, object_metrics, reingest,
+                                concurrent_objects)
     except Exception as e:
         print(e)
         print('Error getting object {} from bucket {}. Make sure they exist and your bucket is in the same region as this function.'.format(key, bucket))
-        return {
-        'statusCode': 500,
-        'body': json.dumps('Failed to insert data into db')
-        }
-        raise e
+        result.update(status='failed', error=str(e))
+        emit_object_metrics(object_metrics, [result], Bucket=bucket, Key=key, Status=result['status'])
+        return result
+    result.update(summary)
+    if summary.get('skipped'):
+        result['status'] = 'skipped'
+    elif summary.get('execution'):
+        result['status'] = 'fanned_out'
+    elif summary['failed']:
+        result['status'] = 'failed'
+    elif summary.get('checkpoint'):
+        result['status'] = 'continued'
+    else:
+        result['status'] = 'succeeded'
+    emit_object_metrics(object_metrics, [result], Bucket=bucket, Key=key, Status=result['status'])
+    return result
+
+def ingest_object(bucket, key, version_id=None, size=None, etag=None, deadline=None, object_metrics=None,
+                  reingest=False, concurrent_objects=1):
+    etag, version = object_version(etag, version_id)
+    fan_out = coordinator.should_fan_out(key, size, delta.DELTA_MODE and delta.STATE_BUCKET)
+    lease = coordinator.FAN_OUT_LEASE_SECONDS if fan_out else None
+    store, claim = claim_object(bucket, key, version, deadline, lease, reingest)
+    if claim and claim.outcome != CLAIMED:
+        return {'skipped': claim.outcome}
+    if fan_out:
+        obj = {'bucket': bucket, 'key': key, 'versionId': version_id, 'eTag': etag, 'size': size,
+               'version': version, 'revision': claim.revision if claim else None}
+        try:
+            execution = coordinator.start_fan_out(clients.get_client('stepfunctions'), obj)
+        except Exception:
+            if claim:
+                store.release(bucket, key, version, claim)
+            raise
+        print('Ingesting {} ({} bytes) in shards: {}'.format(key, size, execution))
+        return {'execution': execution}
+    checkpoint = claim.checkpoint if claim else Checkpoint()
+
+    parquet = columnar.is_parquet(key)
+    rejects = Rejects(line_offset=checkpoint.line_no)
+    parse = row_parser(key, rejects)
+    delta_store = delta_filter = None
+    if delta.DELTA_MODE and delta.STATE_BUCKET:
+        delta_store, delta_filter = open_delta(bucket, key, version, checkpoint, rejects, reingest)
+        parse_rows = parse
+
+        def parse(source):
+            return delta_filter.filter(parse_rows(source))
+
+    download = Timer()
+    try:
+        if parquet:
+            chunks = columnar.record_batches(clients.get_s3(), bucket, key, size=size, version_id=version_id,
+                                             etag=etag, timer=download)
+            compression, framing = None, None
+        else:
+            chunks, compression = open_object(clients.get_s3(), bucket, key, version_id=version_id, size=size,
+                                              etag=etag, start=checkpoint.offset, timer=download)
+            framing = LineReader
+        writers, limiter = writer_pool(concurrent_objects)
+        pipeline = IngestPipeline(writers)
+        # Only byte offsets into plain text can be resumed from; compressed
+        # and Parquet objects are always read in one invocation.
+        resumable = store is not None and compression is None and not parquet
+        should_stop = deadline.expired if deadline is not None and resumable else None
+        stopped = pipeline.run(chunks, parse, should_stop, framing)
+        if stopped and not pipeline.lines.offset:
+            raise RuntimeError('Ran out of time before ingesting any rows of {}'.format(key))
+    except Exception:
+        if claim:
+            store.release(bucket, key, version, claim)
+        raise
+
+    summary = writers.result.as_dict()
+    summary['writers'] = writers.worker_stats()
+    summary['stages'] = pipeline.stats()
+    if limiter is not None:
+        summary['write_rate'] = limiter.stats()
+        print('Write rate for {} settled at {} items/s'.format(key, summary['write_rate']['effective_rate']))
+    if compression:
+        summary['compression'] = compression
+    summary['accepted'] = rejects.accepted
+    summary['rejected'] = rejects.count
+    if checkpoint.offset:
+        summary['resumed_from'] = checkpoint.offset
+    if object_metrics is not None:
+        record_metrics(object_metrics, summary, download)
+    # Rows that failed to write are read again by the retry, which starts
+    # from the checkpoint this invocation claimed with. Nothing may record
+    # progress past them: not the checkpoint, the partial fingerprints, nor
+    # a sidecar the retry would merge its own rejects into.
+    failed = writers.result.failed
+    if (rejects.count or checkpoint.rejected) and not (failed and claim):
+        try:
+            save_rejects(rejects, bucket, key, version, resumed=bool(checkpoint.rejected))
+        except Exception:
+            if claim:
+                store.release(bucket, key, version, claim)
+            raise
+    if delta_filter is not None:
+        summary['delta'] = delta_filter.stats()
+        if stopped and not failed:
+            delta_store.save(bucket, key, version, delta_filter.current, PARTIAL)
+        elif not failed:
+            delta_store.save(bucket, key, version, delta_filter.current)
+            if checkpoint.offset:
+                delta_store.discard(bucket, key)
+    if not claim:
+        return summary
+    if failed:
+        store.release(bucket, key, version, claim)
+    elif stopped:
+        checkpoint = Checkpoint(
+            offset=checkpoint.offset + pipeline.lines.offset,
+            line_no=checkpoint.line_no + pipeline.lines.line_no,
+            rows=checkpoint.rows + writers.result.written,
+            invocations=checkpoint.invocations + 1,
+            rejected=checkpoint.rejected + summary['rejected'])
+        store.save_checkpoint(bucket, key, version, claim, checkpoint)
+        summary['checkpoint'] = checkpoint.as_dict()
+    else:
+        store.complete(bucket, key, version, claim)
+    return summary
+
+def ingest_shard(obj, shard):
+    # Shards are sized to finish in one invocation, so there is no
+    # checkpoint here; the state machine retries a failed shard whole.
+    bucket, key, version = obj['bucket'], obj['key'], obj.get('version')
+    rejects = Rejects()
+    parse = row_parser(key, rejects)
+    download = Timer()
+    chunks, _ = open_object(clients.get_s3(), bucket, key, version_id=obj.get('versionId'), size=obj.get('size'),
+                            etag=obj.get('eTag'), start=shard['start'], end=shard['end'], timer=download)
+    writers, _ = writer_pool()
+    pipeline = IngestPipeline(writers)
+    pipeline.run(chunks, parse)
+    stages = pipeline.stats()
+    summary = writers.result.as_dict()
+    summary.update(shard, lines=pipeline.lines.line_no, accepted=rejects.accepted, rejected=rejects.count,
+                   elapsed_seconds=stages['elapsed_seconds'])
+    if rejects.count:
+        rejects.write(clients.get_s3(), bucket, coordinator.shard_key(key, shard['index']), version)
+    emit_object_metrics(new_metrics(), summary=dict(summary, stages=stages), download=download,
+                        Bucket=bucket, Key=key, Shard=shard['index'])
+    return summary
+
+def open_delta(bucket, key, version, checkpoint, rejects, reingest=False):
+    store = FingerprintStore(clients.get_s3(), delta.STATE_BUCKET)
+    # A re-ingest writes every row whatever was ingested before, for example
+    # to refill a restored table, and deletes nothing.
+    previous = {} if reingest else store.load(bucket, key)[1]
+    open_filter = partial(DeltaFilter, rejects=rejects, rejected_before=checkpoint.rejected)
+    if not checkpoint.offset:
+        return store, open_filter(previous)
+    # Resuming: the rows read before the checkpoint were fingerprinted into
+    # the partial map. Without it removals can't be told apart from rows
+    # that were simply not seen in this invocation.
+    partial_version, current = store.load(bucket, key, PARTIAL)
+    if partial_version != version:
+        return store, open_filter(previous, track_removals=False)
+    return store, open_filter(previous, current)
+
+def save_rejects(rejects, bucket, key, version, resumed=False):
+    # One sidecar per file: a continuation merges what earlier invocations
+    # of the same file rejected before rewriting it.
+    if resumed:
+        rejects.load(clients.get_s3(), bucket, key, version)
+    rejects.write(clients.get_s3(), bucket, key, version)
+
+def parse_movies(lines, parser=None, rejects=None):
+    rejects = rejects if rejects is not None else Rejects()
+    rejects.track(lines)
+    for data in (parser or CsvParser(on_reject=rejects.add)).rows(lines):
+        if len(data) < 4:
+            rejects.add('expected 4 fields, got {}'.format(len(data)), ','.join(data))
+        elif not data[0]:
+            rejects.add('empty movieName', ','.join(data))
+        else:
+            item = movie_item(data[0],data[1],data[2],data[3])
+            if too_large(item):
+                rejects.add(TOO_LARGE, ','.join(data))
+                continue
+            rejects.accepted += 1
+            yield item
+
+def parse_json_movies(lines, parser=None, rejects=None):
+    rejects = rejects if rejects is not None else Rejects()
+    rejects.track(lines)
+    for record in (parser or JsonLinesParser(on_reject=rejects.add)).records(lines):
+        name = record['movieName']
+        if not name or not isinstance(name, str):
+            rejects.add('movieName must be a non-empty string', record)
+            continue
+        info = record.get('info')
+        if isinstance(info, dict):
+            item = {'movieName': name, 'title': record.get('title'), 'info': info}
+        else:
+            item = movie_item(name,record.get('title'),record.get('plot'),record.get('rating'))
+        if too_large(item):
+            rejects.add(TOO_LARGE, record)
+            continue
+        rejects.accepted += 1
+        yield item
+
+def parse_parquet(batches, rejects=None):
+    rejects = rejects if rejects is not None else Rejects()
+    for row_no, data in enumerate(columnar.batch_rows(batches), 1):
+        if not data[0] or not isinstance(data[0], str):
+            rejects.add('movieName must be a non-empty string', data, line_no=row_no)
+            continue
+        column = columnar.non_finite(data)
+        if column:
+            rejects.add('{} must be a finite number'.format(column), data, line_no=row_no)
+            continue
+        item = movie_item(data[0],data[1],data[2],data[3])
+        if too_large(item):
+            rejects.add(TOO_LARGE, data, line_no=row_no)
+            continue
+        rejects.accepted += 1
+        yield item
+
+def too_large(item):
+    # DynamoDB refuses the item; rejecting it here keeps it out of the
+    # writers, where it would count as a failed write and fail the file.
+    return batch_writer.item_size(item) + batch_writer.REQUEST_OVERHEAD_BYTES > batch_writer.MAX_ITEM_BYTES
+
+def movie_item(moviename, title, plot, rating):
     return {
-        'statusCode': 200,
-        'body': json.dumps('Hello from Lambda! Completed inserting data into db')
+        'movieName': moviename,
+        'title': title,
+        'info': {
+            'plot': plot,
+            'rating': rating
+        }
     }
 
 def put_movie(moviename, title, plot, rating, dynamodb=None):
-    if not dynamodb:
-        dynamodb = boto3.resource('dynamodb')
-
-    table = dynamodb.Table('movieDetails')
+    if dynamodb:
+        table = dynamodb.Table(TABLE_NAME)
+    else:
+        table = clients.get_table(TABLE_NAME)
     response = table.put_item(
-       Item={
-            'movieName': moviename,
-            'title': title,
-            'info': {
-                'plot': plot,
-                'rating': rating
-            }
-        }
-    )
\ No newline at end of file
+       Item=movie_item(moviename, title, plot, rating)
+    )
@@ -0,0 +1,133 @@
+"""Per-object metrics in CloudWatch Embedded Metric Format (EMF).
+
+Values are aggregated in memory while an object is ingested and written
+as a single structured log line when it is done; CloudWatch turns that
+line into metrics, so nothing is sent over the network on the hot path.
+Timers wrap chunk iterators, which costs two clock reads per chunk rather
+than per row.
+"""
+import json
+import os
+import time
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'MovieIngest')
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'no', 'off')
+
+MILLISECONDS = 'Milliseconds'
+BYTES = 'Bytes'
+COUNT = 'Count'
+
+# Write counts, as in a writer pool's result, recorded for an object or a batch
+WRITE_COUNTS = ('written', 'failed', 'rejected', 'batches', 'retried', 'throttled')
+
+
+class Timer:
+    """Accumulates time spent producing chunks, and their bytes."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.bytes = 0
+        self.calls = 0
+
+    def add(self, seconds, nbytes=0):
+        self.seconds += seconds
+        self.bytes += nbytes
+        self.calls += 1
+
+    def wrap(self, chunks):
+        chunks = iter(chunks)
+        clock = time.perf_counter
+        while True:
+            start = clock()
+            chunk = next(chunks, None)
+            self.seconds += clock() - start
+            if chunk is None:
+                return
+            self.bytes += len(chunk)
+            self.calls += 1
+            yield chunk
+
+
+class ObjectMetrics:
+    def __init__(self, namespace=METRICS_NAMESPACE, **dimensions):
+        self.namespace = namespace
+        self.dimensions = dimensions or {'FunctionName': os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')}
+        self.values = {}
+        self.properties = {}
+
+    def put(self, name, value, unit=COUNT):
+        self.values[name] = (value, unit)
+
+    def add(self, name, value, unit=COUNT):
+        current = self.values.get(name, (0, unit))[0]
+        self.values[name] = (current + value, unit)
+
+    def seconds(self, name, seconds):
+        self.put(name, round(seconds * 1000, 3), MILLISECONDS)
+
+    def set_property(self, name, value):
+        self.properties[name] = value
+
+    def record(self, timestamp=None):
+        record = dict(self.properties)
+        record.update(self.dimensions)
+        record.update((name, value) for name, (value, _) in self.values.items())
+        record['_aws'] = {
+            'Timestamp': int((timestamp or time.time()) * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': self.namespace,
+                'Dimensions': [sorted(self.dimensions)],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in sorted(self.values.items())],
+            }],
+        }
+        return record
+
+    def flush(self, emit=print):
+        emit(json.dumps(self.record(), separators=(',', ':'), default=str))
+
+
+def new_metrics():
+    return ObjectMetrics() if METRICS_ENABLED else None
+
+
+def emit_object_metrics(object_metrics, results=None, summary=None, download=None, seconds=None, values=None,
+                        **properties):
+    """Flushes one EMF record for an object, a shard or a batch of objects:
+    the object counts of `results`, the write counts of `summary` (with
+    stage timings when it is one object read through `download`), then
+    `values` as {name: (value, unit)} and `properties`. Does nothing when
+    metrics are off, that is when `object_metrics` is None."""
+    if object_metrics is None:
+        return
+    if results is not None:
+        object_metrics.put('Objects', len(results))
+        object_metrics.put('ObjectsFailed', sum(result['status'] == 'failed' for result in results))
+    if summary is not None:
+        record_metrics(object_metrics, summary, download)
+    if seconds is not None:
+        object_metrics.seconds('IngestTime', seconds)
+    for name, (value, unit) in (values or {}).items():
+        object_metrics.put(name, value, unit)
+    for name, value in properties.items():
+        object_metrics.set_property(name, value)
+    object_metrics.flush()
+
+
+def record_metrics(object_metrics, summary, download=None):
+    """Puts the WRITE_COUNTS of `summary`, and for one object read through
+    `download` its stage timings and sizes."""
+    if download is not None:
+        stages = summary['stages']
+        object_metrics.seconds('DownloadTime', download.seconds)
+        object_metrics.seconds('DecodeTime', max(0.0, stages['fetch']['busy_seconds'] - download.seconds))
+        object_metrics.seconds('ParseTime', stages['parse']['busy_seconds'])
+        object_metrics.seconds('WriteTime', stages['write']['busy_seconds'])
+        object_metrics.seconds('IngestTime', stages['elapsed_seconds'])
+        object_metrics.put('Bytes', download.bytes, BYTES)
+        object_metrics.put('DecodedBytes', stages['fetch']['bytes'], BYTES)
+    object_metrics.put('Rows', summary['written'])
+    object_metrics.put('RowsFailed', summary['failed'])
+    object_metrics.put('RowsRejected', summary['rejected'])
+    object_metrics.put('Batches', summary['batches'])
+    object_metrics.put('Retries', summary['retried'])
+    object_metrics.put('Throttles', summary['throttled'])
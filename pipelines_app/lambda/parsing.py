@@ -0,0 +1,163 @@
+import csv
+import json
+import os
+from decimal import Decimal
+
+CSV_DIALECT = os.environ.get('CSV_DIALECT', 'excel')
+CSV_ENCODING = os.environ.get('CSV_ENCODING', 'utf-8')
+CSV_DELIMITER = os.environ.get('CSV_DELIMITER')
+
+JSON_LINES_SUFFIXES = ('.jsonl', '.ndjson')
+
+
+class CsvParser:
+    """Parses CSV records from an iterable of raw lines with `csv` dialect rules.
+
+    Lines with no quote or escape character are split directly, which is
+    what almost every row in our feeds looks like. Only a line containing
+    one of those characters goes through a `csv.reader`, which pulls further
+    lines from the same iterator when a quoted field spans newlines. Blank
+    lines are skipped. With `on_reject`, lines that cannot be decoded or
+    parsed are passed to it as (reason, raw line) and skipped instead of
+    raising.
+    """
+
+    def __init__(self, dialect=CSV_DIALECT, encoding=CSV_ENCODING, on_reject=None, **fmtparams):
+        if CSV_DELIMITER and 'delimiter' not in fmtparams:
+            fmtparams['delimiter'] = CSV_DELIMITER
+        self.dialect = csv.get_dialect(dialect) if isinstance(dialect, str) else dialect
+        self.encoding = encoding
+        self.on_reject = on_reject
+        self.fmtparams = fmtparams
+        self.delimiter = fmtparams.get('delimiter', self.dialect.delimiter)
+        special = (fmtparams.get('quotechar', self.dialect.quotechar),
+                   fmtparams.get('escapechar', self.dialect.escapechar))
+        self.special = tuple(char for char in special if char)
+        self.fast_path = not fmtparams.get('skipinitialspace', self.dialect.skipinitialspace)
+
+    def _reject(self, error, raw):
+        if self.on_reject is None:
+            raise error
+        self.on_reject(str(error), raw)
+
+    def _decoded(self, lines, suffix=''):
+        for raw in lines:
+            try:
+                yield raw.decode(self.encoding) + suffix
+            except UnicodeDecodeError as e:
+                self._reject(e, raw)
+
+    def _read(self, reader):
+        while True:
+            try:
+                return next(reader, None)
+            except csv.Error as e:
+                self._reject(e, None)
+
+    def rows(self, lines):
+        lines = iter(lines)
+        if not self.fast_path:
+            reader = csv.reader(self._decoded(lines), self.dialect, **self.fmtparams)
+            while True:
+                row = self._read(reader)
+                if row is None:
+                    return
+                if row:
+                    yield row
+        encoding = self.encoding
+        delimiter = self.delimiter
+        quote, escape = (self.special + (None, None))[:2]
+        pending = []
+        continuations = self._decoded(lines, '\n')
+
+        def source():
+            # Feeds the slow path: the line that needed it, then any
+            # continuation lines of a quoted field, straight from `lines`.
+            while True:
+                if pending:
+                    yield pending.pop()
+                    continue
+                line = next(continuations, None)
+                if line is None:
+                    return
+                yield line
+
+        reader = csv.reader(source(), self.dialect, **self.fmtparams)
+        for raw in lines:
+            try:
+                line = raw.decode(encoding)
+            except UnicodeDecodeError as e:
+                self._reject(e, raw)
+                continue
+            if not line:
+                continue
+            if line[-1] == '\r':
+                line = line[:-1]
+                if not line:
+                    continue
+            if quote is None or (quote not in line and (escape is None or escape not in line)):
+                yield line.split(delimiter)
+            else:
+                pending.append(line + '\n')
+                try:
+                    yield next(reader)
+                except csv.Error as e:
+                    self._reject(e, raw)
+
+
+def is_json_lines(key):
+    # Compressed feeds keep the format suffix in front, e.g. movies.jsonl.gz.
+    name = key.lower()
+    for suffix in ('.gz', '.gzip', '.bz2', '.zst', '.zstd'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return name.endswith(JSON_LINES_SUFFIXES)
+
+
+def _reject_constant(name):
+    raise ValueError('{} is not a valid number'.format(name))
+
+
+class JsonLinesParser:
+    """Decodes one JSON object per line (JSON Lines / NDJSON).
+
+    Numbers with a fraction are decoded as Decimal, which is what DynamoDB
+    accepts. Lines that are not valid JSON, are not an object or lack a
+    `required` field are counted in `malformed`, passed to `on_reject` as
+    (reason, raw line) and skipped; blank lines are ignored.
+    """
+
+    def __init__(self, encoding='utf-8', required=('movieName',), on_reject=None):
+        self.encoding = encoding
+        self.required = required
+        self.on_reject = on_reject
+        self.malformed = 0
+        self._decode = json.JSONDecoder(parse_float=Decimal, parse_constant=_reject_constant).decode
+
+    def records(self, lines):
+        decode = self._decode
+        encoding = self.encoding
+        required = self.required
+        for raw in lines:
+            try:
+                line = raw.decode(encoding)
+                if not line.strip():
+                    continue
+                record = decode(line)
+            except ValueError as e:
+                self._reject(str(e), raw)
+                continue
+            if type(record) is not dict:
+                self._reject('expected a JSON object', raw)
+                continue
+            missing = [name for name in required if name not in record]
+            if missing:
+                self._reject('missing {}'.format(', '.join(missing)), raw)
+                continue
+            yield record
+
+    def _reject(self, reason, raw):
+        self.malformed += 1
+        if self.on_reject is not None:
+            self.on_reject(reason, raw)
@@ -0,0 +1,183 @@
+"""Three-stage ingest pipeline: S3 chunk fetch -> decode/parse -> write.
+
+The fetch stage runs on its own thread and stays up to `prefetch_chunks`
+chunks ahead of the parser. The parser runs on the calling thread and feeds
+the WriterPool, whose worker threads form the write stage. Every hand-off is
+a bounded queue, so network reads, parsing and DynamoDB writes overlap while
+memory stays bounded. Per-stage timings and queue depths are collected so a
+slow file can be attributed to the stage that held it up.
+"""
+import os
+import queue
+import threading
+import time
+
+from reader import LineReader
+
+DEFAULT_PREFETCH_CHUNKS = int(os.environ.get('PREFETCH_CHUNKS', 4))
+STOP_CHECK_INTERVAL = 500
+
+_DONE = object()
+
+
+class QueueGauge:
+    def __init__(self):
+        self.samples = 0
+        self.total = 0
+        self.max = 0
+
+    def sample(self, depth):
+        self.samples += 1
+        self.total += depth
+        if depth > self.max:
+            self.max = depth
+
+    def as_dict(self):
+        return {
+            'max_depth': self.max,
+            'mean_depth': round(self.total / self.samples, 2) if self.samples else 0.0,
+        }
+
+
+class Prefetcher:
+    """Reads chunks on a background thread into a bounded queue."""
+
+    def __init__(self, chunks, depth=DEFAULT_PREFETCH_CHUNKS):
+        self.chunks = 0
+        self.bytes = 0
+        self.read_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.consumer_wait_seconds = 0.0
+        self.gauge = QueueGauge()
+        self._source = chunks
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        # Unblock the fetch thread if it is waiting on a full queue.
+        while self._thread.is_alive():
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._thread.join(0.01)
+
+    def _run(self):
+        source = iter(self._source)
+        try:
+            while not self._stopped.is_set():
+                start = time.perf_counter()
+                chunk = next(source, _DONE)
+                self.read_seconds += time.perf_counter() - start
+                if chunk is _DONE:
+                    break
+                self.chunks += 1
+                self.bytes += getattr(chunk, 'nbytes', None) or len(chunk)
+                self.gauge.sample(self._queue.qsize())
+                start = time.perf_counter()
+                self._put(chunk)
+                self.blocked_seconds += time.perf_counter() - start
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(_DONE)
+
+    def _put(self, value):
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(value, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def __iter__(self):
+        while True:
+            start = time.perf_counter()
+            chunk = self._queue.get()
+            self.consumer_wait_seconds += time.perf_counter() - start
+            if chunk is _DONE:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+class IngestPipeline:
+    def __init__(self, writers, prefetch_chunks=DEFAULT_PREFETCH_CHUNKS):
+        self.writers = writers
+        self.prefetch_chunks = prefetch_chunks
+        self.lines = None
+        self.stopped = False
+        self._fetch = None
+        self._elapsed = 0.0
+        self._parse_elapsed = None
+
+    def run(self, chunks, parse, should_stop=None, framing=LineReader):
+        """Streams `chunks` through `parse(lines)` into the writer pool.
+
+        `parse` receives a LineReader over the prefetched chunks and yields
+        DynamoDB items; with `framing=None` it gets the prefetched chunks
+        themselves, e.g. record batches of a columnar file. If `should_stop` returns true the run ends early at a
+        record boundary; once run returns, every item taken from `parse` has
+        been flushed, so `lines.offset` marks where a later run can resume.
+        Returns whether the run was stopped.
+        """
+        start = time.perf_counter()
+        self._fetch = Prefetcher(chunks, self.prefetch_chunks).start()
+        self.lines = framing(self._fetch) if framing else self._fetch
+        try:
+            with self.writers:
+                countdown = STOP_CHECK_INTERVAL
+                for item in parse(self.lines):
+                    self.writers.put(item)
+                    if should_stop is not None:
+                        countdown -= 1
+                        if not countdown:
+                            countdown = STOP_CHECK_INTERVAL
+                            if should_stop():
+                                self.stopped = True
+                                break
+                self._parse_elapsed = time.perf_counter() - start
+        finally:
+            self._fetch.stop()
+            self._elapsed = time.perf_counter() - start
+        return self.stopped
+
+    def stats(self):
+        fetch = self._fetch
+        write_wait = self.writers.put_wait_seconds
+        parse_elapsed = self._elapsed if self._parse_elapsed is None else self._parse_elapsed
+        parse_busy = max(0.0, parse_elapsed - fetch.consumer_wait_seconds - write_wait)
+        worker_busy = [worker['busy_seconds'] for worker in self.writers.worker_stats()]
+        waits = {
+            'fetch': fetch.consumer_wait_seconds,
+            'write': write_wait,
+        }
+        bottleneck = max(waits, key=waits.get)
+        if waits[bottleneck] < parse_busy:
+            bottleneck = 'parse'
+        return {
+            'elapsed_seconds': round(self._elapsed, 3),
+            'stopped': self.stopped,
+            'bottleneck': bottleneck,
+            'fetch': dict(fetch.gauge.as_dict(),
+                          chunks=fetch.chunks,
+                          bytes=fetch.bytes,
+                          busy_seconds=round(fetch.read_seconds, 3),
+                          blocked_seconds=round(fetch.blocked_seconds, 3)),
+            'parse': {
+                'lines': getattr(self.lines, 'line_no', None),
+                'busy_seconds': round(parse_busy, 3),
+                'input_wait_seconds': round(fetch.consumer_wait_seconds, 3),
+                'output_wait_seconds': round(write_wait, 3),
+            },
+            'write': dict(self.writers.gauge.as_dict(),
+                          workers=self.writers.workers,
+                          busy_seconds=round(max(worker_busy, default=0.0), 3)),
+        }
@@ -0,0 +1,149 @@
+"""Ingest ledger: per-object claims, checkpoints and completion records.
+
+There is one record per S3 object, keyed by its S3 URI, describing the
+version (ETag or versionId) last seen for it:
+
+- IN_PROGRESS with a live lease while an invocation owns the object. The
+  record also carries the checkpoint: the byte offset just past the last
+  line whose rows were flushed to DynamoDB, the line number, and the rows
+  committed and rejected so far.
+- IN_PROGRESS with an expired lease when the owner stopped to continue in
+  a new invocation or gave up on a failure; the next claim resumes from
+  the checkpoint.
+- COMPLETE once the version is fully ingested; later deliveries of the
+  same version are skipped.
+
+Claiming costs one consistent read and one conditional write per object.
+Every write is conditioned on the revision that was read, so of two
+concurrent deliveries only one can take the claim.
+"""
+import os
+import time
+from dataclasses import asdict, dataclass
+
+PROGRESS_TABLE = os.environ.get('PROGRESS_TABLE')
+CHECKPOINT_TTL_SECONDS = int(os.environ.get('CHECKPOINT_TTL_SECONDS', 7 * 24 * 3600))
+LEDGER_TTL_SECONDS = int(os.environ.get('LEDGER_TTL_SECONDS', 90 * 24 * 3600))
+DEFAULT_LEASE_SECONDS = 15 * 60
+
+# Stop this long before the Lambda timeout so writers can drain and the
+# checkpoint can be stored; capped at a quarter of the invocation budget.
+CHECKPOINT_MARGIN_MS = int(os.environ.get('CHECKPOINT_MARGIN_MS', 20000))
+
+IN_PROGRESS = 'IN_PROGRESS'
+COMPLETE = 'COMPLETE'
+
+CLAIMED = 'claimed'
+DUPLICATE = 'duplicate'
+BUSY = 'in_progress'
+
+
+@dataclass
+class Checkpoint:
+    offset: int = 0
+    line_no: int = 0
+    rows: int = 0
+    invocations: int = 0
+    rejected: int = 0
+
+    def as_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class Claim:
+    outcome: str
+    checkpoint: Checkpoint = None
+    revision: int = 0
+
+
+def object_id(bucket, key):
+    return 's3://{}/{}'.format(bucket, key)
+
+
+def is_condition_failure(error):
+    response = getattr(error, 'response', None) or {}
+    return response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+
+class ProgressStore:
+    """Ledger operations on `table_name` through a DynamoDB client, which,
+    unlike a Table resource, object threads can share."""
+
+    def __init__(self, client, table_name):
+        self._client = client
+        self._table_name = table_name
+
+    def claim(self, bucket, key, version, lease_seconds=DEFAULT_LEASE_SECONDS, reingest=False):
+        """With `reingest` a completed version is claimed again from the
+        start instead of being skipped as a duplicate."""
+        now = int(time.time())
+        item = self._client.get_item(TableName=self._table_name, Key={'objectId': object_id(bucket, key)},
+                                     ConsistentRead=True).get('Item')
+        checkpoint = Checkpoint()
+        if item and item.get('version') == version:
+            if item.get('status') == COMPLETE:
+                if not reingest:
+                    return Claim(DUPLICATE)
+            elif int(item.get('leaseUntil', 0)) > now:
+                return Claim(BUSY)
+            else:
+                checkpoint = Checkpoint(**{name: int(item.get(name, 0)) for name in Checkpoint.__dataclass_fields__})
+
+        revision = int(item.get('revision', 0)) if item else 0
+        try:
+            self._write(bucket, key, version, revision, IN_PROGRESS, checkpoint,
+                        leaseUntil=now + lease_seconds,
+                        expiresAt=now + CHECKPOINT_TTL_SECONDS,
+                        exists=item is not None)
+        except Exception as e:
+            if not is_condition_failure(e):
+                raise
+            return Claim(BUSY)
+        return Claim(CLAIMED, checkpoint, revision + 1)
+
+    def save_checkpoint(self, bucket, key, version, claim, checkpoint):
+        # Saving also releases the lease so the continuation can claim it.
+        self._write(bucket, key, version, claim.revision, IN_PROGRESS, checkpoint,
+                    leaseUntil=0, expiresAt=int(time.time()) + CHECKPOINT_TTL_SECONDS)
+
+    def release(self, bucket, key, version, claim):
+        try:
+            self._write(bucket, key, version, claim.revision, IN_PROGRESS, claim.checkpoint,
+                        leaseUntil=0, expiresAt=int(time.time()) + CHECKPOINT_TTL_SECONDS)
+        except Exception as e:
+            if not is_condition_failure(e):
+                raise
+
+    def complete(self, bucket, key, version, claim):
+        self._write(bucket, key, version, claim.revision, COMPLETE, Checkpoint(),
+                    leaseUntil=0, expiresAt=int(time.time()) + LEDGER_TTL_SECONDS)
+
+    def _write(self, bucket, key, version, revision, status, checkpoint, exists=True, **fields):
+        item = dict(checkpoint.as_dict(),
+                    objectId=object_id(bucket, key),
+                    version=version,
+                    status=status,
+                    revision=revision + 1,
+                    updatedAt=int(time.time()),
+                    **fields)
+        if not exists:
+            condition = {'ConditionExpression': 'attribute_not_exists(objectId)'}
+        elif revision:
+            condition = {'ConditionExpression': 'revision = :revision',
+                         'ExpressionAttributeValues': {':revision': revision}}
+        else:
+            condition = {'ConditionExpression': 'attribute_not_exists(revision)'}
+        self._client.put_item(TableName=self._table_name, Item=item, **condition)
+
+
+class Deadline:
+    def __init__(self, context, margin_ms=CHECKPOINT_MARGIN_MS):
+        self._context = context
+        self.margin_ms = min(margin_ms, context.get_remaining_time_in_millis() // 4)
+
+    def expired(self):
+        return self._context.get_remaining_time_in_millis() <= self.margin_ms
+
+    def lease_seconds(self):
+        return self._context.get_remaining_time_in_millis() // 1000 + 60
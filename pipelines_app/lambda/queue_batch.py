@@ -0,0 +1,46 @@
+"""S3 notifications delivered through the ingest queue.
+
+When the stack puts an SQS queue between the bucket and the function,
+Lambda hands the function batches of messages whose bodies are S3 events.
+The function answers with the IDs of the messages it could not process
+(ReportBatchItemFailures), so only those are redelivered and, once the
+queue's maxReceiveCount is reached, moved to the dead-letter queue.
+"""
+import json
+import os
+
+# Objects up to this size from one batch of messages are read one after
+# another into a shared writer pool, so their rows fill BatchWriteItem
+# requests together instead of each object sending a few partial ones.
+MICRO_BATCH_MAX_BYTES = int(os.environ.get('MICRO_BATCH_MAX_BYTES', 1024 * 1024))
+
+
+def is_sqs_event(event):
+    records = event.get('Records') or []
+    return bool(records) and records[0].get('eventSource') == 'aws:sqs'
+
+
+def s3_records(messages):
+    """Returns (message ID, S3 record) pairs and the IDs of unreadable messages.
+
+    The s3:TestEvent S3 sends when the notification is set up has no
+    records and is simply consumed.
+    """
+    records, unreadable = [], []
+    for message in messages:
+        try:
+            body = json.loads(message['body'])
+        except ValueError:
+            print('Message {} is not an S3 event'.format(message['messageId']))
+            unreadable.append(message['messageId'])
+            continue
+        records.extend((message['messageId'], record) for record in body.get('Records', []) if 's3' in record)
+    return records, unreadable
+
+
+def batch_item_failures(message_ids):
+    seen = []
+    for message_id in message_ids:
+        if message_id not in seen:
+            seen.append(message_id)
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in seen]}
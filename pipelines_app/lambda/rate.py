@@ -0,0 +1,121 @@
+"""Adaptive write rate: a token bucket whose rate follows AIMD.
+
+Every BatchWriteItem call takes one token per request item. Throttling
+errors, or an UnprocessedItems share above `pressure_ratio`, halve the
+rate (at most once per `cooldown` seconds, so several workers reporting
+the same spike only count once); the cut starts from the throughput
+actually observed, so a limit far above what the table sustains
+converges in a step or two. Clean batches raise the rate again by
+`increase` items/sec for every second that passes without pressure.
+"""
+import os
+import threading
+import time
+
+WRITE_RATE_MAX = float(os.environ.get('WRITE_RATE_MAX', 40000))
+WRITE_RATE_MIN = float(os.environ.get('WRITE_RATE_MIN', 25))
+WRITE_RATE_INCREASE = float(os.environ.get('WRITE_RATE_INCREASE', 200))
+WRITE_RATE_CONTROL = os.environ.get('WRITE_RATE_CONTROL', 'true').lower() not in ('0', 'false', 'no', 'off')
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, initial_rate=WRITE_RATE_MAX, min_rate=WRITE_RATE_MIN, max_rate=WRITE_RATE_MAX,
+                 increase=WRITE_RATE_INCREASE, decrease=0.5, pressure_ratio=0.1, cooldown=1.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(initial_rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.pressure_ratio = pressure_ratio
+        self.cooldown = cooldown
+        self.lowest_rate = self.rate
+        self.observed_rate = None
+        self.sent = 0
+        self.unprocessed = 0
+        self.throttles = 0
+        self.decreases = 0
+        self.wait_seconds = 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        now = clock()
+        self._tokens = self.rate
+        self._refilled = now
+        self._last_decrease = now - cooldown
+        self._last_increase = now
+        self._window_start = now
+        self._window_items = 0
+
+    def acquire(self, items):
+        """Takes `items` tokens, sleeping until the bucket can cover them."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.rate, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            self._tokens -= items
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.wait_seconds += wait
+        if wait:
+            self._sleep(wait)
+
+    def record(self, sent, unprocessed=0, throttled=False):
+        """Adjusts the rate after a BatchWriteItem call of `sent` items."""
+        with self._lock:
+            now = self._clock()
+            self.sent += sent
+            self.unprocessed += unprocessed
+            self._observe(now, sent - unprocessed)
+            if throttled:
+                self.throttles += 1
+            if throttled or (sent and unprocessed / sent > self.pressure_ratio):
+                if now - self._last_decrease >= self.cooldown:
+                    base = min(self.rate, self.observed_rate or self.rate)
+                    self.rate = max(self.min_rate, base * self.decrease)
+                    self.lowest_rate = min(self.lowest_rate, self.rate)
+                    self.decreases += 1
+                    self._tokens = min(self._tokens, 0.0)
+                    self._last_decrease = now
+                self._last_increase = now
+            elif not unprocessed:
+                self.rate = min(self.max_rate, self.rate + (now - self._last_increase) * self.increase)
+                self._last_increase = now
+
+    def _observe(self, now, written):
+        self._window_items += written
+        elapsed = now - self._window_start
+        if elapsed >= 1.0:
+            self.observed_rate = self._window_items / elapsed
+            self._window_start = now
+            self._window_items = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'effective_rate': round(self.rate, 1),
+                'lowest_rate': round(self.lowest_rate, 1),
+                'observed_rate': round(self.observed_rate, 1) if self.observed_rate is not None else None,
+                'throttles': self.throttles,
+                'decreases': self.decreases,
+                'unprocessed_ratio': round(self.unprocessed / self.sent, 4) if self.sent else 0.0,
+                'wait_seconds': round(self.wait_seconds, 3),
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(table_name):
+    """The process-wide limiter for a table, so a warm container keeps the
+    rate it learned and concurrent objects share one budget."""
+    with _limiters_lock:
+        limiter = _limiters.get(table_name)
+        if limiter is None:
+            limiter = _limiters[table_name] = AdaptiveRateLimiter()
+        return limiter
+
+
+def reset():
+    with _limiters_lock:
+        _limiters.clear()
@@ -0,0 +1,270 @@
+import bz2
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# Objects at least this large are fetched as concurrent byte-range GETs
+RANGED_GET_THRESHOLD = int(os.environ.get('RANGED_GET_THRESHOLD', 64 * 1024 * 1024))
+RANGE_SIZE = int(os.environ.get('RANGE_SIZE', 8 * 1024 * 1024))
+RANGE_CONCURRENCY = int(os.environ.get('RANGE_CONCURRENCY', 4))
+
+# Upper bound on each block of decompressed output, whatever the ratio
+DECOMPRESSED_CHUNK_SIZE = DEFAULT_CHUNK_SIZE
+
+COMPRESSION_SUFFIXES = {
+    '.gz': 'gzip',
+    '.gzip': 'gzip',
+    '.bz2': 'bz2',
+    '.zst': 'zstd',
+    '.zstd': 'zstd',
+}
+CONTENT_ENCODINGS = {
+    'gzip': 'gzip',
+    'x-gzip': 'gzip',
+    'bzip2': 'bz2',
+    'x-bzip2': 'bz2',
+    'zstd': 'zstd',
+}
+
+
+def iter_chunks(body, chunk_size=DEFAULT_CHUNK_SIZE):
+    while True:
+        chunk = body.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class LineReader:
+    """Splits a stream of byte chunks into lines without buffering the stream.
+
+    Only the current chunk and the unfinished line carried over from the
+    previous one are held in memory. `offset` is the number of bytes consumed
+    up to and including the newline of the last line yielded, and `line_no`
+    is that line's 1-based number.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.offset = 0
+        self.line_no = 0
+
+    def __iter__(self):
+        tail = b''
+        for chunk in self._chunks:
+            lines = (tail + chunk).split(b'\n') if tail else chunk.split(b'\n')
+            tail = lines.pop()
+            for line in lines:
+                self.offset += len(line) + 1
+                self.line_no += 1
+                yield line
+        if tail:
+            self.offset += len(tail)
+            self.line_no += 1
+            yield tail
+
+
+def iter_lines(body, chunk_size=DEFAULT_CHUNK_SIZE):
+    return iter(LineReader(iter_chunks(body, chunk_size)))
+
+
+def iter_ranged_chunks(s3, bucket, key, size, version_id=None, etag=None, start=0,
+                       range_size=RANGE_SIZE, concurrency=RANGE_CONCURRENCY):
+    """Yields the object as consecutive byte ranges fetched in parallel.
+
+    At most `concurrency` ranges are in flight and they are yielded in
+    order, so the stream is byte-for-byte what a single GET returns and
+    lines spanning a range boundary are rejoined by LineReader. Memory is
+    bounded by concurrency * range_size. With an ETag every range is
+    fetched with If-Match, so an overwrite mid-read fails instead of
+    mixing two versions.
+    """
+    request = {'Bucket': bucket, 'Key': key}
+    if version_id:
+        request['VersionId'] = version_id
+    if etag:
+        request['IfMatch'] = etag
+
+    def fetch(start):
+        end = min(start + range_size, size) - 1
+        response = s3.get_object(Range='bytes={}-{}'.format(start, end), **request)
+        data = response['Body'].read()
+        if len(data) != end - start + 1:
+            raise IOError('Short read of {} bytes {}-{}: got {} bytes'.format(key, start, end, len(data)))
+        return data
+
+    starts = iter(range(start, size, range_size))
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        in_flight = deque(pool.submit(fetch, start) for start in islice(starts, max(1, concurrency)))
+        try:
+            while in_flight:
+                chunk = in_flight.popleft().result()
+                for start in islice(starts, 1):
+                    in_flight.append(pool.submit(fetch, start))
+                yield chunk
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+
+def _get_object(s3, bucket, key, version_id=None, etag=None, start=0, end=None):
+    request = {'Bucket': bucket, 'Key': key}
+    if version_id:
+        request['VersionId'] = version_id
+    if start or end is not None:
+        request['Range'] = 'bytes={}-{}'.format(start, '' if end is None else end - 1)
+        if etag:
+            request['IfMatch'] = etag
+    return s3.get_object(**request)
+
+
+def _head_object(s3, bucket, key, version_id=None, etag=None):
+    request = {'Bucket': bucket, 'Key': key}
+    if version_id:
+        request['VersionId'] = version_id
+    if etag:
+        request['IfMatch'] = etag
+    return s3.head_object(**request)
+
+
+def read_range(s3, bucket, key, start, end, version_id=None, etag=None):
+    """Bytes `start` up to `end` (exclusive) of the object."""
+    return _get_object(s3, bucket, key, version_id, etag, start, end)['Body'].read()
+
+
+def object_chunks(s3, bucket, key, version_id=None, size=None, etag=None, start=0, end=None):
+    """Chunks of the object from byte `start` onwards, up to `end` if given."""
+    limit = size if end is None else end
+    if limit is not None and start >= limit > 0:
+        return iter(())
+    if limit is not None and limit - start >= RANGED_GET_THRESHOLD:
+        return iter_ranged_chunks(s3, bucket, key, limit, version_id=version_id, etag=etag, start=start)
+    return iter_chunks(_get_object(s3, bucket, key, version_id, etag, start, end)['Body'])
+
+
+def detect_compression(key, content_encoding=None):
+    if content_encoding:
+        compression = CONTENT_ENCODINGS.get(content_encoding.strip().lower())
+        if compression:
+            return compression
+    for suffix, compression in COMPRESSION_SUFFIXES.items():
+        if key.lower().endswith(suffix):
+            return compression
+    return None
+
+
+def _gunzip(chunks, out_size):
+    # wbits=32+MAX_WBITS accepts gzip and zlib headers; concatenated gzip
+    # members are decoded one after another.
+    decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+    for data in chunks:
+        while data:
+            out = decompressor.decompress(data, out_size)
+            if out:
+                yield out
+            if decompressor.eof:
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+            else:
+                data = decompressor.unconsumed_tail
+                while not data and len(out) == out_size:
+                    out = decompressor.decompress(b'', out_size)
+                    if out:
+                        yield out
+    out = decompressor.flush()
+    if out:
+        yield out
+
+
+def _bunzip2(chunks, out_size):
+    decompressor = bz2.BZ2Decompressor()
+    for data in chunks:
+        while True:
+            out = decompressor.decompress(data, out_size)
+            if out:
+                yield out
+            if decompressor.eof:
+                data = decompressor.unused_data
+                decompressor = bz2.BZ2Decompressor()
+                if not data:
+                    break
+            elif decompressor.needs_input:
+                break
+            else:
+                data = b''
+
+
+class _ChunkFile:
+    """Minimal readable file over an iterator of byte chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _unzstd(chunks, out_size):
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError('The zstandard package is required to ingest zstd objects; '
+                           'deploy with InputLayers(zstd_arn=...)') from None
+    reader = zstandard.ZstdDecompressor().stream_reader(_ChunkFile(chunks), read_across_frames=True)
+    yield from iter_chunks(reader, out_size)
+
+
+DECOMPRESSORS = {
+    'gzip': _gunzip,
+    'bz2': _bunzip2,
+    'zstd': _unzstd,
+}
+
+
+def decompress_chunks(chunks, compression, out_size=DECOMPRESSED_CHUNK_SIZE):
+    if compression is None:
+        return chunks
+    return DECOMPRESSORS[compression](chunks, out_size)
+
+
+def open_object(s3, bucket, key, version_id=None, size=None, etag=None, start=0, end=None, timer=None):
+    """Returns (chunks, compression) for the object's decoded content.
+
+    Compression comes from the object's ContentEncoding, or else from the
+    key suffix, and is undone in bounded blocks as the chunks are read.
+    Objects fetched as ranged GETs are HEADed first for their encoding.
+    Compressed objects can only be read from the beginning, since `start`
+    is an offset into the stored bytes; the same goes for `end`, which
+    stops the read before that byte. A metrics.Timer passed as `timer`
+    is charged with the time and bytes of the S3 reads alone.
+    """
+    encoding = None
+    limit = size if end is None else end
+    if limit is None or limit - start < RANGED_GET_THRESHOLD and start < limit:
+        response = _get_object(s3, bucket, key, version_id, etag, start, end)
+        chunks = iter_chunks(response['Body'])
+        encoding = response.get('ContentEncoding')
+    else:
+        # One HEAD is small next to the GETs of an object this large.
+        encoding = _head_object(s3, bucket, key, version_id, etag).get('ContentEncoding')
+        chunks = object_chunks(s3, bucket, key, version_id=version_id, size=size, etag=etag, start=start, end=end)
+    compression = detect_compression(key, encoding)
+    if compression and (start or end is not None):
+        raise ValueError('Cannot read {} compressed object {} from byte {}'.format(compression, key, start))
+    if timer is not None:
+        chunks = timer.wrap(chunks)
+    return decompress_chunks(chunks, compression), compression
@@ -0,0 +1,79 @@
+"""Rows that could not be ingested, kept aside instead of failing the file.
+
+Each rejected row is recorded with its line number (the row number for
+columnar input), the reason and the raw text, and the lot is written once
+per file as a JSON Lines object next to the source: `<key>.rejects.jsonl`.
+Only the first REJECTS_LIMIT rows are kept in memory; the count covers
+all of them. The handler ignores notifications for these sidecar keys.
+"""
+import json
+import os
+
+REJECTS_SUFFIX = '.rejects.jsonl'
+REJECTS_LIMIT = int(os.environ.get('REJECTS_LIMIT', 10000))
+MAX_RAW_CHARS = 1024
+
+
+def rejects_key(key):
+    return key + REJECTS_SUFFIX
+
+
+def is_rejects_key(key):
+    return key.endswith(REJECTS_SUFFIX)
+
+
+def _text(raw):
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8', 'replace')
+    elif not isinstance(raw, str):
+        raw = json.dumps(raw, default=str)
+    return raw[:MAX_RAW_CHARS]
+
+
+class Rejects:
+    def __init__(self, line_offset=0, limit=REJECTS_LIMIT):
+        self.line_offset = line_offset
+        self.limit = limit
+        self.rows = []
+        self.count = 0
+        self.accepted = 0
+        self.lines = None
+
+    def track(self, lines):
+        """Takes line numbers for add() from a LineReader being parsed."""
+        self.lines = lines
+
+    def add(self, reason, raw=None, line_no=None):
+        self.count += 1
+        if len(self.rows) >= self.limit:
+            return
+        if line_no is None:
+            line_no = getattr(self.lines, 'line_no', None)
+        if line_no is not None:
+            line_no += self.line_offset
+        self.rows.append({'line': line_no, 'reason': reason, 'raw': _text(raw)})
+
+    def load(self, s3, bucket, key, version=None):
+        """Carries over rows rejected by earlier invocations of the same file
+        version; a sidecar left by another version is ignored."""
+        try:
+            response = s3.get_object(Bucket=bucket, Key=rejects_key(key))
+        except Exception as e:
+            code = (getattr(e, 'response', None) or {}).get('Error', {}).get('Code')
+            if code not in ('NoSuchKey', '404'):
+                raise
+            return
+        stored_version = response.get('Metadata', {}).get('source-version')
+        if version and stored_version != version.strip('"'):
+            return
+        earlier = [json.loads(line) for line in response['Body'].read().splitlines() if line]
+        self.rows = (earlier + self.rows)[:self.limit]
+        self.count += int(response.get('Metadata', {}).get('rejected', len(earlier)))
+
+    def write(self, s3, bucket, key, version=None):
+        body = ''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in self.rows)
+        metadata = {'rejected': str(self.count)}
+        if version:
+            metadata['source-version'] = version.strip('"')
+        s3.put_object(Bucket=bucket, Key=rejects_key(key), Body=body.encode('utf8'),
+                      ContentType='application/x-ndjson', Metadata=metadata)
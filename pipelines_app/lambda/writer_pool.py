@@ -0,0 +1,136 @@
+import os
+import queue
+import threading
+import time
+
+from batch_writer import MAX_BATCH_ITEMS, BatchWriter, Delete, WriteResult
+from pipeline import QueueGauge
+
+# Lambda scales CPU with memory; writer threads mostly wait on the network,
+# so run a few of them per slice of memory, within sane bounds.
+MEMORY_PER_WRITER_MB = 256
+MIN_WRITERS = 2
+MAX_WRITERS = 16
+
+
+def default_worker_count():
+    configured = os.environ.get('WRITER_THREADS')
+    if configured:
+        return max(1, int(configured))
+    memory = int(os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', 128))
+    return max(MIN_WRITERS, min(MAX_WRITERS, memory // MEMORY_PER_WRITER_MB))
+
+
+class WriterPool:
+    """Fans items out to worker threads that each own a BatchWriter.
+
+    Items are routed by a hash of their key, so every write to a given key
+    goes through the same worker in order and last-write-wins holds across
+    batches. Each worker's queue holds at most `queue_batches` batches; when
+    it is full, put() blocks the producer instead of letting parsed rows pile
+    up in memory. All workers share the caller's DynamoDB client, which must
+    be safe to use from several threads: a boto3 client, not a resource.
+    """
+
+    def __init__(self, dynamodb, table_name, workers=None, queue_batches=4,
+                 key_name='movieName', **writer_options):
+        self.key_name = key_name
+        self.workers = workers or default_worker_count()
+        self._writers = [BatchWriter(dynamodb, table_name, key_name=key_name, **writer_options)
+                         for _ in range(self.workers)]
+        self._queues = [queue.Queue(maxsize=queue_batches) for _ in range(self.workers)]
+        self._buffers = [[] for _ in range(self.workers)]
+        self._busy = [0.0] * self.workers
+        self._items = [0] * self.workers
+        self.gauge = QueueGauge()
+        self.put_wait_seconds = 0.0
+        self._errors = []
+        self._threads = []
+        self._started = None
+        self._elapsed = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._threads = [threading.Thread(target=self._run, args=(index,), daemon=True)
+                         for index in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def put(self, item):
+        """Queues an item to put, or a batch_writer.Delete."""
+        if self._errors:
+            raise self._errors[0]
+        key = item.key if type(item) is Delete else item[self.key_name]
+        shard = hash(key) % self.workers
+        buffer = self._buffers[shard]
+        buffer.append(item)
+        if len(buffer) >= MAX_BATCH_ITEMS:
+            self._buffers[shard] = []
+            items_queue = self._queues[shard]
+            self.gauge.sample(items_queue.qsize())
+            start = time.perf_counter()
+            items_queue.put(buffer)
+            self.put_wait_seconds += time.perf_counter() - start
+
+    def close(self):
+        if self._started is None or self._elapsed is not None:
+            return
+        for shard, buffer in enumerate(self._buffers):
+            if buffer:
+                self._queues[shard].put(buffer)
+            self._queues[shard].put(None)
+        self._buffers = [[] for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.join()
+        self._elapsed = time.perf_counter() - self._started
+        if self._errors:
+            raise self._errors[0]
+
+    def _run(self, index):
+        writer = self._writers[index]
+        items_queue = self._queues[index]
+        while True:
+            items = items_queue.get()
+            if items is None:
+                break
+            if self._errors:
+                # Keep draining so a blocked producer can notice the failure.
+                continue
+            start = time.perf_counter()
+            try:
+                for item in items:
+                    writer.write(item)
+            except Exception as e:
+                self._errors.append(e)
+            self._busy[index] += time.perf_counter() - start
+            self._items[index] += len(items)
+        start = time.perf_counter()
+        try:
+            writer.flush()
+        except Exception as e:
+            self._errors.append(e)
+        self._busy[index] += time.perf_counter() - start
+
+    @property
+    def result(self):
+        total = WriteResult()
+        for writer in self._writers:
+            total.add(writer.result)
+        return total
+
+    def worker_stats(self):
+        elapsed = self._elapsed or (time.perf_counter() - self._started if self._started else 0.0)
+        return [{
+            'worker': index,
+            'items': self._items[index],
+            'batches': writer.result.batches,
+            'busy_seconds': round(self._busy[index], 3),
+            'items_per_second': round(self._items[index] / elapsed, 1) if elapsed else 0.0,
+        } for index, writer in enumerate(self._writers)]
@@ -0,0 +1,102 @@
+"""The movieDetails table, when the stack owns it.
+
+By default the stack imports an existing movieDetails table, so its
+capacity is managed outside this repository. With MovieTableSettings the
+stack creates the table instead: on demand, or provisioned with
+target-tracking autoscaling of reads and writes on the table and on every
+global secondary index, with point-in-time recovery and the indexes the
+settings list. The handler learns the table's name from TABLE_NAME.
+"""
+from functools import partial
+from typing import NamedTuple, Optional, Tuple
+
+from aws_cdk import core
+import aws_cdk.aws_dynamodb as dynamodb
+
+ON_DEMAND = 'on_demand'
+PROVISIONED = 'provisioned'
+
+ATTRIBUTE_TYPES = {
+    'S': dynamodb.AttributeType.STRING,
+    'N': dynamodb.AttributeType.NUMBER,
+    'B': dynamodb.AttributeType.BINARY,
+}
+
+
+class Capacity(NamedTuple):
+    """Provisioned units, scaled between `minimum` and `maximum` to keep
+    consumption near `utilization_percent`."""
+    minimum: int = 5
+    maximum: int = 100
+    utilization_percent: int = 70
+
+
+class GlobalIndex(NamedTuple):
+    name: str
+    partition_key: str
+    # Attribute types: S, N or B
+    partition_key_type: str = 'S'
+    sort_key: Optional[str] = None
+    sort_key_type: str = 'S'
+    # ALL, KEYS_ONLY or INCLUDE (with non_key_attributes)
+    projection: str = 'ALL'
+    non_key_attributes: Tuple[str, ...] = ()
+    # Provisioned tables only; the table's capacity when not given
+    read: Optional[Capacity] = None
+    write: Optional[Capacity] = None
+
+
+class MovieTableSettings(NamedTuple):
+    billing: str = ON_DEMAND
+    read: Capacity = Capacity(minimum=5, maximum=100)
+    write: Capacity = Capacity(minimum=25, maximum=1000)
+    point_in_time_recovery: bool = True
+    indexes: Tuple[GlobalIndex, ...] = ()
+    # None lets CloudFormation name the table
+    table_name: Optional[str] = None
+    removal_policy: core.RemovalPolicy = core.RemovalPolicy.RETAIN
+
+
+class MovieTable(core.Construct):
+    def __init__(self, scope: core.Construct, id: str, *, settings: MovieTableSettings = MovieTableSettings()) -> None:
+        super().__init__(scope, id)
+        if settings.billing not in (ON_DEMAND, PROVISIONED):
+            raise ValueError('billing must be {} or {}'.format(ON_DEMAND, PROVISIONED))
+        provisioned = settings.billing == PROVISIONED
+
+        capacity = {}
+        if provisioned:
+            capacity = {'read_capacity': settings.read.minimum, 'write_capacity': settings.write.minimum}
+        self.table = dynamodb.Table(self, 'Table',
+            table_name=settings.table_name,
+            partition_key=dynamodb.Attribute(name='movieName', type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PROVISIONED if provisioned else dynamodb.BillingMode.PAY_PER_REQUEST,
+            point_in_time_recovery=settings.point_in_time_recovery,
+            removal_policy=settings.removal_policy,
+            **capacity)
+        if provisioned:
+            self._scale(self.table.auto_scale_read_capacity, settings.read)
+            self._scale(self.table.auto_scale_write_capacity, settings.write)
+
+        for index in settings.indexes:
+            read, write = index.read or settings.read, index.write or settings.write
+            index_capacity = {}
+            if provisioned:
+                index_capacity = {'read_capacity': read.minimum, 'write_capacity': write.minimum}
+            self.table.add_global_secondary_index(
+                index_name=index.name,
+                partition_key=dynamodb.Attribute(name=index.partition_key,
+                                                 type=ATTRIBUTE_TYPES[index.partition_key_type]),
+                sort_key=dynamodb.Attribute(name=index.sort_key, type=ATTRIBUTE_TYPES[index.sort_key_type])
+                    if index.sort_key else None,
+                projection_type=dynamodb.ProjectionType[index.projection],
+                non_key_attributes=list(index.non_key_attributes) or None,
+                **index_capacity)
+            if provisioned:
+                self._scale(partial(self.table.auto_scale_global_secondary_index_read_capacity, index.name), read)
+                self._scale(partial(self.table.auto_scale_global_secondary_index_write_capacity, index.name), write)
+
+    @staticmethod
+    def _scale(auto_scale, capacity: Capacity) -> None:
+        auto_scale(min_capacity=capacity.minimum, max_capacity=capacity.maximum).scale_on_utilization(
+            target_utilization_percent=capacity.utilization_percent)
@@ -0,0 +1,136 @@
+"""Sizing of the ingest function, chosen per stage.
+
+A PerformanceProfile bundles the settings that decide how fast and how
+wide the handler runs: memory (which also buys CPU and writer threads),
+timeout, architecture, ephemeral storage, reserved concurrency and
+provisioned concurrency on the `Current` alias, optionally scaled on
+utilization. Stages pick a profile in code or through the `performance`
+context, keyed by stage name:
+
+    cdk synth -c performance='{"pre-prod": "small", "Prod": {"base": "large", "memory_mb": 4096}}'
+"""
+import json
+from typing import NamedTuple, Optional
+
+from aws_cdk import core
+import aws_cdk.aws_applicationautoscaling as appscaling
+import aws_cdk.aws_lambda as lmb
+
+X86_64 = 'x86_64'
+ARM_64 = 'arm64'
+
+CONTEXT_KEY = 'performance'
+
+
+class PerformanceProfile(NamedTuple):
+    memory_mb: int = 1024
+    timeout_seconds: int = 300
+    architecture: str = X86_64
+    ephemeral_storage_mb: int = 512
+    # Concurrency set aside for (and capping) the function; None shares the account pool
+    reserved_concurrency: Optional[int] = None
+    # Environments kept initialised on the alias; scaled between this and
+    # max_provisioned_concurrency on utilization when the latter is higher
+    provisioned_concurrency: int = 0
+    max_provisioned_concurrency: Optional[int] = None
+    utilization_target: float = 0.7
+
+    @classmethod
+    def from_context(cls, value) -> 'PerformanceProfile':
+        """Profile from a context value: a preset name, or a dict of fields
+        applied over the preset named by its `base` key (standard by default)."""
+        if isinstance(value, str):
+            if value not in PROFILES:
+                raise ValueError('Unknown performance profile {!r}; choose from {}'.format(value, ', '.join(PROFILES)))
+            return PROFILES[value]
+        fields = dict(value)
+        base = cls.from_context(fields.pop('base', 'standard'))
+        unknown = sorted(set(fields) - set(cls._fields))
+        if unknown:
+            raise ValueError('Unknown performance profile settings: {}'.format(', '.join(unknown)))
+        return base._replace(**fields).validate()
+
+    def validate(self) -> 'PerformanceProfile':
+        if not 128 <= self.memory_mb <= 10240:
+            raise ValueError('memory_mb must be between 128 and 10240')
+        if not 1 <= self.timeout_seconds <= 900:
+            raise ValueError('timeout_seconds must be between 1 and 900')
+        if self.architecture not in (X86_64, ARM_64):
+            raise ValueError('architecture must be {} or {}'.format(X86_64, ARM_64))
+        if not 512 <= self.ephemeral_storage_mb <= 10240:
+            raise ValueError('ephemeral_storage_mb must be between 512 and 10240')
+        if self.reserved_concurrency is not None and self.reserved_concurrency < 0:
+            raise ValueError('reserved_concurrency cannot be negative')
+        ceiling = max(self.provisioned_concurrency, self.max_provisioned_concurrency or 0)
+        if self.provisioned_concurrency < 0 or ceiling < self.provisioned_concurrency:
+            raise ValueError('provisioned concurrency must be 0 <= provisioned_concurrency <= max_provisioned_concurrency')
+        if self.reserved_concurrency is not None and ceiling > self.reserved_concurrency:
+            raise ValueError('provisioned concurrency cannot exceed reserved_concurrency')
+        if not 0.1 <= self.utilization_target <= 0.9:
+            raise ValueError('utilization_target must be between 0.1 and 0.9')
+        return self
+
+    @property
+    def autoscaled(self) -> bool:
+        return (self.max_provisioned_concurrency or 0) > self.provisioned_concurrency
+
+    @property
+    def runtime(self) -> lmb.Runtime:
+        # Python 3.7 is not offered on Graviton; the handler runs on both.
+        return lmb.Runtime.PYTHON_3_8 if self.architecture == ARM_64 else lmb.Runtime.PYTHON_3_7
+
+    def function_props(self) -> dict:
+        return {
+            'runtime': self.runtime,
+            'memory_size': self.memory_mb,
+            'timeout': core.Duration.seconds(self.timeout_seconds),
+            'reserved_concurrent_executions': self.reserved_concurrency,
+        }
+
+    def alias_props(self) -> dict:
+        return {'provisioned_concurrent_executions': self.provisioned_concurrency or None}
+
+
+PROFILES = {
+    'small': PerformanceProfile(memory_mb=512, timeout_seconds=120),
+    'standard': PerformanceProfile(),
+    'large': PerformanceProfile(memory_mb=3008, timeout_seconds=900, architecture=ARM_64, ephemeral_storage_mb=2048,
+                                reserved_concurrency=50, provisioned_concurrency=2, max_provisioned_concurrency=20),
+}
+
+
+def profile_for(scope: core.Construct, name: str, default: PerformanceProfile = None) -> PerformanceProfile:
+    """The profile the `performance` context gives stage `name`, else `default`."""
+    profiles = scope.node.try_get_context(CONTEXT_KEY) or {}
+    if isinstance(profiles, str):
+        # -c on the command line passes the JSON as a string
+        profiles = json.loads(profiles)
+    if name not in profiles:
+        return (default or PerformanceProfile()).validate()
+    return PerformanceProfile.from_context(profiles[name])
+
+
+class FunctionPerformance(core.Construct):
+    """Applies what the function and alias constructs of this CDK version
+    cannot express: architecture, ephemeral storage, and autoscaling of
+    provisioned concurrency on the alias."""
+
+    def __init__(self, scope: core.Construct, id: str, *, function: lmb.Function, alias: lmb.Alias,
+                 profile: PerformanceProfile) -> None:
+        super().__init__(scope, id)
+        cfn_function = function.node.default_child
+        cfn_function.add_property_override('Architectures', [profile.architecture])
+        cfn_function.add_property_override('EphemeralStorage.Size', profile.ephemeral_storage_mb)
+
+        if profile.autoscaled:
+            self.scalable_target = appscaling.ScalableTarget(self, 'ProvisionedConcurrency',
+                service_namespace=appscaling.ServiceNamespace.LAMBDA,
+                scalable_dimension='lambda:function:ProvisionedConcurrency',
+                resource_id='function:{}:{}'.format(function.function_name, alias.alias_name),
+                min_capacity=profile.provisioned_concurrency,
+                max_capacity=profile.max_provisioned_concurrency)
+            # The resource ID names the alias without referencing it
+            self.scalable_target.node.add_dependency(alias)
+            self.scalable_target.scale_to_track_metric('Utilization',
+                target_value=profile.utilization_target,
+                predefined_metric=appscaling.PredefinedMetric.LAMBDA_PROVISIONED_CONCURRENCY_UTILIZATION)
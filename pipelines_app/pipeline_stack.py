@@ -3,11 +3,22 @@ from aws_cdk import aws_codepipeline as codepipeline
 from aws_cdk import aws_codepipeline_actions as cpactions
 from aws_cdk import pipelines
 
+from .movie_table import PROVISIONED, Capacity, GlobalIndex, MovieTableSettings
 from .webservice_stage import WebServiceStage
 
 APP_ACCOUNT = '402122568686'
 APP_REGION = 'ap-south-1'
 
+# movieDetails table of each stage that owns one. pre-prod is not listed:
+# it keeps writing to the existing movieDetails table, which holds its data.
+STAGE_TABLES = {
+  'Prod': MovieTableSettings(
+    billing=PROVISIONED,
+    read=Capacity(minimum=5, maximum=200),
+    write=Capacity(minimum=25, maximum=2000),
+    indexes=(GlobalIndex('byTitle', partition_key='title', projection='KEYS_ONLY'),)),
+}
+
 class PipelineStack(core.Stack):
   def __init__(self, scope: core.Construct, id: str, **kwargs):
     super().__init__(scope, id, **kwargs)
@@ -38,7 +49,7 @@ class PipelineStack(core.Stack):
       'account': APP_ACCOUNT,
       'region': APP_REGION,
     }))
-    # pipeline.add_application_stage(WebServiceStage(self, 'Prod', env={
+    # pipeline.add_application_stage(WebServiceStage(self, 'Prod', movie_table=STAGE_TABLES['Prod'], env={
     #   'account': APP_ACCOUNT,
     #   'region': APP_REGION,
     # }))
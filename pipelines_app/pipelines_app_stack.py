@@ -11,12 +11,22 @@ import aws_cdk.aws_iam as iam
 import aws_cdk.aws_s3_notifications as s3_notifications
 import aws_cdk.aws_dynamodb as dynamodb
 
+from .backfill import Backfill, BackfillSettings
+from .bundling import bundle_handler
+from .fan_out import FanOut, FanOutSettings
+from .ingest_queue import IngestQueue, IngestQueueSettings
+from .input_layers import InputLayers, add_input_layers
+from .movie_table import MovieTable, MovieTableSettings
+from .performance import FunctionPerformance, PerformanceProfile
 
  
 
 class PipelinesAppStack(core.Stack):
 
-    def __init__(self, scope: core.Construct, id: str, **kwargs) -> None:
+    def __init__(self, scope: core.Construct, id: str, delta_mode: bool = False,
+                 ingest_queue: IngestQueueSettings = None, fan_out: FanOutSettings = None,
+                 backfill: BackfillSettings = None, performance: PerformanceProfile = None,
+                 movie_table: MovieTableSettings = None, input_layers: InputLayers = None, **kwargs) -> None:
         super().__init__(scope, id, **kwargs)
 
         # The code that defines your stack goes here
@@ -25,22 +35,75 @@ class PipelinesAppStack(core.Stack):
         bucket = s3.Bucket(self, id='my-bucket-id', bucket_name='s3-lamda-dynamo')
 
 
+        progress_table = dynamodb.Table(self, 'IngestProgress',
+            partition_key=dynamodb.Attribute(name='objectId', type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute='expiresAt',
+            removal_policy=core.RemovalPolicy.DESTROY)
+
+        # Per-key fingerprints of the last ingested version, for delta mode
+        state_bucket = s3.Bucket(self, 'IngestState',
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL)
+
+        if movie_table is not None:
+            table = MovieTable(self, 'MovieDetails', settings=movie_table).table
+        else:
+            table = dynamodb.Table.from_table_arn(self, "ImportedTable", "arn:aws:dynamodb:ap-south-1:402122568686:table/movieDetails")
+
+        # Only the modules handler.py imports; fails synth if CDK libraries
+        # would end up in the zip.
+        code = lmb.Code.from_asset(bundle_handler(path.join(this_dir, 'lambda')))
+
+        performance = (performance or PerformanceProfile()).validate()
         handler = lmb.Function(self, 'Handler',
-            runtime=lmb.Runtime.PYTHON_3_7,
             handler='handler.handler',
-            code=lmb.Code.from_asset(path.join(this_dir, 'lambda')))
+            code=code,
+            environment={
+                'TABLE_NAME': table.table_name,
+                'PROGRESS_TABLE': progress_table.table_name,
+                'STATE_BUCKET': state_bucket.bucket_name,
+                'DELTA_MODE': 'true' if delta_mode else 'false',
+            },
+            **performance.function_props())
+        if input_layers is not None:
+            add_input_layers(self, handler, input_layers)
 
-        table = dynamodb.Table.from_table_arn(self, "ImportedTable", "arn:aws:dynamodb:ap-south-1:402122568686:table/movieDetails")
         bucket.grant_read(handler)
-        bucket.add_event_notification(s3.EventType.OBJECT_CREATED,s3_notifications.LambdaDestination(handler))
+        # Rows that fail to parse are written next to their file as <key>.rejects.jsonl
+        bucket.grant_put(handler)
+        state_bucket.grant_read_write(handler)
+        if ingest_queue is not None:
+            self.ingest_queue = IngestQueue(self, 'IngestQueue', bucket=bucket, handler=handler, settings=ingest_queue)
+        else:
+            bucket.add_event_notification(s3.EventType.OBJECT_CREATED,s3_notifications.LambdaDestination(handler))
 
         table.grant_read_write_data(handler)
+        progress_table.grant_read_write_data(handler)
+
+        # Files that outlive the timeout re-invoke the function to continue from
+        # their checkpoint. Referencing handler.function_arn here would make the
+        # role policy and the function depend on each other, so match by name.
+        handler.add_to_role_policy(iam.PolicyStatement(
+            actions=['lambda:InvokeFunction'],
+            resources=[self.format_arn(service='lambda', resource='function',
+                sep=':', resource_name='{}-Handler*'.format(self.stack_name))]))
 
 
 
+        if fan_out is not None:
+            self.fan_out = FanOut(self, 'FanOut', handler=handler, code=code, bucket=bucket,
+                                  progress_table=progress_table, settings=fan_out)
+
+        if backfill is not None:
+            self.backfill = Backfill(self, 'Backfill', handler=handler, bucket=bucket,
+                                     results_bucket=state_bucket, settings=backfill)
+
         alias = lmb.Alias(self, 'HandlerAlias',
             alias_name='Current',
-            version=handler.current_version)
+            version=handler.current_version,
+            **performance.alias_props())
+
+        FunctionPerformance(self, 'HandlerPerformance', function=handler, alias=alias, profile=performance)
 
         gw = apigw.LambdaRestApi(self, 'Gateway',
             description='Endpoint for a simple Lambda-powered web service',
@@ -66,3 +129,6 @@ class PipelinesAppStack(core.Stack):
         self.url_output = core.CfnOutput(self, 'Url',
             value=gw.url)
 
+        self.table_name_output = core.CfnOutput(self, 'TableName',
+            value=table.table_name)
+
@@ -1,12 +1,25 @@
 from aws_cdk import core
 
+from .backfill import BackfillSettings
+from .fan_out import FanOutSettings
+from .ingest_queue import IngestQueueSettings
+from .input_layers import InputLayers
+from .movie_table import MovieTableSettings
+from .performance import PerformanceProfile, profile_for
 from .pipelines_app_stack import PipelinesAppStack
 
 class WebServiceStage(core.Stage):
-  def __init__(self, scope: core.Construct, id: str, **kwargs):
+  def __init__(self, scope: core.Construct, id: str, delta_mode: bool = False,
+               ingest_queue: IngestQueueSettings = None, fan_out: FanOutSettings = None,
+               backfill: BackfillSettings = None, performance: PerformanceProfile = None,
+               movie_table: MovieTableSettings = None, input_layers: InputLayers = None, **kwargs):
     super().__init__(scope, id, **kwargs)
 
-    service = PipelinesAppStack(self, 'WebService')
+    # The `performance` context overrides the profile given here for this stage
+    service = PipelinesAppStack(self, 'WebService', delta_mode=delta_mode, ingest_queue=ingest_queue,
+                                fan_out=fan_out, backfill=backfill,
+                                performance=profile_for(self, id, performance),
+                                movie_table=movie_table, input_layers=input_layers)
 
     self.url_output = service.url_output
 
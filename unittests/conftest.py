@@ -0,0 +1,39 @@
+import sys
+from os import path
+
+import pytest
+
+# The Lambda asset is deployed as a flat directory, so its modules import each
+# other by bare name; mirror that layout for the handler tests.
+sys.path.insert(0, path.join(path.dirname(__file__), '..', 'pipelines_app', 'lambda'))
+
+import clients  # noqa: E402
+import progress  # noqa: E402
+import rate  # noqa: E402
+
+from .fakes import FakeAWS, FakeDynamoDB, FakeLambda, FakeS3, FakeStepFunctions  # noqa: E402
+
+
+def pytest_configure(config):
+  config.addinivalue_line('markers', 'aws(objects=None, ledger=False): seed the aws fixture\'s S3 objects '
+                                     'and turn on the ingest ledger')
+
+
+@pytest.fixture
+def aws(request, monkeypatch):
+  """Stand-ins for every AWS client the Lambda code uses, registered for
+  one test. Mark the test or module with pytest.mark.aws(objects=...,
+  ledger=True) to start with objects in S3 and the ingest ledger on."""
+  options = {}
+  for marker in reversed(list(request.node.iter_markers('aws'))):
+    options.update(marker.kwargs)
+  if options.get('ledger'):
+    monkeypatch.setattr(progress, 'PROGRESS_TABLE', 'ingestProgress')
+  fakes = FakeAWS(FakeS3(dict(options.get('objects') or {})), FakeDynamoDB(), FakeLambda(), FakeStepFunctions())
+  clients.set_client('s3', fakes.s3)
+  clients.set_client('lambda', fakes.lambda_client)
+  clients.set_client('stepfunctions', fakes.stepfunctions)
+  clients.set_resource('dynamodb', fakes.dynamodb)
+  yield fakes
+  clients.reset()
+  rate.reset()
@@ -0,0 +1,186 @@
+import json
+from types import SimpleNamespace
+from typing import NamedTuple
+
+
+class BytesBody:
+  """StreamingBody stand-in over an in-memory bytes object."""
+
+  def __init__(self, data):
+    self.data = data
+    self.position = 0
+
+  def read(self, amt=None):
+    end = len(self.data) if amt is None else self.position + amt
+    chunk = self.data[self.position:end]
+    self.position += len(chunk)
+    return chunk
+
+
+class NoSuchKey(Exception):
+  response = {'Error': {'Code': 'NoSuchKey'}}
+
+
+class FakeS3:
+  def __init__(self, objects=None):
+    self.objects = dict(objects or {})
+    self.headers = {}
+    self.requests = []
+
+  def put_object(self, Bucket, Key, Body, **kwargs):
+    self.requests.append(('put_object', Bucket, Key, kwargs))
+    self.objects[(Bucket, Key)] = Body
+    self.headers[(Bucket, Key)] = {name: kwargs[name] for name in ('ContentEncoding', 'Metadata') if name in kwargs}
+
+  def delete_object(self, Bucket, Key, **kwargs):
+    self.requests.append(('delete_object', Bucket, Key, kwargs))
+    self.objects.pop((Bucket, Key), None)
+
+  def head_object(self, Bucket, Key, **kwargs):
+    self.requests.append(('head_object', Bucket, Key, kwargs))
+    if (Bucket, Key) not in self.objects:
+      raise NoSuchKey('NoSuchKey: {}/{}'.format(Bucket, Key))
+    return dict(self.headers.get((Bucket, Key), {}), ContentLength=len(self.objects[(Bucket, Key)]))
+
+  def get_object(self, Bucket, Key, **kwargs):
+    self.requests.append(('get_object', Bucket, Key, kwargs))
+    if (Bucket, Key) not in self.objects:
+      raise NoSuchKey('NoSuchKey: {}/{}'.format(Bucket, Key))
+    data = self.objects[(Bucket, Key)]
+    if 'Range' in kwargs:
+      start, end = kwargs['Range'][len('bytes='):].split('-')
+      data = data[int(start):int(end) + 1 if end else None]
+    response = {'Body': BytesBody(data), 'ContentLength': len(data)}
+    response.update(self.headers.get((Bucket, Key), {}))
+    return response
+
+
+class ConditionalCheckFailed(Exception):
+  response = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+
+
+class FakeTable:
+  def __init__(self, key_name):
+    self.key_name = key_name
+    self.items = {}
+
+  def get_item(self, Key, **kwargs):
+    item = self.items.get(Key[self.key_name])
+    return {'Item': dict(item)} if item else {}
+
+  def put_item(self, Item, ConditionExpression=None, ExpressionAttributeValues=None):
+    current = self.items.get(Item[self.key_name])
+    if ConditionExpression and not self._matches(ConditionExpression, current, ExpressionAttributeValues or {}):
+      raise ConditionalCheckFailed()
+    self.items[Item[self.key_name]] = dict(Item)
+
+  @staticmethod
+  def _matches(condition, current, values):
+    if condition.startswith('attribute_not_exists('):
+      return current is None or condition[len('attribute_not_exists('):-1] not in current
+    name, placeholder = condition.split(' = ')
+    return current is not None and current.get(name) == values[placeholder]
+
+  def delete_item(self, Key, **kwargs):
+    self.items.pop(Key[self.key_name], None)
+
+
+class FakeDynamoDB:
+  def __init__(self, unprocessed_rounds=0):
+    self.calls = []
+    self.items = {}
+    self.tables = {}
+    self.unprocessed_rounds = unprocessed_rounds
+    # Keys whose writes always come back unprocessed
+    self.unwritable = set()
+    # Stands in for the resource and its client alike
+    self.meta = SimpleNamespace(client=self)
+
+  def Table(self, name):
+    return self.tables.setdefault(name, FakeTable('objectId'))
+
+  def get_item(self, TableName, **kwargs):
+    return self.Table(TableName).get_item(**kwargs)
+
+  def put_item(self, TableName, **kwargs):
+    return self.Table(TableName).put_item(**kwargs)
+
+  def batch_write_item(self, RequestItems):
+    (table, requests), = RequestItems.items()
+    self.calls.append(requests)
+    if self.unprocessed_rounds:
+      self.unprocessed_rounds -= 1
+      done, unprocessed = requests[1:], requests[:1]
+    else:
+      done, unprocessed = requests, []
+    stuck = [request for request in done if self._key(request) in self.unwritable]
+    done = [request for request in done if request not in stuck]
+    unprocessed = unprocessed + stuck
+    for request in done:
+      if 'DeleteRequest' in request:
+        self.items.pop(request['DeleteRequest']['Key']['movieName'], None)
+      else:
+        item = request['PutRequest']['Item']
+        self.items[item['movieName']] = item
+    return {'UnprocessedItems': {table: unprocessed} if unprocessed else {}}
+
+  @staticmethod
+  def _key(request):
+    if 'DeleteRequest' in request:
+      return request['DeleteRequest']['Key']['movieName']
+    return request['PutRequest']['Item']['movieName']
+
+
+class FakeLambda:
+  def __init__(self):
+    self.invocations = []
+
+  def invoke(self, **kwargs):
+    self.invocations.append(kwargs)
+    return {'StatusCode': 202}
+
+
+class FakeStepFunctions:
+  def __init__(self):
+    self.executions = []
+
+  def start_execution(self, stateMachineArn, input, **kwargs):
+    self.executions.append(json.loads(input))
+    return {'executionArn': '{}:execution-{}'.format(stateMachineArn, len(self.executions))}
+
+
+class FakeAWS(NamedTuple):
+  s3: FakeS3
+  dynamodb: FakeDynamoDB
+  lambda_client: FakeLambda
+  stepfunctions: FakeStepFunctions
+
+
+class FakeContext:
+  """Lambda context whose clock runs out after `calls` time checks."""
+
+  invoked_function_arn = 'arn:aws:lambda:ap-south-1:123456789012:function:Handler'
+
+  def __init__(self, calls=None, remaining_ms=900000):
+    self.calls = calls
+    self.remaining_ms = remaining_ms
+
+  def get_remaining_time_in_millis(self):
+    if self.calls is None:
+      return self.remaining_ms
+    self.calls -= 1
+    return self.remaining_ms if self.calls > 0 else 0
+
+
+def s3_event(*objects, **object_fields):
+  return {'Records': [
+    {'s3': {'bucket': {'name': bucket}, 'object': dict(object_fields, key=key)}} for bucket, key in objects
+  ]}
+
+
+def sqs_event(*bodies):
+  """SQS batch whose message bodies are the given S3 events (or raw strings)."""
+  return {'Records': [
+    {'messageId': 'message-{}'.format(index), 'eventSource': 'aws:sqs',
+     'body': body if isinstance(body, str) else json.dumps(body)} for index, body in enumerate(bodies)
+  ]}
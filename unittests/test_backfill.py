@@ -0,0 +1,45 @@
+import pytest
+
+import handler
+
+from .fakes import FakeContext
+
+
+pytestmark = pytest.mark.aws(ledger=True, objects={
+  ('bucket', 'movies/a b.csv'): b'titanic,A ship disaster,suspense,4.5\n',
+  ('bucket', 'movies/c.csv'): b'avatar,Blue people,scifi,4.1\nheat,Cops,crime,4.2\n',
+})
+
+
+def batch(*keys, **options):
+  # Entries as the distributed map's S3 item reader lists them
+  items = [{'Key': key, 'Size': 40, 'Etag': '"etag-{}"'.format(key)} for key in keys]
+  return {'backfill': dict(options, bucket='bucket', items=items)}
+
+
+def test_a_batch_ingests_its_objects_and_reports_progress(aws):
+  dynamodb = aws.dynamodb
+
+  summary = handler.handler(batch('movies/a b.csv', 'movies/c.csv'), FakeContext())
+
+  assert (summary['objects'], summary['succeeded'], summary['rows'], summary['bytes']) == (2, 2, 3, 80)
+  assert summary['rows_per_second'] > 0
+  assert set(dynamodb.items) == {'titanic', 'avatar', 'heat'}
+
+
+def test_completed_objects_are_skipped_unless_reingested(aws):
+  dynamodb = aws.dynamodb
+  handler.handler(batch('movies/c.csv'), FakeContext())
+  dynamodb.items.clear()
+
+  skipped = handler.handler(batch('movies/c.csv'), FakeContext())
+  reingested = handler.handler(batch('movies/c.csv', reingest=True), FakeContext())
+
+  assert (skipped['skipped'], skipped['rows']) == (1, 0)
+  assert (reingested['succeeded'], reingested['rows']) == (1, 2)
+  assert set(dynamodb.items) == {'avatar', 'heat'}
+
+
+def test_a_batch_with_failed_objects_fails_so_it_is_retried(aws):
+  with pytest.raises(RuntimeError, match='1 of 2 objects failed: movies/missing.csv'):
+    handler.handler(batch('movies/c.csv', 'movies/missing.csv'), FakeContext())
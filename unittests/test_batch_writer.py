@@ -0,0 +1,114 @@
+from batch_writer import BatchWriter, MAX_ITEM_BYTES, partition_hash
+
+from .fakes import FakeDynamoDB
+
+
+def movie(name, title='t'):
+  return {'movieName': name, 'title': title, 'info': {'plot': 'p', 'rating': '1'}}
+
+
+def test_groups_puts_into_batches_of_25():
+  dynamodb = FakeDynamoDB()
+
+  with BatchWriter(dynamodb, 'movieDetails') as writer:
+    for i in range(60):
+      writer.put(movie(str(i)))
+
+  assert [len(call) for call in dynamodb.calls] == [25, 25, 10]
+  assert writer.result.written == 60
+  assert writer.result.batches == 3
+
+
+def test_duplicate_keys_in_a_batch_keep_last_write():
+  dynamodb = FakeDynamoDB()
+
+  with BatchWriter(dynamodb, 'movieDetails') as writer:
+    writer.put(movie('titanic', 'first'))
+    writer.put(movie('titanic', 'second'))
+
+  assert dynamodb.calls == [[{'PutRequest': {'Item': movie('titanic', 'second')}}]]
+  assert writer.result.deduplicated == 1
+
+
+def test_unprocessed_items_are_retried():
+  dynamodb = FakeDynamoDB(unprocessed_rounds=2)
+  delays = []
+
+  with BatchWriter(dynamodb, 'movieDetails', sleep=delays.append) as writer:
+    writer.put(movie('a'))
+    writer.put(movie('b'))
+
+  assert len(dynamodb.calls) == 3
+  assert len(delays) == 2
+  assert writer.result.written == 2
+  assert writer.result.retried == 2
+  assert writer.result.failed == 0
+
+
+def test_gives_up_after_max_attempts():
+  dynamodb = FakeDynamoDB(unprocessed_rounds=10)
+
+  with BatchWriter(dynamodb, 'movieDetails', max_attempts=3, sleep=lambda _: None) as writer:
+    writer.put(movie('a'))
+
+  assert writer.result.failed == 1
+  assert writer.result.written == 0
+
+
+def test_oversized_items_are_counted_as_failed():
+  dynamodb = FakeDynamoDB()
+
+  with BatchWriter(dynamodb, 'movieDetails') as writer:
+    writer.put(movie('huge', 'x' * MAX_ITEM_BYTES))
+
+  assert dynamodb.calls == []
+  assert writer.result.failed == 1
+
+
+def test_reorder_window_spreads_each_batch_across_the_hash_range():
+  # GIVEN sorted keys, the way our exports arrive
+  dynamodb = FakeDynamoDB()
+  names = ['movie%04d' % i for i in range(200)]
+  quartile = {name: rank * 4 // len(names) for rank, name in enumerate(sorted(names, key=partition_hash))}
+
+  # WHEN they are written through a 100 item window
+  with BatchWriter(dynamodb, 'movieDetails', reorder_window=100) as writer:
+    for name in names:
+      writer.put(movie(name))
+
+  # THEN every batch holds keys from every quarter of the hash space
+  assert [len(call) for call in dynamodb.calls] == [25] * 8
+  for call in dynamodb.calls:
+    assert {quartile[request['PutRequest']['Item']['movieName']] for request in call} == {0, 1, 2, 3}
+  assert len(dynamodb.items) == 200
+
+
+def test_reordering_keeps_the_last_write_for_repeated_keys():
+  dynamodb = FakeDynamoDB()
+
+  with BatchWriter(dynamodb, 'movieDetails', reorder_window=50) as writer:
+    for i in range(120):
+      writer.put(movie('hot', str(i)))
+      writer.put(movie('other%d' % i))
+
+  assert dynamodb.items['hot']['title'] == '119'
+  assert writer.result.written + writer.result.deduplicated == 240
+
+
+def test_throttling_errors_are_retried_and_counted():
+  class Throttled(Exception):
+    response = {'Error': {'Code': 'ProvisionedThroughputExceededException'}}
+
+  class ThrottleOnce(FakeDynamoDB):
+    def batch_write_item(self, RequestItems):
+      if not self.calls:
+        self.calls.append(None)
+        raise Throttled()
+      return super().batch_write_item(RequestItems)
+
+  dynamodb = ThrottleOnce()
+
+  with BatchWriter(dynamodb, 'movieDetails', sleep=lambda _: None) as writer:
+    writer.put(movie('a'))
+
+  assert (writer.result.written, writer.result.throttled, writer.result.retried) == (1, 1, 1)
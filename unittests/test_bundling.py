@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+from os import path
+
+import pytest
+
+from pipelines_app.bundling import BundleError, bundle_handler, check_bundle, handler_modules
+
+LAMBDA_DIR = path.join(path.dirname(__file__), '..', 'pipelines_app', 'lambda')
+
+
+def write(directory, name, source=''):
+  target = path.join(str(directory), name)
+  os.makedirs(path.dirname(target), exist_ok=True)
+  with open(target, 'w') as f:
+    f.write(source)
+
+
+def test_bundle_holds_only_what_the_handler_imports(tmp_path):
+  # GIVEN a source folder with an unused module, a vendored package and caches
+  source = tmp_path / 'lambda'
+  write(source, 'handler.py', 'import json\nimport helper\n\ndef handler(event, context):\n    import lazy\n')
+  write(source, 'helper.py', 'from vendored.sub import thing\n')
+  write(source, 'lazy.py')
+  write(source, 'unused.py')
+  write(source, 'vendored/__init__.py')
+  write(source, 'vendored/sub.py', 'thing = 1\n')
+  write(source, '__pycache__/handler.cpython-37.pyc')
+
+  # WHEN
+  bundle = bundle_handler(str(source), out_dir=str(tmp_path / 'bundle'))
+
+  # THEN
+  assert sorted(os.listdir(bundle)) == ['handler.py', 'helper.py', 'lazy.py', 'vendored']
+  assert sorted(os.listdir(path.join(bundle, 'vendored'))) == ['__init__.py', 'sub.py']
+
+
+def test_cdk_imports_fail_the_bundle(tmp_path):
+  write(tmp_path, 'handler.py', 'import helper\n')
+  write(tmp_path, 'helper.py', 'import aws_cdk.aws_s3 as s3\n')
+
+  with pytest.raises(BundleError, match='helper.py imports aws_cdk'):
+    bundle_handler(str(tmp_path), out_dir=str(tmp_path / 'bundle'))
+
+
+def test_cdk_packages_in_the_bundle_are_rejected(tmp_path):
+  write(tmp_path, 'handler.py')
+  write(tmp_path, 'aws_cdk.aws_s3-1.56.0.dist-info/METADATA')
+
+  with pytest.raises(BundleError):
+    check_bundle(str(tmp_path))
+
+
+def test_the_real_handler_bundle_is_small_and_defers_heavy_imports(tmp_path):
+  modules = handler_modules(LAMBDA_DIR)
+  assert 'handler' in modules and 'batch_writer' in modules
+
+  bundle = bundle_handler(LAMBDA_DIR, out_dir=str(tmp_path / 'bundle'))
+  script = ('import sys, handler; print(sorted(name for name in ("boto3", "botocore", "pyarrow", "zstandard") '
+            'if name in sys.modules))')
+  output = subprocess.check_output([sys.executable, '-c', script], cwd=bundle)
+
+  assert output.decode().strip() == '[]'
+  assert sum(path.getsize(path.join(bundle, name)) for name in os.listdir(bundle)) < 256 * 1024
+
+
+def test_every_synth_reuses_one_bundle_directory(tmp_path, monkeypatch):
+  monkeypatch.setenv('CDK_OUTDIR', str(tmp_path / 'cdk.out'))
+  source = tmp_path / 'lambda'
+  write(source, 'handler.py', 'import helper\n')
+  write(source, 'helper.py')
+
+  first = bundle_handler(str(source))
+  write(first, 'stale.py')
+  second = bundle_handler(str(source))
+
+  assert first == second
+  assert path.dirname(path.dirname(second)) == str(tmp_path / 'cdk.out')
+  assert sorted(os.listdir(second)) == ['handler.py', 'helper.py']
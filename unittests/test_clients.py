@@ -0,0 +1,51 @@
+import pytest
+
+import clients
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+  clients.reset()
+  yield
+  clients.reset()
+
+
+def test_injected_clients_are_returned_on_every_call():
+  s3 = object()
+  clients.set_client('s3', s3)
+
+  assert clients.get_s3() is s3
+  assert clients.get_client('s3') is s3
+
+
+def test_table_handles_are_created_once():
+  class FakeDynamoDB:
+    tables = 0
+
+    def Table(self, name):
+      FakeDynamoDB.tables += 1
+      return name
+
+  clients.set_resource('dynamodb', FakeDynamoDB())
+
+  clients.get_table('movieDetails')
+  clients.get_table('movieDetails')
+
+  assert FakeDynamoDB.tables == 1
+
+
+def test_settings_come_from_environment_and_overrides(monkeypatch):
+  monkeypatch.setenv('CLIENT_MAX_POOL_CONNECTIONS', '64')
+  monkeypatch.setenv('CLIENT_TCP_KEEPALIVE', 'false')
+  clients.configure(read_timeout=30.0)
+
+  current = clients.settings()
+
+  assert current['max_pool_connections'] == 64
+  assert current['tcp_keepalive'] is False
+  assert current['read_timeout'] == 30.0
+
+
+def test_unknown_settings_are_rejected():
+  with pytest.raises(ValueError):
+    clients.configure(pool_size=10)
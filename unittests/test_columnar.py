@@ -0,0 +1,116 @@
+import io
+import json
+from decimal import Decimal
+
+import pytest
+
+import handler
+from columnar import S3RangeFile, batch_rows, is_parquet, non_finite
+from rejects import Rejects
+
+from .fakes import FakeS3, s3_event
+
+
+def test_parquet_keys_are_recognised():
+  assert is_parquet('exports/movies.parquet')
+  assert is_parquet('movies.PARQ')
+  assert not is_parquet('movies.csv')
+
+
+def test_range_file_reads_only_the_requested_bytes():
+  # GIVEN an object whose size is not known up front
+  s3 = FakeS3({('bucket', 'movies.parquet'): b'PAR1' + b'x' * 100 + b'PAR1'})
+  source = S3RangeFile(s3, 'bucket', 'movies.parquet', etag='"abc"')
+
+  # WHEN the footer and then a slice of the middle are read
+  source.seek(-4, io.SEEK_END)
+  footer = source.read(4)
+  source.seek(10)
+  middle = source.read(5)
+
+  # THEN each read was one ranged, version-pinned GET
+  assert source.size == 108
+  assert (footer, middle, source.tell()) == (b'PAR1', b'xxxxx', 15)
+  assert [request[3].get('Range') for request in s3.requests] == [None, 'bytes=104-107', 'bytes=10-14']
+  assert all(request[3]['IfMatch'] == '"abc"' for request in s3.requests)
+  source.seek(0, io.SEEK_END)
+  assert source.read() == b''
+
+
+def test_parquet_objects_are_ingested_with_typed_ratings(aws):
+  pa = pytest.importorskip('pyarrow')
+  pq = pytest.importorskip('pyarrow.parquet')
+  # GIVEN a Parquet file with extra columns and several row groups
+  table = pa.table({
+    'movieName': ['movie%d' % i for i in range(250)],
+    'title': ['title %d' % i for i in range(250)],
+    'plot': ['plot'] * 250,
+    'rating': [i % 5 + 0.5 for i in range(250)],
+    'unused': list(range(250)),
+  })
+  buffer = io.BytesIO()
+  pq.write_table(table, buffer, row_group_size=100)
+  s3, dynamodb = aws.s3, aws.dynamodb
+  s3.objects[('bucket', 'movies.parquet')] = buffer.getvalue()
+
+  # WHEN
+  response = handler.handler(s3_event(('bucket', 'movies.parquet')), None)
+
+  # THEN every row is written with its rating kept numeric
+  assert response['statusCode'] == 200
+  assert len(dynamodb.items) == 250
+  assert dynamodb.items['movie7'] == {'movieName': 'movie7', 'title': 'title 7',
+                                      'info': {'plot': 'plot', 'rating': Decimal('2.5')}}
+
+
+def test_batch_rows_projects_the_table_columns():
+  pa = pytest.importorskip('pyarrow')
+  batch = pa.record_batch([pa.array([4]), pa.array(['b']), pa.array(['a']), pa.array(['c'])],
+                          names=['rating', 'title', 'movieName', 'plot'])
+
+  assert list(batch_rows([batch])) == [('a', 'b', 'c', 4)]
+
+
+def test_rows_with_nan_ratings_are_rejected(aws):
+  pa = pytest.importorskip('pyarrow')
+  pq = pytest.importorskip('pyarrow.parquet')
+  # GIVEN a Parquet file with a NaN and an infinite rating
+  table = pa.table({
+    'movieName': ['titanic', 'avatar', 'heat'],
+    'title': ['Titanic', 'Avatar', 'Heat'],
+    'plot': ['ship', 'blue', 'cops'],
+    'rating': [4.5, float('nan'), float('inf')],
+  })
+  buffer = io.BytesIO()
+  pq.write_table(table, buffer)
+  s3, dynamodb = aws.s3, aws.dynamodb
+  s3.objects[('bucket', 'movies.parquet')] = buffer.getvalue()
+
+  # WHEN
+  response = handler.handler(s3_event(('bucket', 'movies.parquet')), None)
+
+  # THEN the file succeeds without them and they land in the sidecar
+  result = json.loads(response['body'])['objects'][0]
+  assert (result['status'], result['written'], result['rejected']) == ('succeeded', 1, 2)
+  assert set(dynamodb.items) == {'titanic'}
+  sidecar = [json.loads(line) for line in s3.objects[('bucket', 'movies.parquet.rejects.jsonl')].splitlines()]
+  assert [(row['line'], row['reason']) for row in sidecar] == [(2, 'rating must be a finite number'),
+                                                               (3, 'rating must be a finite number')]
+
+
+def test_rows_over_the_item_size_limit_are_rejected():
+  pa = pytest.importorskip('pyarrow')
+  batch = pa.record_batch([pa.array(['titanic', 'huge']), pa.array(['Titanic', 'Huge']),
+                           pa.array(['ship', 'x' * 500 * 1024]), pa.array([4.5, 4.5])],
+                          names=['movieName', 'title', 'plot', 'rating'])
+  rejects = Rejects()
+
+  items = list(handler.parse_parquet([batch], rejects))
+
+  assert [item['movieName'] for item in items] == ['titanic']
+  assert [(row['line'], row['reason']) for row in rejects.rows] == [(2, "item is larger than DynamoDB's 400 KB limit")]
+
+
+def test_non_finite_names_the_offending_column():
+  assert non_finite(('titanic', 'Titanic', 'ship', Decimal('4.5'))) is None
+  assert non_finite(('titanic', 'Titanic', 'ship', float('nan'))) == 'rating'
@@ -0,0 +1,120 @@
+import gzip
+import json
+
+import pytest
+
+import coordinator
+import handler
+import reader
+
+from .fakes import FakeContext, s3_event
+
+ROWS = 400
+DATA = b''.join(b'movie%d,Title %s,Plot,4.%d\n' % (i, b'x' * (i % 17), i % 10) for i in range(ROWS))
+
+
+pytestmark = pytest.mark.aws(ledger=True, objects={('bucket', 'big.csv'): DATA})
+
+
+@pytest.fixture(autouse=True)
+def fan_out(monkeypatch):
+  monkeypatch.setattr(coordinator, 'FAN_OUT_STATE_MACHINE', 'arn:aws:states:ap-south-1:123456789012:stateMachine:FanOut')
+  monkeypatch.setattr(coordinator, 'FAN_OUT_THRESHOLD', 1000)
+
+
+def test_shards_are_line_aligned_and_cover_the_object(aws):
+  s3 = aws.s3
+
+  shards = coordinator.plan_shards(s3, 'bucket', 'big.csv', len(DATA), shard_bytes=1000)
+
+  assert len(shards) == len(DATA) // 1000 + 1
+  assert b''.join(DATA[shard['start']:shard['end']] for shard in shards) == DATA
+  assert all(DATA[shard['start'] - 1:shard['start']] == b'\n' for shard in shards[1:])
+
+
+def test_a_line_longer_than_a_shard_stays_whole(aws):
+  s3 = aws.s3
+  data = b'a,b,c,1\n' + b'x' * 250 + b',b,c,1\nz,b,c,1\n'
+  s3.objects[('bucket', 'long.csv')] = data
+
+  shards = coordinator.plan_shards(s3, 'bucket', 'long.csv', len(data), shard_bytes=100)
+
+  assert [(shard['start'], shard['end']) for shard in shards] == [(0, 265), (265, 273)]
+
+
+def test_an_object_stored_compressed_is_read_whole_by_one_shard(aws, monkeypatch):
+  s3, dynamodb = aws.s3, aws.dynamodb
+  monkeypatch.setattr(reader, 'RANGED_GET_THRESHOLD', 1000)
+  stored = gzip.compress(DATA)
+  s3.put_object(Bucket='bucket', Key='packed.csv', Body=stored, ContentEncoding='gzip')
+  obj = {'bucket': 'bucket', 'key': 'packed.csv', 'size': len(stored)}
+
+  (shard,) = coordinator.plan(obj)['shards']
+  result = handler.ingest_shard(obj, shard)
+
+  assert (result['written'], result['rejected']) == (ROWS, 0)
+  assert len(dynamodb.items) == ROWS
+
+
+def test_only_line_based_uncompressed_objects_are_fanned_out():
+  assert coordinator.should_fan_out('big.csv', 5000)
+  assert not coordinator.should_fan_out('big.csv', 500)
+  assert not coordinator.should_fan_out('big.csv', 5000, delta_mode=True)
+  assert not coordinator.should_fan_out('big.csv.gz', 5000)
+  assert not coordinator.should_fan_out('exports/big.PARQ', 5000)
+  assert not coordinator.should_fan_out('exports/big.parquet', 5000)
+
+
+def test_large_objects_are_handed_to_the_state_machine(aws):
+  dynamodb, sfn = aws.dynamodb, aws.stepfunctions
+  event = s3_event(('bucket', 'big.csv'), size=len(DATA), eTag='abc')
+
+  # WHEN
+  response = handler.handler(event, FakeContext())
+  duplicate = handler.handler(event, FakeContext())
+
+  # THEN nothing is read here and the object stays claimed while the execution runs
+  assert json.loads(response['body'])['objects'][0]['status'] == 'fanned_out'
+  assert sfn.executions[0]['object']['key'] == 'big.csv'
+  assert dynamodb.items == {}
+  assert json.loads(duplicate['body'])['objects'][0]['skipped'] == 'in_progress'
+
+
+def test_shard_results_combine_into_one_result_per_file(aws):
+  # GIVEN a planned fan-out of a file with two malformed lines
+  s3, dynamodb, sfn = aws.s3, aws.dynamodb, aws.stepfunctions
+  data = DATA.replace(b'movie10,', b'movie10;', 1).replace(b'movie390,', b',', 1)
+  s3.objects[('bucket', 'big.csv')] = data
+  handler.handler(s3_event(('bucket', 'big.csv'), size=len(data), eTag='abc'), FakeContext())
+  obj = sfn.executions[0]['object']
+  shards = coordinator.plan_shards(s3, 'bucket', 'big.csv', len(data), shard_bytes=2000)
+
+  # WHEN each shard is ingested by a worker and the results are combined
+  results = [handler.handler({'object': obj, 'shard': shard}, FakeContext()) for shard in reversed(shards)]
+  result = coordinator.handler({'step': 'combine', 'object': obj, 'shards': results}, None)
+
+  # THEN
+  assert (result['status'], result['shards'], result['written'], result['rejected']) == ('succeeded', len(shards), ROWS - 2, 2)
+  assert len(dynamodb.items) == ROWS - 2
+  sidecar = [json.loads(line) for line in s3.objects[('bucket', 'big.csv.rejects.jsonl')].splitlines()]
+  assert [row['line'] for row in sidecar] == [11, 391]
+  assert [key for _, key in s3.objects if '.part-' in key] == []
+  assert dynamodb.tables['ingestProgress'].items['s3://bucket/big.csv']['status'] == 'COMPLETE'
+
+
+def test_combining_shards_with_failed_rows_fails_the_execution(aws):
+  # GIVEN a fanned-out object whose second shard could not write every row
+  s3, dynamodb, sfn = aws.s3, aws.dynamodb, aws.stepfunctions
+  handler.handler(s3_event(('bucket', 'big.csv'), size=len(DATA), eTag='abc'), FakeContext())
+  obj = sfn.executions[0]['object']
+  shards = [{'index': 0, 'written': 200, 'lines': 200}, {'index': 1, 'written': 190, 'failed': 10, 'lines': 200}]
+
+  # WHEN the combine step runs, then the release step the catch leads to
+  with pytest.raises(coordinator.ShardsFailed, match='10 rows of big.csv'):
+    coordinator.handler({'step': 'combine', 'object': obj, 'shards': shards}, None)
+  coordinator.handler({'step': 'release', 'object': obj}, None)
+
+  # THEN the object is not complete, and the next delivery claims it again
+  record = dynamodb.tables['ingestProgress'].items['s3://bucket/big.csv']
+  assert (record['status'], record['leaseUntil']) == ('IN_PROGRESS', 0)
+  assert handler.progress_store().claim('bucket', 'big.csv', '"abc"').outcome == 'claimed'
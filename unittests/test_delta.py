@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+import batch_writer
+import delta
+import handler
+
+from .fakes import FakeContext, s3_event
+
+
+@pytest.fixture(autouse=True)
+def delta_mode(monkeypatch):
+  monkeypatch.setattr(delta, 'DELTA_MODE', True)
+  monkeypatch.setattr(delta, 'STATE_BUCKET', 'state')
+
+
+def upload(s3, data):
+  s3.objects[('bucket', 'moviedata.csv')] = data
+  response = handler.handler(s3_event(('bucket', 'moviedata.csv')), FakeContext())
+  return json.loads(response['body'])['objects'][0]
+
+
+def test_only_changed_rows_are_written_and_removed_rows_deleted(aws):
+  s3, dynamodb = aws.s3, aws.dynamodb
+  first = upload(s3, b'titanic,Titanic,ship,4.5\navatar,Avatar,blue,4.1\nheat,Heat,cops,4.2\n')
+  assert first['written'] == 3
+
+  # WHEN the file is re-uploaded with one edit, one removal and one addition
+  second = upload(s3, b'titanic,Titanic,ship,4.5\navatar,Avatar,blue,4.9\nup,Up,balloons,4.0\n')
+
+  # THEN only the edit, the addition and the delete reach DynamoDB
+  assert second['delta'] == {'previous_keys': 3, 'unchanged': 1, 'deleted': 1}
+  assert second['written'] == 3
+  assert set(dynamodb.items) == {'titanic', 'avatar', 'up'}
+  assert dynamodb.items['avatar']['info']['rating'] == '4.9'
+
+
+def test_a_rejected_row_does_not_delete_its_stored_item(aws):
+  s3, dynamodb = aws.s3, aws.dynamodb
+  upload(s3, b'titanic,Titanic,ship,4.5\navatar,Avatar,blue,4.1\n')
+
+  # WHEN avatar's line is malformed in the next upload
+  second = upload(s3, b'titanic,Titanic,ship,4.5\navatar,Avatar\n')
+
+  # THEN it is rejected but its item stays, and is still tracked
+  assert (second['rejected'], second['delta']['deleted']) == (1, 0)
+  assert set(dynamodb.items) == {'titanic', 'avatar'}
+  third = upload(s3, b'titanic,Titanic,ship,4.5\n')
+  assert third['delta']['deleted'] == 1
+  assert set(dynamodb.items) == {'titanic'}
+
+
+def test_a_key_repeated_in_the_file_keeps_its_last_value(aws):
+  s3, dynamodb = aws.s3, aws.dynamodb
+  upload(s3, b'titanic,Titanic,ship,4.5\n')
+
+  upload(s3, b'titanic,Titanic,ship,1.0\ntitanic,Titanic,ship,4.5\n')
+
+  assert dynamodb.items['titanic']['info']['rating'] == '4.5'
+
+
+def test_fingerprints_round_trip_through_one_object(aws):
+  s3 = aws.s3
+  store = delta.FingerprintStore(s3, 'state')
+
+  store.save('bucket', 'moviedata.csv', 'v1', {'titanic': 'abc'})
+
+  assert store.load('bucket', 'moviedata.csv') == ('v1', {'titanic': 'abc'})
+  assert store.load('bucket', 'other.csv') == (None, None)
+
+
+@pytest.mark.aws(ledger=True)
+def test_no_fingerprints_are_saved_past_failed_writes(aws, monkeypatch):
+  s3, dynamodb = aws.s3, aws.dynamodb
+  s3.objects[('bucket', 'moviedata.csv')] = b''.join(b'movie%d,Title,Plot,4.5\n' % i for i in range(3000))
+  # The first row never writes, and its retries don't wait
+  dynamodb.unwritable.add('movie0')
+  monkeypatch.setattr(batch_writer.BatchWriter, '_backoff', lambda self, attempt: 0)
+
+  # WHEN the invocation runs out of time after the failed write
+  response = handler.handler(s3_event(('bucket', 'moviedata.csv'), versionId='v1'), FakeContext(calls=3))
+
+  # THEN the retry still compares every row against the old fingerprints
+  assert json.loads(response['body'])['objects'][0]['status'] == 'failed'
+  store = delta.FingerprintStore(s3, 'state')
+  assert store.load('bucket', 'moviedata.csv', delta.PARTIAL) == (None, None)
+  assert store.load('bucket', 'moviedata.csv') == (None, None)
+
+
+@pytest.mark.aws(ledger=True)
+def test_a_reingest_rewrites_unchanged_rows_across_continuations(aws):
+  s3, dynamodb, lambda_client = aws.s3, aws.dynamodb, aws.lambda_client
+  data = b''.join(b'movie%d,Title,Plot,4.5\n' % i for i in range(3000))
+  upload(s3, data)
+  # GIVEN the table lost its items, say restored from an older backup
+  dynamodb.items.clear()
+  items = [{'Key': 'moviedata.csv', 'Size': len(data), 'Etag': '"v1"'}]
+
+  # WHEN a backfill re-ingests the unchanged file over two invocations
+  handler.handler({'backfill': {'bucket': 'bucket', 'items': items, 'reingest': True}}, FakeContext(calls=3))
+  (invocation,) = lambda_client.invocations
+  response = handler.handler(json.loads(invocation['Payload']), FakeContext())
+
+  # THEN every row is written again and nothing is deleted
+  result = json.loads(response['body'])['objects'][0]
+  assert json.loads(invocation['Payload'])['reingest'] is True
+  assert (result['status'], result['delta']['unchanged'], result['delta']['deleted']) == ('succeeded', 0, 0)
+  assert len(dynamodb.items) == 3000
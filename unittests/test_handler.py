@@ -0,0 +1,93 @@
+import bz2
+import gzip
+import json
+from decimal import Decimal
+
+import handler
+
+from .fakes import s3_event
+
+
+def test_every_record_in_the_event_is_ingested(aws):
+  # GIVEN
+  s3, dynamodb = aws.s3, aws.dynamodb
+  s3.objects[('bucket', 'a.csv')] = b'titanic,A ship disaster,suspense,4.50\n'
+  s3.objects[('bucket', 'b.csv')] = b'avatar,Blue people,scifi,4.1\n'
+
+  # WHEN
+  response = handler.handler(s3_event(('bucket', 'a.csv'), ('bucket', 'b.csv')), None)
+
+  # THEN
+  assert response['statusCode'] == 200
+  assert set(dynamodb.items) == {'titanic', 'avatar'}
+  objects = json.loads(response['body'])['objects']
+  assert [(o['key'], o['status'], o['written']) for o in objects] == [('a.csv', 'succeeded', 1), ('b.csv', 'succeeded', 1)]
+
+
+def test_a_bad_object_does_not_hide_the_others(aws):
+  s3, dynamodb = aws.s3, aws.dynamodb
+  s3.objects[('bucket', 'good.csv')] = b'titanic,A ship disaster,suspense,4.50\n'
+
+  response = handler.handler(s3_event(('bucket', 'missing.csv'), ('bucket', 'good.csv')), None)
+
+  assert response['statusCode'] == 500
+  objects = json.loads(response['body'])['objects']
+  assert [o['status'] for o in objects] == ['failed', 'succeeded']
+  assert 'missing.csv' in objects[0]['error']
+  assert set(dynamodb.items) == {'titanic'}
+
+
+def test_event_keys_are_url_decoded(aws):
+  s3, dynamodb = aws.s3, aws.dynamodb
+  s3.objects[('bucket', 'movie data.csv')] = b'titanic,A ship disaster,suspense,4.50\n'
+
+  response = handler.handler(s3_event(('bucket', 'movie+data.csv')), None)
+
+  assert response['statusCode'] == 200
+
+
+def test_compressed_objects_give_the_same_items_as_plain_ones(aws):
+  # GIVEN the same rows stored plain, gzipped and bzip2ed
+  s3, dynamodb = aws.s3, aws.dynamodb
+  data = b''.join(b'movie%d,title %d,plot,%d.5\n' % (i, i, i % 5) for i in range(500))
+  s3.objects[('bucket', 'plain.csv')] = data
+  handler.handler(s3_event(('bucket', 'plain.csv')), None)
+  expected = dict(dynamodb.items)
+
+  for key, body in (('movies.csv.gz', gzip.compress(data)), ('movies.csv.bz2', bz2.compress(data))):
+    dynamodb.items.clear()
+    s3.objects[('bucket', key)] = body
+
+    # WHEN
+    response = handler.handler(s3_event(('bucket', key)), None)
+
+    # THEN
+    assert response['statusCode'] == 200
+    assert dynamodb.items == expected
+
+
+def test_json_lines_objects_map_onto_the_movie_item_shape(aws):
+  s3, dynamodb = aws.s3, aws.dynamodb
+  s3.objects[('bucket', 'feed.ndjson')] = (
+    b'{"movieName": "titanic", "title": "A ship disaster", "plot": "suspense", "rating": 4.5}\n'
+    b'not json\n'
+    b'{"movieName": "heat", "title": "Heat", "info": {"plot": "Cops", "rating": 4.2, "genres": ["crime"]}}\n')
+
+  response = handler.handler(s3_event(('bucket', 'feed.ndjson')), None)
+
+  assert response['statusCode'] == 200
+  assert json.loads(response['body'])['objects'][0]['rejected'] == 1
+  assert dynamodb.items['titanic'] == handler.movie_item('titanic', 'A ship disaster', 'suspense', Decimal('4.5'))
+  assert dynamodb.items['heat']['info'] == {'plot': 'Cops', 'rating': Decimal('4.2'), 'genres': ['crime']}
+
+
+def test_objects_ingested_side_by_side_split_the_connection_pool(aws, monkeypatch):
+  dynamodb = aws.dynamodb
+  monkeypatch.setenv('WRITER_THREADS', '16')
+
+  alone, _ = handler.writer_pool()
+  shared, _ = handler.writer_pool(concurrent_objects=4)
+
+  assert alone.workers == 16
+  assert shared.workers == 8
+  assert shared._writers[0]._dynamodb is dynamodb.meta.client
@@ -0,0 +1,77 @@
+import json
+
+import coordinator
+import handler
+from metrics import BYTES, ObjectMetrics, Timer
+
+from .fakes import s3_event
+
+
+def test_record_is_embedded_metric_format():
+  metrics = ObjectMetrics(namespace='Test', FunctionName='ingest')
+  metrics.seconds('ParseTime', 0.0125)
+  metrics.add('Rows', 2)
+  metrics.add('Rows', 3)
+  metrics.put('Bytes', 10, BYTES)
+  metrics.set_property('Key', 'movies.csv')
+
+  record = metrics.record(timestamp=1600000000)
+
+  assert record['_aws'] == {
+    'Timestamp': 1600000000000,
+    'CloudWatchMetrics': [{
+      'Namespace': 'Test',
+      'Dimensions': [['FunctionName']],
+      'Metrics': [{'Name': 'Bytes', 'Unit': 'Bytes'}, {'Name': 'ParseTime', 'Unit': 'Milliseconds'},
+                  {'Name': 'Rows', 'Unit': 'Count'}],
+    }],
+  }
+  assert (record['FunctionName'], record['Key'], record['Rows'], record['ParseTime']) == ('ingest', 'movies.csv', 5, 12.5)
+
+
+def test_timer_charges_only_the_wrapped_iterator():
+  timer = Timer()
+
+  assert list(timer.wrap(iter([b'ab', b'cde']))) == [b'ab', b'cde']
+  assert (timer.bytes, timer.calls) == (5, 2)
+
+
+def test_handler_emits_one_record_per_object(aws, capsys):
+  # GIVEN one good and one missing object
+  s3 = aws.s3
+  s3.objects[('bucket', 'a.csv')] = b'titanic,A ship disaster,suspense,4.50\navatar,Blue people,scifi,4.1\n'
+
+  # WHEN
+  handler.handler(s3_event(('bucket', 'a.csv'), ('bucket', 'missing.csv')), None)
+
+  # THEN
+  records = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"')]
+  records = {record['Key']: record for record in records if '_aws' in record}
+  assert set(records) == {'a.csv', 'missing.csv'}
+  assert (records['a.csv']['Rows'], records['a.csv']['Bytes'], records['a.csv']['ObjectsFailed']) == (2, 67, 0)
+  names = {metric['Name'] for metric in records['a.csv']['_aws']['CloudWatchMetrics'][0]['Metrics']}
+  assert {'DownloadTime', 'DecodeTime', 'ParseTime', 'WriteTime', 'Batches', 'Retries', 'Throttles'} <= names
+  assert records['missing.csv']['Status'] == 'failed' and records['missing.csv']['ObjectsFailed'] == 1
+
+
+def test_every_entry_point_reports_the_same_write_counts(aws, capsys):
+  # GIVEN one object, ingested whole, as a backfill batch and as one shard
+  s3 = aws.s3
+  s3.objects[('bucket', 'a.csv')] = b'titanic,A ship disaster,suspense,4.50\navatar,Blue people,scifi,4.1\n'
+  obj = {'bucket': 'bucket', 'key': 'a.csv', 'size': 67}
+  backfill = {'backfill': {'bucket': 'bucket', 'items': [{'Key': 'a.csv', 'Size': 67}], 'reingest': True}}
+
+  # WHEN
+  handler.handler(s3_event(('bucket', 'a.csv')), None)
+  handler.handler(backfill, None)
+  shard = handler.handler({'object': obj, 'shard': {'index': 0, 'start': 0, 'end': 67}}, None)
+  coordinator.combine(obj, [shard])
+
+  # THEN each record names the rows and write counts alike
+  records = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"')]
+  records = [record for record in records if '_aws' in record]
+  assert len(records) == 5
+  for record in records:
+    names = {metric['Name'] for metric in record['_aws']['CloudWatchMetrics'][0]['Metrics']}
+    assert {'Rows', 'RowsFailed', 'RowsRejected', 'Batches', 'Retries', 'Throttles'} <= names
+    assert record['Rows'] == 2
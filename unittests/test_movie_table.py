@@ -0,0 +1,74 @@
+from aws_cdk import core
+
+from pipelines_app.movie_table import PROVISIONED, Capacity, GlobalIndex, MovieTableSettings
+from pipelines_app.pipelines_app_stack import PipelinesAppStack
+
+
+def synth(**kwargs):
+  app = core.App()
+  PipelinesAppStack(app, 'Stack', **kwargs)
+  return app.synth().get_stack_by_name('Stack').template
+
+
+def resources(template, kind):
+  return [resource['Properties'] for resource in template['Resources'].values() if resource['Type'] == kind]
+
+
+def movie_table(template):
+  (table,) = [properties for properties in resources(template, 'AWS::DynamoDB::Table')
+              if properties['KeySchema'][0]['AttributeName'] == 'movieName']
+  return table
+
+
+def handler_environment(template):
+  (function,) = [properties for properties in resources(template, 'AWS::Lambda::Function')
+                 if properties.get('Handler') == 'handler.handler']
+  return function['Environment']['Variables']
+
+
+def test_the_imported_table_is_kept_by_default():
+  # WHEN
+  template = synth()
+
+  # THEN
+  assert len(resources(template, 'AWS::DynamoDB::Table')) == 1
+  assert handler_environment(template)['TABLE_NAME'] == 'movieDetails'
+
+
+def test_an_owned_on_demand_table_has_point_in_time_recovery():
+  # WHEN
+  template = synth(movie_table=MovieTableSettings())
+
+  # THEN
+  table = movie_table(template)
+  assert table['BillingMode'] == 'PAY_PER_REQUEST'
+  assert table['PointInTimeRecoverySpecification'] == {'PointInTimeRecoveryEnabled': True}
+  assert resources(template, 'AWS::ApplicationAutoScaling::ScalableTarget') == []
+  assert 'Ref' in handler_environment(template)['TABLE_NAME']
+
+
+def test_a_provisioned_table_autoscales_the_table_and_its_indexes():
+  # GIVEN
+  settings = MovieTableSettings(
+    billing=PROVISIONED,
+    read=Capacity(minimum=5, maximum=50),
+    write=Capacity(minimum=10, maximum=500, utilization_percent=60),
+    indexes=(GlobalIndex('byTitle', partition_key='title'),))
+
+  # WHEN
+  template = synth(movie_table=settings)
+
+  # THEN
+  table = movie_table(template)
+  assert table['ProvisionedThroughput'] == {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 10}
+  assert [index['IndexName'] for index in table['GlobalSecondaryIndexes']] == ['byTitle']
+  targets = resources(template, 'AWS::ApplicationAutoScaling::ScalableTarget')
+  assert sorted((target['ScalableDimension'], target['MinCapacity'], target['MaxCapacity']) for target in targets) == [
+    ('dynamodb:index:ReadCapacityUnits', 5, 50),
+    ('dynamodb:index:WriteCapacityUnits', 10, 500),
+    ('dynamodb:table:ReadCapacityUnits', 5, 50),
+    ('dynamodb:table:WriteCapacityUnits', 10, 500),
+  ]
+  target_values = sorted(policy['TargetTrackingScalingPolicyConfiguration']['TargetValue']
+                          for policy in resources(template, 'AWS::ApplicationAutoScaling::ScalingPolicy'))
+  assert target_values == [60, 60, 70, 70]
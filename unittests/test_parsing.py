@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+from parsing import CsvParser, JsonLinesParser, is_json_lines
+
+
+def rows(data, **options):
+  return list(CsvParser(**options).rows(data.split(b'\n')))
+
+
+def test_plain_rows_are_split_on_the_delimiter():
+  assert rows(b'titanic,A ship disaster,suspense,4.50\r\n\navatar,Blue,scifi,4.1') == [
+    ['titanic', 'A ship disaster', 'suspense', '4.50'],
+    ['avatar', 'Blue', 'scifi', '4.1'],
+  ]
+
+
+def test_quoted_commas_and_newlines_stay_in_one_field():
+  data = b'heat,Heat,"Cops, robbers\nand ""coffee""",4.2\nup,Up,Balloons,4.0'
+
+  assert rows(data) == [
+    ['heat', 'Heat', 'Cops, robbers\nand "coffee"', '4.2'],
+    ['up', 'Up', 'Balloons', '4.0'],
+  ]
+
+
+def test_dialect_and_encoding_are_configurable():
+  data = 'amélie;Amélie;"Paris; Montmartre";4.6'.encode('latin-1')
+
+  assert rows(data, encoding='latin-1', delimiter=';') == [['amélie', 'Amélie', 'Paris; Montmartre', '4.6']]
+
+
+def test_dialects_the_fast_path_cannot_honour_use_the_csv_module():
+  assert rows(b'a, b, "c, d"', skipinitialspace=True) == [['a', 'b', 'c, d']]
+
+
+def test_json_lines_decode_numbers_as_decimals_and_skip_malformed_lines():
+  # GIVEN a feed with bad JSON, a non-object, a missing key, NaN and a blank line
+  data = (b'{"movieName": "heat", "info": {"rating": 4.2, "year": 1995}}\n'
+          b'{"movieName": "up"\n'
+          b'[1, 2]\n'
+          b'{"title": "No name"}\n'
+          b'{"movieName": "nan", "rating": NaN}\n'
+          b'\r\n'
+          b'{"movieName": "up", "title": "Up"}\r\n')
+  parser = JsonLinesParser()
+
+  # WHEN
+  records = list(parser.records(data.split(b'\n')))
+
+  # THEN
+  assert records == [{'movieName': 'heat', 'info': {'rating': Decimal('4.2'), 'year': 1995}},
+                     {'movieName': 'up', 'title': 'Up'}]
+  assert parser.malformed == 4
+
+
+def test_json_lines_keys_are_recognised_through_compression_suffixes():
+  assert is_json_lines('feeds/movies.jsonl')
+  assert is_json_lines('feeds/movies.NDJSON.gz')
+  assert not is_json_lines('feeds/movies.csv.gz')
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+from aws_cdk import core
+
+from pipelines_app.performance import PROFILES, PerformanceProfile, profile_for
+from pipelines_app.pipelines_app_stack import PipelinesAppStack
+from pipelines_app.webservice_stage import WebServiceStage
+
+
+def synth(profile):
+  app = core.App()
+  PipelinesAppStack(app, 'Stack', performance=profile)
+  return app.synth().get_stack_by_name('Stack').template
+
+
+def resources(template, kind):
+  return [resource['Properties'] for resource in template['Resources'].values() if resource['Type'] == kind]
+
+
+def handler_function(template):
+  (function,) = [properties for properties in resources(template, 'AWS::Lambda::Function')
+                 if properties.get('Handler') == 'handler.handler']
+  return function
+
+
+@pytest.mark.parametrize('name', sorted(PROFILES))
+def test_each_profile_sizes_the_handler(name):
+  # GIVEN
+  profile = PROFILES[name]
+
+  # WHEN
+  template = synth(profile)
+
+  # THEN
+  function = handler_function(template)
+  assert function['MemorySize'] == profile.memory_mb
+  assert function['Timeout'] == profile.timeout_seconds
+  assert function['Architectures'] == [profile.architecture]
+  assert function['EphemeralStorage'] == {'Size': profile.ephemeral_storage_mb}
+  assert function.get('ReservedConcurrentExecutions') == profile.reserved_concurrency
+  (alias,) = resources(template, 'AWS::Lambda::Alias')
+  provisioned = alias.get('ProvisionedConcurrencyConfig', {}).get('ProvisionedConcurrentExecutions')
+  assert provisioned == (profile.provisioned_concurrency or None)
+
+
+def test_provisioned_concurrency_scales_on_utilization():
+  # WHEN
+  template = synth(PROFILES['large'])
+
+  # THEN
+  (target,) = resources(template, 'AWS::ApplicationAutoScaling::ScalableTarget')
+  (policy,) = resources(template, 'AWS::ApplicationAutoScaling::ScalingPolicy')
+  assert (target['MinCapacity'], target['MaxCapacity']) == (2, 20)
+  assert target['ScalableDimension'] == 'lambda:function:ProvisionedConcurrency'
+  tracking = policy['TargetTrackingScalingPolicyConfiguration']
+  assert tracking['TargetValue'] == 0.7
+  assert tracking['PredefinedMetricSpecification']['PredefinedMetricType'] == 'LambdaProvisionedConcurrencyUtilization'
+
+
+def test_profiles_without_provisioned_concurrency_do_not_autoscale():
+  template = synth(PROFILES['standard'])
+
+  assert resources(template, 'AWS::ApplicationAutoScaling::ScalableTarget') == []
+
+
+def test_arm64_profiles_run_on_a_graviton_runtime():
+  function = handler_function(synth(PerformanceProfile(architecture='arm64')))
+
+  assert function['Runtime'] == 'python3.8'
+
+
+def test_stages_take_their_profile_from_context():
+  # GIVEN
+  app = core.App(context={'performance': json.dumps({'Prod': {'base': 'small', 'memory_mb': 2048}})})
+
+  # WHEN
+  stage = WebServiceStage(app, 'Prod')
+
+  # THEN
+  template = stage.synth().get_stack_by_name('Prod-WebService').template
+  function = handler_function(template)
+  assert (function['MemorySize'], function['Timeout']) == (2048, 120)
+
+
+def test_context_profiles_are_validated():
+  app = core.App(context={'performance': {'Prod': {'memory_mb': 64}}})
+
+  with pytest.raises(ValueError, match='memory_mb'):
+    profile_for(app, 'Prod')
+  with pytest.raises(ValueError, match='Unknown performance profile settings: memory'):
+    PerformanceProfile.from_context({'memory': 1024})
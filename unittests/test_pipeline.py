@@ -0,0 +1,55 @@
+import pytest
+
+from pipeline import IngestPipeline
+from writer_pool import WriterPool
+
+from .fakes import FakeDynamoDB
+
+
+def parse(lines):
+  for line in lines:
+    name, title = line.decode('utf8').split(',')
+    yield {'movieName': name, 'title': title}
+
+
+def test_rows_flow_from_chunks_to_dynamodb():
+  dynamodb = FakeDynamoDB()
+  chunks = [b'a,1\nb,', b'2\nc,3', b'\nd,4\n']
+  pipeline = IngestPipeline(WriterPool(dynamodb, 'movieDetails', workers=2), prefetch_chunks=1)
+
+  pipeline.run(iter(chunks), parse)
+
+  assert {name: item['title'] for name, item in dynamodb.items.items()} == {'a': '1', 'b': '2', 'c': '3', 'd': '4'}
+  stats = pipeline.stats()
+  assert stats['fetch']['chunks'] == 3
+  assert stats['fetch']['bytes'] == sum(len(chunk) for chunk in chunks)
+  assert stats['parse']['lines'] == 4
+  assert stats['write']['workers'] == 2
+  assert stats['bottleneck'] in ('fetch', 'parse', 'write')
+
+
+def test_fetch_errors_surface_in_the_caller():
+  def chunks():
+    yield b'a,1\n'
+    raise IOError('connection reset')
+
+  pipeline = IngestPipeline(WriterPool(FakeDynamoDB(), 'movieDetails', workers=1))
+
+  with pytest.raises(IOError):
+    pipeline.run(chunks(), parse)
+
+
+def test_unframed_chunks_reach_parse_as_they_are():
+  dynamodb = FakeDynamoDB()
+  batches = [[('a', '1'), ('b', '2')], [('c', '3')]]
+  pipeline = IngestPipeline(WriterPool(dynamodb, 'movieDetails', workers=1))
+
+  def parse_batches(batches):
+    for batch in batches:
+      for name, title in batch:
+        yield {'movieName': name, 'title': title}
+
+  pipeline.run(iter(batches), parse_batches, framing=None)
+
+  assert set(dynamodb.items) == {'a', 'b', 'c'}
+  assert pipeline.stats()['fetch']['chunks'] == 2
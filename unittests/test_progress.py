@@ -0,0 +1,141 @@
+import json
+
+import pytest
+
+import batch_writer
+import clients
+import handler
+
+from .fakes import FakeContext, s3_event
+
+ROWS = 3000
+
+
+pytestmark = pytest.mark.aws(ledger=True, objects={
+  ('bucket', 'big.csv'): b''.join(b'movie%d,Title,Plot,4.%d\n' % (i, i % 10) for i in range(ROWS)),
+})
+
+
+def test_stops_before_timeout_and_resumes_from_the_checkpoint(aws):
+  s3, dynamodb, lambda_client = aws.s3, aws.dynamodb, aws.lambda_client
+  event = s3_event(('bucket', 'big.csv'), versionId='v1')
+
+  # WHEN the first invocation runs out of time
+  first = handler.handler(event, FakeContext(calls=3))
+
+  # THEN it stores a checkpoint and re-invokes itself with the same record
+  result = json.loads(first['body'])['objects'][0]
+  assert first['statusCode'] == 200
+  assert result['status'] == 'continued'
+  stored = dynamodb.tables['ingestProgress'].items['s3://bucket/big.csv']
+  assert stored['version'] == 'v1'
+  assert 0 < stored['rows'] == len(dynamodb.items) < ROWS
+  (invocation,) = lambda_client.invocations
+  assert json.loads(invocation['Payload']) == event
+
+  # WHEN the continuation runs to the end
+  second = handler.handler(json.loads(invocation['Payload']), FakeContext())
+
+  # THEN it started from the checkpoint and the file is complete
+  result = json.loads(second['body'])['objects'][0]
+  assert result['status'] == 'succeeded'
+  assert result['resumed_from'] == stored['offset']
+  assert result['written'] == ROWS - stored['rows']
+  assert len(dynamodb.items) == ROWS
+  assert dynamodb.tables['ingestProgress'].items['s3://bucket/big.csv']['status'] == 'COMPLETE'
+  assert s3.requests[-1][3]['Range'] == 'bytes={}-'.format(stored['offset'])
+
+
+def test_checkpoints_for_another_version_are_ignored(aws):
+  s3, dynamodb = aws.s3, aws.dynamodb
+  dynamodb.Table('ingestProgress').put_item(Item={'objectId': 's3://bucket/big.csv', 'version': 'old', 'offset': 100})
+
+  response = handler.handler(s3_event(('bucket', 'big.csv'), versionId='v2'), FakeContext())
+
+  assert json.loads(response['body'])['objects'][0]['written'] == ROWS
+
+
+def test_the_ledger_uses_the_client_the_object_threads_share(aws, monkeypatch):
+  dynamodb = aws.dynamodb
+  # Table resources are not thread-safe
+  monkeypatch.setattr(clients, 'get_table', None)
+
+  response = handler.handler(s3_event(('bucket', 'big.csv'), versionId='v1'), FakeContext())
+
+  assert json.loads(response['body'])['objects'][0]['status'] == 'succeeded'
+  assert dynamodb.tables['ingestProgress'].items['s3://bucket/big.csv']['status'] == 'COMPLETE'
+
+
+def test_duplicate_notifications_are_skipped_after_completion(aws):
+  dynamodb = aws.dynamodb
+  event = s3_event(('bucket', 'big.csv'), eTag='abc', versionId='v1')
+  handler.handler(event, FakeContext())
+  dynamodb.items.clear()
+
+  # WHEN the same content is delivered again, even as a new object version
+  response = handler.handler(s3_event(('bucket', 'big.csv'), eTag='abc', versionId='v2'), FakeContext())
+
+  # THEN nothing is re-ingested
+  result = json.loads(response['body'])['objects'][0]
+  assert response['statusCode'] == 200
+  assert (result['status'], result['skipped']) == ('skipped', 'duplicate')
+  assert dynamodb.items == {}
+
+
+def test_only_one_of_two_concurrent_deliveries_proceeds(aws):
+  dynamodb = aws.dynamodb
+  store = handler.progress_store()
+  assert store.claim('bucket', 'big.csv', '"abc"').outcome == 'claimed'
+
+  response = handler.handler(s3_event(('bucket', 'big.csv'), eTag='abc'), FakeContext())
+
+  assert json.loads(response['body'])['objects'][0]['skipped'] == 'in_progress'
+  assert dynamodb.items == {}
+
+
+def test_a_failed_ingest_releases_its_claim_for_retries(aws):
+  s3, dynamodb = aws.s3, aws.dynamodb
+  s3.objects.clear()
+  event = s3_event(('bucket', 'big.csv'), eTag='abc')
+
+  assert handler.handler(event, FakeContext())['statusCode'] == 500
+  record = dynamodb.tables['ingestProgress'].items['s3://bucket/big.csv']
+  assert (record['status'], record['leaseUntil']) == ('IN_PROGRESS', 0)
+  assert handler.progress_store().claim('bucket', 'big.csv', '"abc"').outcome == 'claimed'
+
+
+def test_rejects_from_every_invocation_end_up_in_one_sidecar(aws):
+  s3, dynamodb, lambda_client = aws.s3, aws.dynamodb, aws.lambda_client
+  rows = b'bad row\n' + s3.objects[('bucket', 'big.csv')] + b'also bad\n'
+  s3.objects[('bucket', 'big.csv')] = rows
+  event = s3_event(('bucket', 'big.csv'), versionId='v1')
+
+  # WHEN the file is ingested over two invocations
+  handler.handler(event, FakeContext(calls=3))
+  (invocation,) = lambda_client.invocations
+  second = handler.handler(json.loads(invocation['Payload']), FakeContext())
+
+  # THEN the sidecar holds the rejects of both, numbered from the start of the file
+  assert json.loads(second['body'])['objects'][0]['status'] == 'succeeded'
+  sidecar = [json.loads(line) for line in s3.objects[('bucket', 'big.csv.rejects.jsonl')].splitlines()]
+  assert [row['line'] for row in sidecar] == [1, ROWS + 2]
+  assert len(dynamodb.items) == ROWS
+
+
+def test_a_run_that_stops_with_failed_writes_keeps_its_checkpoint(aws, monkeypatch):
+  dynamodb, lambda_client = aws.dynamodb, aws.lambda_client
+  # The first row never writes, and its retries don't wait
+  dynamodb.unwritable.add('movie0')
+  monkeypatch.setattr(batch_writer.BatchWriter, '_backoff', lambda self, attempt: 0)
+  event = s3_event(('bucket', 'big.csv'), versionId='v1')
+
+  # WHEN the invocation runs out of time after the failed write
+  response = handler.handler(event, FakeContext(calls=3))
+
+  # THEN it fails without a continuation and the retry starts from the top
+  result = json.loads(response['body'])['objects'][0]
+  assert (result['status'], result['failed']) == ('failed', 1)
+  assert lambda_client.invocations == []
+  record = dynamodb.tables['ingestProgress'].items['s3://bucket/big.csv']
+  assert (record['status'], record['offset'], record['leaseUntil']) == ('IN_PROGRESS', 0, 0)
+  assert handler.progress_store().claim('bucket', 'big.csv', 'v1').checkpoint.offset == 0
@@ -0,0 +1,66 @@
+import pytest
+
+import handler
+
+from .fakes import s3_event, sqs_event
+
+
+@pytest.fixture(autouse=True)
+def one_writer(monkeypatch):
+  monkeypatch.setenv('WRITER_THREADS', '1')
+
+
+def small_file(name, rows):
+  return b''.join(b'%s-%d,Title,Plot,4.%d\n' % (name.encode(), i, i) for i in range(rows))
+
+
+def test_rows_of_small_objects_share_batch_write_requests(aws):
+  # GIVEN three objects of eight rows each, one per message
+  s3, dynamodb = aws.s3, aws.dynamodb
+  for name in ('a', 'b', 'c'):
+    s3.objects[('bucket', name + '.csv')] = small_file(name, 8)
+  event = sqs_event(*(s3_event(('bucket', name + '.csv'), size=200) for name in ('a', 'b', 'c')))
+
+  # WHEN
+  response = handler.handler(event, None)
+
+  # THEN all 24 rows go out in a single BatchWriteItem call
+  assert response == {'batchItemFailures': []}
+  assert len(dynamodb.calls) == 1
+  assert len(dynamodb.items) == 24
+
+
+def test_only_the_failed_messages_are_reported(aws):
+  # GIVEN one readable object, one missing object and a message that is not an S3 event
+  s3, dynamodb = aws.s3, aws.dynamodb
+  s3.objects[('bucket', 'a.csv')] = small_file('a', 3)
+  event = sqs_event(s3_event(('bucket', 'a.csv'), size=100), s3_event(('bucket', 'missing.csv'), size=100), 'oops')
+
+  # WHEN
+  response = handler.handler(event, None)
+
+  # THEN
+  assert sorted(failure['itemIdentifier'] for failure in response['batchItemFailures']) == ['message-1', 'message-2']
+  assert len(dynamodb.items) == 3
+
+
+def test_large_objects_are_ingested_on_their_own(aws, monkeypatch):
+  # GIVEN
+  s3, dynamodb = aws.s3, aws.dynamodb
+  monkeypatch.setattr(handler.queue_batch, 'MICRO_BATCH_MAX_BYTES', 10)
+  s3.objects[('bucket', 'a.csv')] = small_file('a', 8)
+  s3.objects[('bucket', 'b.csv')] = small_file('b', 8)
+
+  # WHEN
+  response = handler.handler(sqs_event(s3_event(('bucket', 'a.csv'), ('bucket', 'b.csv'), size=200)), None)
+
+  # THEN each object sends its own batch
+  assert response == {'batchItemFailures': []}
+  assert len(dynamodb.calls) == 2
+  assert len(dynamodb.items) == 16
+
+
+def test_s3_test_events_are_consumed(aws):
+  response = handler.handler(sqs_event({'Service': 'Amazon S3', 'Event': 's3:TestEvent'}), None)
+
+  assert response == {'batchItemFailures': []}
@@ -0,0 +1,110 @@
+from batch_writer import BatchWriter
+from rate import AdaptiveRateLimiter
+
+from .fakes import FakeDynamoDB
+
+
+class FakeClock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.now += seconds
+
+
+class CappedDynamoDB(FakeDynamoDB):
+  """Accepts at most `capacity` items per simulated second, each call costing `latency`."""
+
+  def __init__(self, clock, capacity, latency=0.005):
+    super().__init__()
+    self.clock = clock
+    self.capacity = capacity
+    self.latency = latency
+    self.second = 0
+    self.used = 0
+
+  def batch_write_item(self, RequestItems):
+    self.clock.now += self.latency
+    (table, requests), = RequestItems.items()
+    if int(self.clock.now) != self.second:
+      self.second, self.used = int(self.clock.now), 0
+    accepted = max(0, min(len(requests), self.capacity - self.used))
+    self.used += accepted
+    self.calls.append(requests)
+    for request in requests[:accepted]:
+      item = request['PutRequest']['Item']
+      self.items[item['movieName']] = item
+    unprocessed = requests[accepted:]
+    return {'UnprocessedItems': {table: unprocessed} if unprocessed else {}}
+
+
+def test_throttling_halves_the_rate_once_per_cooldown():
+  clock = FakeClock()
+  limiter = AdaptiveRateLimiter(initial_rate=1000, min_rate=10, clock=clock, sleep=clock.sleep)
+
+  limiter.record(25, 25, throttled=True)
+  limiter.record(25, 25, throttled=True)
+  clock.now += 0.5
+  limiter.record(25, 20)
+
+  assert limiter.rate == 500
+  assert limiter.stats()['throttles'] == 2
+  assert limiter.stats()['decreases'] == 1
+
+
+def test_the_cut_starts_from_the_observed_throughput():
+  clock = FakeClock()
+  limiter = AdaptiveRateLimiter(initial_rate=10000, clock=clock, sleep=clock.sleep)
+  for _ in range(8):
+    clock.now += 0.125
+    limiter.record(100)
+
+  clock.now += 0.5
+  limiter.record(100, 50)
+
+  assert limiter.stats()['observed_rate'] == 800
+  assert limiter.rate == 400
+
+
+def test_clean_batches_ramp_the_rate_back_up_to_the_ceiling():
+  clock = FakeClock()
+  limiter = AdaptiveRateLimiter(initial_rate=100, max_rate=400, increase=100, clock=clock, sleep=clock.sleep)
+
+  for _ in range(10):
+    clock.now += 1.0
+    limiter.record(25)
+
+  assert limiter.rate == 400
+
+
+def test_acquire_paces_callers_to_the_rate():
+  clock = FakeClock()
+  limiter = AdaptiveRateLimiter(initial_rate=100, clock=clock, sleep=clock.sleep)
+
+  for _ in range(20):
+    limiter.acquire(25)
+
+  # 500 items at 100/s, the first 100 from the initial burst
+  assert abs(clock.now - 4.0) < 1e-6
+
+
+def test_writer_settles_near_the_sustainable_rate_without_failures():
+  # GIVEN a table that accepts 1000 items/s and a limiter starting far above it
+  clock = FakeClock()
+  dynamodb = CappedDynamoDB(clock, capacity=1000)
+  limiter = AdaptiveRateLimiter(initial_rate=20000, max_rate=20000, clock=clock, sleep=clock.sleep)
+
+  # WHEN 30 seconds worth of rows are written
+  with BatchWriter(dynamodb, 'movieDetails', sleep=clock.sleep, rate_limiter=limiter) as writer:
+    for i in range(30000):
+      writer.put({'movieName': str(i)})
+
+  # THEN every row landed and the rate converged on the table's capacity
+  assert writer.result.failed == 0
+  assert len(dynamodb.items) == 30000
+  stats = limiter.stats()
+  assert 250 <= stats['effective_rate'] <= 2000
+  assert stats['unprocessed_ratio'] < 0.2
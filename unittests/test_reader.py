@@ -0,0 +1,159 @@
+import bz2
+import gzip
+import tracemalloc
+
+import pytest
+
+import reader
+from reader import (LineReader, decompress_chunks, detect_compression, iter_chunks, iter_lines, iter_ranged_chunks,
+                    object_chunks, open_object)
+
+from .fakes import BytesBody, FakeS3
+
+
+class SyntheticBody:
+  """StreamingBody stand-in that generates `size` bytes on demand."""
+
+  def __init__(self, size, row, max_read):
+    self.remaining = size
+    self.position = 0
+    self.row = row
+    self.block = row * (max_read // len(row) + 2)
+
+  def read(self, amt):
+    amt = min(amt, self.remaining)
+    start = self.position % len(self.row)
+    self.position += amt
+    self.remaining -= amt
+    return self.block[start:start + amt]
+
+
+def test_lines_crossing_chunk_boundaries_are_reassembled():
+  body = BytesBody(b'titanic,A ship disaster,suspense,4.50\navatar,Blue,scifi,4.1\nlast,line')
+
+  lines = list(iter_lines(body, chunk_size=7))
+
+  assert lines == [b'titanic,A ship disaster,suspense,4.50', b'avatar,Blue,scifi,4.1', b'last,line']
+
+
+def test_trailing_newline_does_not_yield_an_empty_line():
+  assert list(iter_lines(BytesBody(b'a\nb\n'), chunk_size=3)) == [b'a', b'b']
+
+
+def test_offset_tracks_consumed_bytes():
+  data = b'one\ntwo\nthree'
+  reader = LineReader(iter_chunks(BytesBody(data), 4))
+  lines = iter(reader)
+
+  next(lines)
+  assert (reader.line_no, reader.offset) == (1, 4)
+  next(lines)
+  assert (reader.line_no, reader.offset) == (2, 8)
+  next(lines)
+  assert (reader.line_no, reader.offset) == (3, len(data))
+
+
+def test_peak_memory_is_flat_for_multi_gigabyte_objects():
+  # GIVEN a 2 GiB object made of ~4 KB rows that straddle the chunk boundaries
+  size = 2 * 1024 ** 3
+  chunk_size = 1024 * 1024
+  row = b'movie,some title,a plot that goes on for a while,4.5,' + b'x' * 3946 + b'\n'
+  body = SyntheticBody(size, row, chunk_size)
+
+  # WHEN it is streamed through the reader
+  tracemalloc.start()
+  try:
+    count = sum(1 for _ in iter_lines(body, chunk_size))
+    _, peak = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+
+  # THEN every byte was seen and memory stayed within a few chunks
+  assert count == size // len(row) + 1
+  assert peak < 8 * 1024 * 1024
+
+
+def test_ranged_reads_reassemble_the_object_in_order():
+  data = b''.join(b'movie%d,title,plot,%d\n' % (i, i % 5) for i in range(2000))
+  s3 = FakeS3({('bucket', 'big.csv'): data})
+
+  chunks = list(iter_ranged_chunks(s3, 'bucket', 'big.csv', len(data), range_size=1000, concurrency=4))
+
+  assert b''.join(chunks) == data
+  assert len(s3.requests) == -(-len(data) // 1000)
+  lines = list(LineReader(iter(chunks)))
+  assert len(lines) == 2000 and len(set(lines)) == 2000
+
+
+def test_small_objects_use_a_single_get():
+  s3 = FakeS3({('bucket', 'small.csv'): b'a,b,c,d\n'})
+
+  assert b''.join(object_chunks(s3, 'bucket', 'small.csv', size=8)) == b'a,b,c,d\n'
+  assert [request[3] for request in s3.requests] == [{}]
+
+
+def test_compression_is_detected_from_encoding_then_suffix():
+  assert detect_compression('movies.csv.gz') == 'gzip'
+  assert detect_compression('movies.CSV.BZ2') == 'bz2'
+  assert detect_compression('movies.csv.zst') == 'zstd'
+  assert detect_compression('movies.csv') is None
+  assert detect_compression('movies.csv', 'gzip') == 'gzip'
+  assert detect_compression('movies.csv.gz', 'identity') == 'gzip'
+
+
+@pytest.mark.parametrize('compress', [gzip.compress, bz2.compress])
+def test_decompression_streams_in_bounded_blocks(compress):
+  # GIVEN a highly compressible payload split into two concatenated streams
+  data = b''.join(b'movie%d,title,plot,%d\n' % (i, i % 5) for i in range(20000))
+  stored = compress(data[:len(data) // 2]) + compress(data[len(data) // 2:])
+  compression = detect_compression('movies.csv.gz' if compress is gzip.compress else 'movies.csv.bz2')
+
+  # WHEN it is fed in small chunks
+  chunks = list(decompress_chunks(iter_chunks(BytesBody(stored), 1000), compression, out_size=4096))
+
+  # THEN the output is identical and no block exceeds the bound
+  assert b''.join(chunks) == data
+  assert max(len(chunk) for chunk in chunks) <= 4096
+
+
+def test_zstd_objects_are_decompressed():
+  zstandard = pytest.importorskip('zstandard')
+  data = b'titanic,A ship disaster,suspense,4.50\n' * 1000
+
+  chunks = decompress_chunks(iter([zstandard.ZstdCompressor().compress(data)]), 'zstd')
+
+  assert b''.join(chunks) == data
+
+
+def test_open_object_honours_content_encoding():
+  s3 = FakeS3()
+  s3.put_object(Bucket='bucket', Key='movies.csv', Body=gzip.compress(b'a,b,c,d\n'), ContentEncoding='gzip')
+
+  chunks, compression = open_object(s3, 'bucket', 'movies.csv')
+
+  assert compression == 'gzip'
+  assert b''.join(chunks) == b'a,b,c,d\n'
+
+
+def test_ranged_reads_honour_content_encoding(monkeypatch):
+  monkeypatch.setattr(reader, 'RANGED_GET_THRESHOLD', 100)
+  data = b''.join(b'movie%d,title,plot,%d\n' % (i, i % 5) for i in range(2000))
+  stored = gzip.compress(data)
+  s3 = FakeS3()
+  s3.put_object(Bucket='bucket', Key='big.csv', Body=stored, ContentEncoding='gzip')
+  s3.requests.clear()
+
+  chunks, compression = open_object(s3, 'bucket', 'big.csv', size=len(stored), etag='"abc"')
+
+  assert compression == 'gzip'
+  assert b''.join(chunks) == data
+  assert [request[0] for request in s3.requests] == ['head_object', 'get_object']
+  assert s3.requests[0][3] == {'IfMatch': '"abc"'}
+  assert 'Range' in s3.requests[1][3]
+
+
+def test_compressed_objects_cannot_resume_mid_stream():
+  s3 = FakeS3({('bucket', 'movies.csv.gz'): gzip.compress(b'a,b,c,d\n' * 100)})
+
+  with pytest.raises(ValueError):
+    open_object(s3, 'bucket', 'movies.csv.gz', start=10)
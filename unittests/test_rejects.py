@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+import handler
+from parsing import CsvParser
+from reader import LineReader
+from rejects import Rejects
+
+from .fakes import s3_event
+
+
+def sidecar(s3, key):
+  return [json.loads(line) for line in s3.objects[('bucket', key + '.rejects.jsonl')].splitlines()]
+
+
+def test_malformed_rows_go_to_the_sidecar_and_the_rest_is_ingested(aws):
+  # GIVEN
+  s3, dynamodb = aws.s3, aws.dynamodb
+  s3.objects[('bucket', 'movies.csv')] = (
+    b'titanic,A ship disaster,suspense,4.5\n'
+    b'short,row\n'
+    b',No name,drama,3.0\n'
+    b'avatar,Blue \xff people,scifi,4.1\n'
+    b'heat,Cops,crime,4.2\n')
+
+  # WHEN
+  response = handler.handler(s3_event(('bucket', 'movies.csv')), None)
+
+  # THEN
+  result = json.loads(response['body'])['objects'][0]
+  assert (result['status'], result['accepted'], result['rejected']) == ('succeeded', 2, 3)
+  assert set(dynamodb.items) == {'titanic', 'heat'}
+  rows = sidecar(s3, 'movies.csv')
+  assert [(row['line'], row['reason'].split(':')[0]) for row in rows] == [
+    (2, 'expected 4 fields, got 2'), (3, 'empty movieName'), (4, "'utf-8' codec can't decode byte 0xff in position 12")]
+  assert rows[0]['raw'] == 'short,row'
+  assert s3.headers[('bucket', 'movies.csv.rejects.jsonl')]['Metadata']['rejected'] == '3'
+
+
+HUGE = b'x' * 500 * 1024
+
+
+@pytest.mark.aws(ledger=True)
+@pytest.mark.parametrize('key, data', [
+  ('movies.csv', b'titanic,Titanic,ship,4.5\nhuge,Title,' + HUGE + b',4.5\nheat,Heat,cops,4.2\n'),
+  ('movies.jsonl', b'{"movieName": "titanic"}\n{"movieName": "huge", "plot": "' + HUGE + b'"}\n'
+                   b'{"movieName": "heat"}\n'),
+], ids=['csv', 'jsonl'])
+def test_rows_over_the_item_size_limit_go_to_the_sidecar(aws, key, data):
+  # GIVEN a well-formed row too large for DynamoDB between two good ones
+  s3, dynamodb = aws.s3, aws.dynamodb
+  s3.objects[('bucket', key)] = data
+
+  # WHEN
+  response = handler.handler(s3_event(('bucket', key), versionId='v1'), None)
+
+  # THEN the row is set aside and the object completes
+  result = json.loads(response['body'])['objects'][0]
+  assert (result['status'], result['failed'], result['rejected']) == ('succeeded', 0, 1)
+  assert set(dynamodb.items) == {'titanic', 'heat'}
+  assert [(row['line'], row['reason']) for row in sidecar(s3, key)] == [
+    (2, "item is larger than DynamoDB's 400 KB limit")]
+  assert dynamodb.tables['ingestProgress'].items['s3://bucket/' + key]['status'] == 'COMPLETE'
+
+
+def test_a_clean_file_writes_no_sidecar(aws):
+  # GIVEN
+  s3 = aws.s3
+  s3.objects[('bucket', 'movies.csv')] = b'titanic,A ship disaster,suspense,4.5\n'
+
+  # WHEN
+  handler.handler(s3_event(('bucket', 'movies.csv')), None)
+
+  # THEN
+  assert ('bucket', 'movies.csv.rejects.jsonl') not in s3.objects
+
+
+def test_sidecar_notifications_are_skipped(aws):
+  # GIVEN
+  s3, dynamodb = aws.s3, aws.dynamodb
+  s3.objects[('bucket', 'movies.csv.rejects.jsonl')] = b'{"line":2,"reason":"empty movieName","raw":",x,y,1"}\n'
+
+  # WHEN
+  response = handler.handler(s3_event(('bucket', 'movies.csv.rejects.jsonl')), None)
+
+  # THEN
+  result = json.loads(response['body'])['objects'][0]
+  assert (result['status'], result['skipped']) == ('skipped', 'rejects')
+  assert dynamodb.items == {}
+
+
+def test_rejects_keep_counting_past_the_limit():
+  # GIVEN
+  rejects = Rejects(line_offset=100, limit=2)
+
+  # WHEN
+  for line_no in range(1, 6):
+    rejects.add('bad', 'raw', line_no=line_no)
+
+  # THEN
+  assert rejects.count == 5
+  assert [row['line'] for row in rejects.rows] == [101, 102]
+
+
+def test_csv_parser_reports_undecodable_lines_instead_of_raising():
+  # GIVEN
+  rejects = Rejects()
+  lines = LineReader([b'a,b,c,d\n', b'\xfe,b,c,d\n', b'e,f,g,h\n'])
+  rejects.track(lines)
+
+  # WHEN
+  rows = list(CsvParser(on_reject=rejects.add).rows(lines))
+
+  # THEN
+  assert rows == [['a', 'b', 'c', 'd'], ['e', 'f', 'g', 'h']]
+  assert [row['line'] for row in rejects.rows] == [2]
@@ -1,5 +1,19 @@
+import json
+
+import pytest
 from aws_cdk import core
+from pipelines_app.backfill import BackfillSettings
+from pipelines_app.fan_out import FanOutSettings
+from pipelines_app.ingest_queue import IngestQueueSettings
+from pipelines_app.input_layers import InputLayers
 from pipelines_app.pipelines_app_stack import PipelinesAppStack
+from pipelines_app.webservice_stage import WebServiceStage
+
+def state_machine_definition(state_machine):
+  # Function ARNs are tokens inside JSON strings; any placeholder will do
+  parts = state_machine['Properties']['DefinitionString']['Fn::Join'][1]
+  return json.loads(''.join(part if isinstance(part, str) else 'token' for part in parts))
+
 
 def test_lambda_handler():
   # GIVEN
@@ -13,4 +27,122 @@ def test_lambda_handler():
   functions = [resource for resource in template['Resources'].values()
                if resource['Type'] == 'AWS::Lambda::Function']
 
-  assert len(functions) == 2
\ No newline at end of file
+  assert len(functions) == 2
+
+
+def test_ingest_queue_buffers_notifications():
+  # GIVEN
+  app = core.App()
+
+  # WHEN
+  PipelinesAppStack(app, 'Stack', ingest_queue=IngestQueueSettings(batch_size=500, max_concurrency=3))
+
+  # THEN
+  template = app.synth().get_stack_by_name('Stack').template
+  resources = template['Resources'].values()
+  queues = [resource for resource in resources if resource['Type'] == 'AWS::SQS::Queue']
+  (mapping,) = [resource for resource in resources if resource['Type'] == 'AWS::Lambda::EventSourceMapping']
+
+  assert len(queues) == 2
+  assert any('RedrivePolicy' in queue['Properties'] for queue in queues)
+  assert mapping['Properties']['BatchSize'] == 500
+  assert mapping['Properties']['MaximumBatchingWindowInSeconds'] == 10
+  assert mapping['Properties']['FunctionResponseTypes'] == ['ReportBatchItemFailures']
+  assert mapping['Properties']['ScalingConfig'] == {'MaximumConcurrency': 3}
+  assert len([resource for resource in resources if resource['Type'] == 'AWS::Lambda::Function']) == 2
+
+
+def test_ingest_queue_settings_are_validated():
+  with pytest.raises(ValueError, match='max_concurrency'):
+    IngestQueueSettings(max_concurrency=1).validate()
+  with pytest.raises(ValueError, match='max_concurrency'):
+    PipelinesAppStack(core.App(), 'Stack', ingest_queue=IngestQueueSettings(max_concurrency=1001))
+  with pytest.raises(ValueError, match='batching_window_seconds'):
+    IngestQueueSettings(batch_size=500, batching_window_seconds=0).validate()
+  assert IngestQueueSettings(max_concurrency=2).validate().max_concurrency == 2
+
+
+def test_fan_out_runs_shards_through_a_map_state():
+  # GIVEN
+  app = core.App()
+
+  # WHEN
+  PipelinesAppStack(app, 'Stack', fan_out=FanOutSettings(max_concurrency=4))
+
+  # THEN
+  template = app.synth().get_stack_by_name('Stack').template
+  resources = template['Resources'].values()
+  functions = [resource for resource in resources if resource['Type'] == 'AWS::Lambda::Function']
+  (state_machine,) = [resource for resource in resources if resource['Type'] == 'AWS::StepFunctions::StateMachine']
+  definition = ''.join(part for part in state_machine['Properties']['DefinitionString']['Fn::Join'][1]
+                       if isinstance(part, str))
+
+  assert len(functions) == 3
+  assert '"Type":"Map"' in definition and '"MaxConcurrency":4' in definition
+  assert state_machine['Properties']['StateMachineName'] == 'Stack-FanOut'
+  (policy,) = [resource for resource in resources if resource['Type'] == 'AWS::IAM::Policy'
+               and resource['Properties']['Roles'] == [{'Ref': state_machine['Properties']['RoleArn']['Fn::GetAtt'][0]}]]
+  invoked = [statement['Resource'] for statement in policy['Properties']['PolicyDocument']['Statement']
+             if statement['Action'] == 'lambda:InvokeFunction']
+  assert len(invoked) == 2
+  # Every step runs inside one catch that releases the claim
+  states = state_machine_definition(state_machine)['States']
+  assert list(states) == ['IngestObject', 'ReleaseObject', 'IngestFailed']
+  branch = states['IngestObject']['Branches'][0]['States']
+  assert list(branch) == ['PlanShards', 'IngestShards', 'CombineShards']
+  assert 'Catch' not in branch['IngestShards']
+  assert states['IngestObject']['Catch'] == [{'ErrorEquals': ['States.ALL'], 'ResultPath': '$.error',
+                                              'Next': 'ReleaseObject'}]
+
+
+def test_backfill_lists_the_prefix_with_a_distributed_map():
+  # GIVEN
+  app = core.App()
+
+  # WHEN
+  PipelinesAppStack(app, 'Stack', backfill=BackfillSettings(max_concurrency=8, objects_per_batch=20))
+
+  # THEN
+  template = app.synth().get_stack_by_name('Stack').template
+  resources = template['Resources'].values()
+  (state_machine,) = [resource for resource in resources if resource['Type'] == 'AWS::StepFunctions::StateMachine']
+  definition = ''.join(part for part in state_machine['Properties']['DefinitionString']['Fn::Join'][1]
+                       if isinstance(part, str))
+
+  assert '"Mode":"DISTRIBUTED"' in definition
+  assert '"MaxConcurrency":8' in definition and '"MaxItemsPerBatch":20' in definition
+  assert len([resource for resource in resources if resource['Type'] == 'AWS::Lambda::Function']) == 2
+  (policy,) = [resource for resource in resources if resource['Type'] == 'AWS::IAM::Policy'
+               and resource['Properties']['Roles'] == [{'Ref': state_machine['Properties']['RoleArn']['Fn::GetAtt'][0]}]]
+  actions = {action for statement in policy['Properties']['PolicyDocument']['Statement']
+             for action in ([statement['Action']] if isinstance(statement['Action'], str) else statement['Action'])}
+  assert {'lambda:InvokeFunction', 's3:GetObject*', 's3:List*', 's3:PutObject*', 'states:StartExecution'} <= actions
+
+
+def test_input_layers_are_attached_once_each():
+  # GIVEN
+  app = core.App()
+  layer = 'arn:aws:lambda:ap-south-1:336392948345:layer:AWSSDKPandas-Python37:5'
+
+  # WHEN
+  PipelinesAppStack(app, 'Stack', input_layers=InputLayers(parquet_arn=layer, zstd_arn=layer))
+
+  # THEN
+  template = app.synth().get_stack_by_name('Stack').template
+  (handler,) = [resource for resource in template['Resources'].values()
+                if resource['Type'] == 'AWS::Lambda::Function' and resource['Properties']['Handler'] == 'handler.handler']
+  assert handler['Properties']['Layers'] == [layer]
+
+
+def test_stages_can_turn_on_delta_mode():
+  # GIVEN
+  app = core.App()
+
+  # WHEN
+  stage = WebServiceStage(app, 'pre-prod', delta_mode=True)
+
+  # THEN
+  template = stage.synth().get_stack_by_name('pre-prod-WebService').template
+  (handler,) = [resource for resource in template['Resources'].values()
+                if resource['Type'] == 'AWS::Lambda::Function' and resource['Properties']['Handler'] == 'handler.handler']
+  assert handler['Properties']['Environment']['Variables']['DELTA_MODE'] == 'true'
@@ -0,0 +1,54 @@
+import pytest
+
+from writer_pool import WriterPool, default_worker_count
+
+from .fakes import FakeDynamoDB
+
+
+def movie(name, title='t'):
+  return {'movieName': name, 'title': title, 'info': {'plot': 'p', 'rating': '1'}}
+
+
+def test_all_items_are_written_across_workers():
+  dynamodb = FakeDynamoDB()
+
+  with WriterPool(dynamodb, 'movieDetails', workers=4) as pool:
+    for i in range(1000):
+      pool.put(movie(str(i)))
+
+  assert len(dynamodb.items) == 1000
+  assert pool.result.written == 1000
+  stats = pool.worker_stats()
+  assert len(stats) == 4
+  assert sum(worker['items'] for worker in stats) == 1000
+
+
+def test_repeated_keys_keep_the_last_write_across_batches():
+  dynamodb = FakeDynamoDB()
+
+  with WriterPool(dynamodb, 'movieDetails', workers=4, queue_batches=1) as pool:
+    for version in range(50):
+      for i in range(100):
+        pool.put(movie(str(i), title=str(version)))
+
+  assert {item['title'] for item in dynamodb.items.values()} == {'49'}
+
+
+def test_worker_errors_reach_the_producer():
+  class BrokenDynamoDB:
+    def batch_write_item(self, RequestItems):
+      raise RuntimeError('boom')
+
+  with pytest.raises(RuntimeError):
+    with WriterPool(BrokenDynamoDB(), 'movieDetails', workers=2, queue_batches=1) as pool:
+      for i in range(10000):
+        pool.put(movie(str(i)))
+
+
+def test_worker_count_follows_lambda_memory(monkeypatch):
+  monkeypatch.delenv('WRITER_THREADS', raising=False)
+  monkeypatch.setenv('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', '2048')
+  assert default_worker_count() == 8
+
+  monkeypatch.setenv('WRITER_THREADS', '3')
+  assert default_worker_count() == 3